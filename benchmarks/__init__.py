@@ -0,0 +1,3 @@
+"""
+Performance benchmarks. Run them from the repository root, e.g. python -m benchmarks.bench_order_tasks
+"""
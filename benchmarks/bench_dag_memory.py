@@ -0,0 +1,96 @@
+"""
+Memory footprint and build time of a WFDAG
+
+For each workflow (bundled samples or generated layered workflows where each task depends on up to 'fan_in' tasks
+of the previous layer, half of them through a file), the tasks are created and added to a WFDAG which is then built.
+Reported:
++ tasks (MB): memory held by the WFCTask instances once added to the WFDAG
++ dag (MB): additional memory held once the WFDAG is built
++ build (s): time spent in build_dag (measured in a second run, without tracemalloc which slows down allocations)
+
+python -m benchmarks.bench_dag_memory [-n 1000 100000 1000000]
+"""
+import gc
+import glob
+import random
+import time
+import tracemalloc
+from wfc2dask.wfctask import WFCTask
+from wfc2dask.wfdag import WFDAG
+
+
+def layered_tasks(n_tasks: int, width: int, fan_in: int, seed: int = 42) -> list[WFCTask]:
+    """
+    :param n_tasks: number of tasks in the workflow
+    :param width: number of tasks per layer
+    :param fan_in: maximum number of parents of a task (taken in the previous layer)
+    :param seed: randomizer seed
+    :return: the tasks of the workflow. Each task has an output file and an external input file
+    """
+    randomizer = random.Random(seed)
+    tasks = []
+    previous_layer = []
+    layer = []
+    for index in range(n_tasks):
+        task = WFCTask()
+        task.name = "task_%d" % index
+        task.outputs.add("task_%d.dat" % index)
+        task.inputs.add("external_%d.dat" % index)
+        if len(previous_layer) != 0:
+            for rank, parent in enumerate(randomizer.sample(previous_layer, min(fan_in, len(previous_layer)))):
+                if rank % 2 == 0:
+                    task.parents.add(parent.name)
+                else:
+                    task.inputs.add(next(iter(parent.outputs)))
+        tasks.append(task)
+        layer.append(task)
+        if len(layer) == width:
+            previous_layer, layer = layer, []
+    return tasks
+
+
+def measure(label: str, build_tasks) -> None:
+    gc.collect()
+    tracemalloc.start()
+    wfdag = WFDAG(label)
+    for task in build_tasks():
+        wfdag.add_task(task)
+    gc.collect()
+    tasks_memory, _ = tracemalloc.get_traced_memory()
+    wfdag.build_dag()
+    gc.collect()
+    dag_memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del wfdag
+    wfdag = WFDAG(label)
+    for task in build_tasks():
+        wfdag.add_task(task)
+    start = time.perf_counter()
+    wfdag.build_dag()
+    elapsed = time.perf_counter() - start
+    print("%-40s %10d %12.1f %12.1f %12.3f" % (label, len(wfdag.wftasks), tasks_memory / 1e6,
+                                               (dag_memory - tasks_memory) / 1e6, elapsed))
+
+
+def process_arguments():
+    import argparse
+    import sys
+    parser = argparse.ArgumentParser(prog=sys.argv[0], description='Measures the memory and build time of WFDAGs')
+    parser.add_argument("-n", "--n_tasks", help="Generated workflow sizes", type=int, nargs="+",
+                        default=[1000, 100000, 1000000])
+    parser.add_argument("-w", "--width", help="Number of tasks per layer", type=int, default=100)
+    parser.add_argument("-f", "--fan_in", help="Maximum number of parents per task", type=int, default=4)
+    return parser.parse_args()
+
+
+def main():
+    args = process_arguments()
+    print("%-40s %10s %12s %12s %12s" % ("workflow", "tasks", "tasks (MB)", "dag (MB)", "build (s)"))
+    for filename in sorted(glob.glob("samples/**/*.json", recursive=True)):
+        measure(filename, lambda: WFCTask.load(filename)[0])
+    for n_tasks in args.n_tasks:
+        measure("layered-%d" % n_tasks, lambda: layered_tasks(n_tasks, args.width, args.fan_in))
+
+
+if __name__ == '__main__':
+    main()
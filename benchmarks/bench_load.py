@@ -0,0 +1,83 @@
+"""
+Time and peak memory of loading a workflow: WFCTask.load (whole document) vs WFDAG.load (streamed tasks)
+
+A WfFormat document of n tasks, each with 'n_files' input files (most of them external, as in I/O-heavy
+workflows), is written to a temporary file. The peak memory is the peak of the Python allocations (tracemalloc)
+while the tasks are loaded and added to a WFDAG. With streaming, it should be driven by the size of the
+resulting WFDAG instead of the size of the document.
+
+python -m benchmarks.bench_load [-n 1000 10000 100000]
+"""
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from wfc2dask.wfctask import WFCTask
+from wfc2dask.wfdag import WFDAG
+
+
+def write_workflow(filename: str, n_tasks: int, n_files: int) -> None:
+    """
+    :param filename: name of the file to write the document to
+    :param n_tasks: number of tasks in the workflow
+    :param n_files: number of input files per task
+    """
+    with open(filename, "w") as fp:
+        fp.write('{"name": "bench-%d", "schemaVersion": "1.3", "workflow": {"tasks": [' % n_tasks)
+        for index in range(n_tasks):
+            files = [{"link": "input", "name": "external_%d_%d.dat" % (index, _index), "sizeInBytes": 1024}
+                     for _index in range(n_files)]
+            files.append({"link": "output", "name": "task_%d.dat" % index, "sizeInBytes": 1024})
+            if index != 0:
+                files.append({"link": "input", "name": "task_%d.dat" % (index - 1), "sizeInBytes": 1024})
+            o_task = {"name": "task_%d" % index, "type": "compute", "runtimeInSeconds": 1.0, "cores": 1,
+                      "parents": [], "children": [], "files": files,
+                      "command": {"program": "true", "arguments": ["true", "task_%d" % index]}}
+            fp.write("%s%s" % ("" if index == 0 else ",\n", json.dumps(o_task)))
+        fp.write(']}}')
+
+
+def load_whole(filename: str) -> WFDAG:
+    return WFDAG.from_tasks(*WFCTask.load(filename))
+
+
+def measure(loader, filename: str) -> tuple[float, float]:
+    """
+    :return: the elapsed time (s) and the peak memory (MB) of loader(filename)
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    wfdag = loader(filename)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del wfdag
+    return elapsed, peak / 1e6
+
+
+def process_arguments():
+    import argparse
+    import sys
+    parser = argparse.ArgumentParser(prog=sys.argv[0], description='Times and measures workflow loading')
+    parser.add_argument("-n", "--n_tasks", help="Workflow sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("-f", "--n_files", help="Number of input files per task", type=int, default=20)
+    return parser.parse_args()
+
+
+def main():
+    args = process_arguments()
+    print("%10s %10s %12s %12s %12s %12s" % ("tasks", "doc (MB)", "whole (s)", "whole (MB)", "stream (s)",
+                                             "stream (MB)"))
+    for n_tasks in args.n_tasks:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "workflow.json")
+            write_workflow(filename, n_tasks, args.n_files)
+            whole_time, whole_peak = measure(load_whole, filename)
+            stream_time, stream_peak = measure(WFDAG.load, filename)
+            print("%10d %10.1f %12.3f %12.1f %12.3f %12.1f" % (n_tasks, os.path.getsize(filename) / 1e6,
+                                                                whole_time, whole_peak, stream_time, stream_peak))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Scaling benchmark of WFDAG.order_tasks
+
+A layered workflow of n tasks is generated (each task depends on up to 'fan_in' random tasks of the previous layer)
+and the DAG is built. Only order_tasks is timed. If order_tasks is O(V+E), the time per task should stay flat when
+n grows.
+
+python -m benchmarks.bench_order_tasks [-n 1000 10000 100000 1000000]
+"""
+import random
+import time
+from wfc2dask.wfctask import WFCTask
+from wfc2dask.wfdag import WFDAG
+
+
+def layered_wfdag(n_tasks: int, width: int, fan_in: int, seed: int = 42) -> WFDAG:
+    """
+    :param n_tasks: number of tasks in the workflow
+    :param width: number of tasks per layer
+    :param fan_in: maximum number of parents of a task (taken in the previous layer)
+    :param seed: randomizer seed
+    :return: a WFDAG whose passes have been run but whose tasks are not ordered yet
+    """
+    randomizer = random.Random(seed)
+    wfdag = WFDAG("layered-%d" % n_tasks)
+    previous_layer = []
+    layer = []
+    for index in range(n_tasks):
+        task = WFCTask()
+        task.name = "task_%d" % index
+        if len(previous_layer) != 0:
+            task.parents.update(randomizer.sample(previous_layer, min(fan_in, len(previous_layer))))
+        wfdag.add_task(task)
+        layer.append(task.name)
+        if len(layer) == width:
+            previous_layer, layer = layer, []
+    wfdag._build_dag_first_pass(0)
+    wfdag._build_dag_second_pass(0)
+    return wfdag
+
+
+def process_arguments():
+    import argparse
+    import sys
+    parser = argparse.ArgumentParser(prog=sys.argv[0], description='Times WFDAG.order_tasks on layered workflows')
+    parser.add_argument("-n", "--n_tasks", help="Workflow sizes", type=int, nargs="+",
+                        default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("-w", "--width", help="Number of tasks per layer", type=int, default=100)
+    parser.add_argument("-f", "--fan_in", help="Maximum number of parents per task", type=int, default=3)
+    return parser.parse_args()
+
+
+def main():
+    args = process_arguments()
+    print("%10s %10s %10s %12s %12s" % ("tasks", "edges", "levels", "seconds", "us/task"))
+    for n_tasks in args.n_tasks:
+        wfdag = layered_wfdag(n_tasks, args.width, args.fan_in)
+        n_edges = wfdag._core.n_dependencies
+        start = time.perf_counter()
+        wfdag.order_tasks()
+        elapsed = time.perf_counter() - start
+        print("%10d %10d %10d %12.3f %12.3f" % (n_tasks, n_edges, len(wfdag.ordered_tasks), elapsed,
+                                                1e6 * elapsed / n_tasks))
+
+
+if __name__ == '__main__':
+    main()
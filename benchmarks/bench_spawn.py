@@ -0,0 +1,52 @@
+"""
+Spawn latency of task commands: os.system (through a shell, as execute_task used to do) vs run_command in
+code_templates/helpers.py (no shell, output captured to log files, exit status checked)
+
+python -m benchmarks.bench_spawn [-n 1000] [-t 1 8 32]
+"""
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, "code_templates")  # The templates import each other as top-level modules
+import helpers  # noqa: E402
+from workflow_task import WorkflowTask  # noqa: E402
+
+
+def os_system(task: WorkflowTask) -> None:
+    os.system(" ".join(task.command_arguments))
+
+
+def measure(run, tasks: list[WorkflowTask], n_threads: int) -> float:
+    """
+    :return: the mean time (ms) per command when running tasks on n_threads threads (as on a dask worker)
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(n_threads) as executor:
+        list(executor.map(run, tasks))
+    return 1e3 * (time.perf_counter() - start) / len(tasks)
+
+
+def process_arguments():
+    import argparse
+    parser = argparse.ArgumentParser(prog=sys.argv[0], description='Measures the spawn latency of task commands')
+    parser.add_argument("-n", "--n_commands", help="Number of commands", type=int, default=1000)
+    parser.add_argument("-t", "--n_threads", help="Number of threads", type=int, nargs="+", default=[1, 8, 32])
+    return parser.parse_args()
+
+
+def main():
+    args = process_arguments()
+    tasks = [WorkflowTask(dag_id="dv_%d" % index, command_arguments=["true", "--index %d" % index])
+             for index in range(args.n_commands)]
+    print("%10s %18s %18s" % ("threads", "os.system (ms)", "run_command (ms)"))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        helpers.LOG_DIRECTORY = tmpdir
+        for n_threads in args.n_threads:
+            print("%10d %18.3f %18.3f" % (n_threads, measure(os_system, tasks, n_threads),
+                                          measure(helpers.run_command, tasks, n_threads)))
+
+
+if __name__ == '__main__':
+    main()
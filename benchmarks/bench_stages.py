@@ -0,0 +1,127 @@
+"""
+End-to-end benchmark of the conversion stages, on generated workflows (see benchmarks.generator)
+
+For each shape and size, a workflow is generated in a temporary directory and converted stage by stage:
++ WFCTask.load: whole document
++ WFDAG.load: streamed tasks (what wfc2dask.py does)
++ build_dag: dependencies, levels and ranks
++ order_tasks: levels only (run again on the built DAG)
++ dask_codelines: per-task code (only up to --codegen_max tasks)
++ build_project: serialized DAG and templates
+Each stage is timed, then run again under tracemalloc to get its peak memory (above the memory held when it starts)
+and the memory it retains. The results are written as a JSON document (with the commit and the Python version), so
+that runs on different commits can be compared.
+
+python -m benchmarks.bench_stages [-s chain layered] [-n 100 10000 1000000] [-o bench_stages.json]
+"""
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from benchmarks.generator import SHAPES, write_workflow
+from wfc2dask.wfctask import WFCTask
+from wfc2dask.wfdag import WFDAG
+
+
+# wfc2dask.py (the conversion script, run from the repository root) is shadowed by the wfc2dask package
+_spec = importlib.util.spec_from_file_location("wfc2dask_script", "wfc2dask.py")
+_script = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(_script)
+build_project = _script.build_project
+
+
+def stages(filename: str, project_directory: str, codegen: bool):
+    """
+    :return: a generator of (stage name, function running the stage). The functions must be called in order
+    """
+    state = {}
+    yield "WFCTask.load", lambda: WFCTask.load(filename)
+    yield "WFDAG.load", lambda: state.update(wfdag=WFDAG.load(filename))
+    yield "build_dag", lambda: state["wfdag"].build_dag()
+    yield "order_tasks", lambda: state["wfdag"].order_tasks()
+    if codegen:
+        yield "dask_codelines", lambda: state["wfdag"].dask_codelines()
+    yield "build_project", lambda: build_project(state["wfdag"], project_directory, True)
+
+
+def measure(filename: str, project_directory: str, codegen: bool, memory: bool) -> dict[str, dict]:
+    """
+    :return: the measures of each stage: "seconds", and "peak_mb" and "retained_mb" if memory
+    """
+    measures = {}
+    for stage, run in stages(filename, project_directory, codegen):
+        start = time.perf_counter()
+        run()
+        measures[stage] = {"seconds": time.perf_counter() - start}
+    if memory:
+        tracemalloc.start()
+        for stage, run in stages(filename, project_directory, codegen):
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            run()
+            after, peak = tracemalloc.get_traced_memory()
+            measures[stage].update(peak_mb=(peak - before) / 1e6, retained_mb=(after - before) / 1e6)
+        tracemalloc.stop()
+    return measures
+
+
+def commit() -> str:
+    """
+    :return: the current git commit, None if unknown
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def process_arguments():
+    import argparse
+    import sys
+    parser = argparse.ArgumentParser(prog=sys.argv[0], description='Times and measures the conversion stages')
+    parser.add_argument("-s", "--shapes", help="Workflow shapes", nargs="+", choices=sorted(SHAPES),
+                        default=sorted(SHAPES))
+    parser.add_argument("-n", "--n_tasks", help="Workflow sizes", type=int, nargs="+", default=[100, 10000])
+    parser.add_argument("-w", "--width", help="Number of tasks per layer or stage", type=int, default=100)
+    parser.add_argument("-d", "--density", help="Number of parents of each task (layered)", type=int, default=4)
+    parser.add_argument("-e", "--external_inputs", help="Number of external input files of each task", type=int,
+                        default=1)
+    parser.add_argument("--codegen_max", help="Largest workflow for which dask_codelines is run", type=int,
+                        default=10000)
+    parser.add_argument("--no_memory", help="Do not measure the memory (halves the benchmark time)",
+                        action="store_true")
+    parser.add_argument("-o", "--output", help="JSON results file name", default="bench_stages.json")
+    return parser.parse_args()
+
+
+def main():
+    args = process_arguments()
+    results = []
+    print("%-10s %10s %12s %-16s %10s %10s %12s" % ("shape", "tasks", "dependencies", "stage", "time (s)",
+                                                    "peak (MB)", "retained (MB)"))
+    for shape in args.shapes:
+        for n_tasks in args.n_tasks:
+            with tempfile.TemporaryDirectory() as tmpdir:
+                filename = os.path.join(tmpdir, "workflow.json")
+                n_dependencies = write_workflow(filename, shape, n_tasks, args.width, args.density,
+                                                args.external_inputs)
+                measures = measure(filename, os.path.join(tmpdir, "project"), n_tasks <= args.codegen_max,
+                                   not args.no_memory)
+            for stage, stage_measures in measures.items():
+                results.append(dict(shape=shape, n_tasks=n_tasks, n_dependencies=n_dependencies, stage=stage,
+                                    **stage_measures))
+                print("%-10s %10d %12d %-16s %10.3f %10.1f %12.1f" % (
+                    shape, n_tasks, n_dependencies, stage, stage_measures["seconds"],
+                    stage_measures.get("peak_mb", float("nan")), stage_measures.get("retained_mb", float("nan"))))
+    with open(args.output, "w") as fp:
+        json.dump({"commit": commit(), "python": platform.python_version(), "platform": platform.platform(),
+                   "date": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}, fp, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Generator of synthetic WfFormat (1.3) workflows
+
+A shape (see SHAPES) gives the category and the parents of each task, by task index:
++ chain: each task depends on the previous one
++ fork_join: a fork task, 'width' tasks depending on it, a join task depending on all of them (the fork of the next
+  stage), and so on
++ layered: layers of 'width' tasks, each task depending on 'density' random tasks of the previous layer
++ montage: Montage-like mosaic (mProject per image, mDiffFit per pair of overlapping images, mConcatFit, mBgModel,
+  mBackground per image, mImgtbl, mAdd, mShrink, mViewer)
++ blast: BLAST-like split/process/merge (split_fasta, blastall per chunk, cat_blast and cat)
+
+Each task writes one output file, read by its children: the dependencies are listed both in "parents" and as files,
+like in the WFCommons instances. Each task also reads 'external_inputs' files that no task writes.
+
+python -m benchmarks.generator <shape> <n_tasks> [-o workflow.json]
+"""
+from __future__ import annotations
+import json
+import random
+
+
+def _chain(n_tasks: int, width: int, density: int, randomizer: random.Random) -> list[tuple[str, list[int]]]:
+    return [("task", [] if index == 0 else [index - 1]) for index in range(n_tasks)]
+
+
+def _fork_join(n_tasks: int, width: int, density: int, randomizer: random.Random) -> list[tuple[str, list[int]]]:
+    tasks = [("fork", [])]
+    while len(tasks) < n_tasks:
+        fork = len(tasks) - 1
+        stage_width = min(width, max(1, n_tasks - len(tasks) - 1))
+        tasks.extend([("work", [fork])] * stage_width)
+        tasks.append(("join", list(range(fork + 1, fork + 1 + stage_width))))
+    return tasks
+
+
+def _layered(n_tasks: int, width: int, density: int, randomizer: random.Random) -> list[tuple[str, list[int]]]:
+    tasks = []
+    for index in range(n_tasks):
+        layer_start = index - index % width
+        previous_layer = range(max(0, layer_start - width), layer_start)
+        tasks.append(("task", randomizer.sample(previous_layer, min(density, len(previous_layer)))))
+    return tasks
+
+
+def _montage(n_tasks: int, width: int, density: int, randomizer: random.Random) -> list[tuple[str, list[int]]]:
+    n_images = max(3, (n_tasks - 6) // 4)
+    tasks = [("mProject", []) for _ in range(n_images)]
+    # Each image overlaps the next two
+    pairs = [(image, image + step) for image in range(n_images) for step in (1, 2) if image + step < n_images]
+    tasks.extend([("mDiffFit", list(pair)) for pair in pairs])
+    tasks.append(("mConcatFit", list(range(n_images, n_images + len(pairs)))))
+    tasks.append(("mBgModel", [len(tasks) - 1]))
+    bg_model = len(tasks) - 1
+    tasks.extend([("mBackground", [image, bg_model]) for image in range(n_images)])
+    tasks.append(("mImgtbl", list(range(bg_model + 1, bg_model + 1 + n_images))))
+    tasks.append(("mAdd", list(range(bg_model + 1, bg_model + 1 + n_images)) + [len(tasks) - 1]))
+    tasks.append(("mShrink", [len(tasks) - 1]))
+    tasks.append(("mViewer", [len(tasks) - 1]))
+    return tasks
+
+
+def _blast(n_tasks: int, width: int, density: int, randomizer: random.Random) -> list[tuple[str, list[int]]]:
+    n_chunks = max(1, n_tasks - 3)
+    tasks = [("split_fasta", [])]
+    tasks.extend([("blastall", [0])] * n_chunks)
+    tasks.append(("cat_blast", list(range(1, n_chunks + 1))))
+    tasks.append(("cat", list(range(1, n_chunks + 1))))
+    return tasks
+
+
+SHAPES = {"chain": _chain, "fork_join": _fork_join, "layered": _layered, "montage": _montage, "blast": _blast}
+
+
+def write_workflow(filename: str, shape: str, n_tasks: int, width: int = 100, density: int = 4,
+                   external_inputs: int = 1, file_size: int = 1 << 20, seed: int = 42) -> int:
+    """
+    :param filename: name of the file to write the document to
+    :param shape: the name of the shape (see SHAPES)
+    :param n_tasks: number of tasks in the workflow (approximate for the montage shape)
+    :param width: number of tasks per layer (layered) or per stage (fork_join)
+    :param density: number of parents of each task (layered)
+    :param external_inputs: number of external input files of each task
+    :param file_size: sizeInBytes of each file
+    :param seed: randomizer seed
+    :return: the number of dependencies of the workflow
+
+    The document is written task by task, so generating large workflows only holds their structure in memory
+    """
+    randomizer = random.Random(seed)
+    tasks = SHAPES[shape](n_tasks, width, density, randomizer)
+    names = ["%s_%08d" % (category, index) for index, (category, _) in enumerate(tasks)]
+    children = [[] for _ in tasks]
+    for index, (_, parents) in enumerate(tasks):
+        for parent in parents:
+            children[parent].append(index)
+    n_dependencies = 0
+    with open(filename, "w") as fp:
+        fp.write('{"name": "%s-%d", "description": "Generated by benchmarks.generator", "schemaVersion": "1.3", '
+                 '"workflow": {"tasks": [' % (shape, len(tasks)))
+        for index, (category, parents) in enumerate(tasks):
+            files = [{"link": "input", "name": "%s.out" % names[parent], "sizeInBytes": file_size}
+                     for parent in parents]
+            files.extend([{"link": "input", "name": "%s.in%d" % (names[index], rank), "sizeInBytes": file_size}
+                          for rank in range(external_inputs)])
+            files.append({"link": "output", "name": "%s.out" % names[index], "sizeInBytes": file_size})
+            o_task = {"name": names[index], "category": category, "type": "compute",
+                      "runtimeInSeconds": round(randomizer.uniform(1., 10.), 3), "cores": 1,
+                      "parents": [names[parent] for parent in parents],
+                      "children": [names[child] for child in children[index]], "files": files,
+                      "command": {"program": category, "arguments": [category, "%s.out" % names[index]]}}
+            fp.write("%s%s" % ("" if index == 0 else ",\n", json.dumps(o_task)))
+            n_dependencies += len(parents)
+        fp.write(']}}\n')
+    return n_dependencies
+
+
+def process_arguments():
+    import argparse
+    import sys
+    parser = argparse.ArgumentParser(prog=sys.argv[0], description='Generates a synthetic WfFormat workflow')
+    parser.add_argument("shape", help="Shape of the workflow", choices=sorted(SHAPES))
+    parser.add_argument("n_tasks", help="Number of tasks", type=int)
+    parser.add_argument("-o", "--output", help="Output file name", default="workflow.json")
+    parser.add_argument("-w", "--width", help="Number of tasks per layer (layered) or per stage (fork_join)",
+                        type=int, default=100)
+    parser.add_argument("-d", "--density", help="Number of parents of each task (layered)", type=int, default=4)
+    parser.add_argument("-e", "--external_inputs", help="Number of external input files of each task", type=int,
+                        default=1)
+    parser.add_argument("--file_size", help="Size of each file (bytes)", type=int, default=1 << 20)
+    parser.add_argument("-s", "--seed", help="Randomizer seed", type=int, default=42)
+    return parser.parse_args()
+
+
+def main():
+    args = process_arguments()
+    n_dependencies = write_workflow(args.output, args.shape, args.n_tasks, args.width, args.density,
+                                    args.external_inputs, args.file_size, args.seed)
+    print("%s: %s workflow with %d dependencies" % (args.output, args.shape, n_dependencies))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,13 +4,32 @@ You don't need to modify this unless you know what you're doing
 This is what you need to run with Python to execute the dask workflow
 application, main, driver, or custom name, feel free to rename this file.
 """
-from dask_client import build_dask_client
+import checkpoints
+import contextlib
+from dask.distributed import get_task_stream
+from dask_client import LevelScaler, build_dask_client, cpu_count, SCHEDULER_ADDRESS
+from helpers import AFFINITIES
 from run_workflow import run_workflow
 import json
+import tracing
+from workflow_task import WorkflowTask
 
 
-def to_json(obj):
-    return json.dumps(obj, indent=2, default=lambda o: o.__dict__)
+def write_run(tasks, fp) -> None:
+    """
+    :param tasks: the executed tasks (an iterable, e.g. a generator)
+    :param fp: where the JSON array of task records is written, one compact record per line as the tasks come
+
+    The array is closed even if the workflow fails (tasks raises the exception of the failed task): the records of
+    the tasks executed until then can still be read (see tracing.py)
+    """
+    fp.write("[")
+    try:
+        for index, task in enumerate(tasks):
+            fp.write("%s\n%s" % ("" if index == 0 else ",", json.dumps(task.to_record(), separators=(",", ":"))))
+            fp.flush()
+    finally:
+        fp.write("\n]\n")
 
 
 def process_arguments():
@@ -21,12 +40,52 @@ def process_arguments():
     parser.add_argument("-nosim", "--do-not-simulate",
                         help="Do not simulate all tasks (default: do simulate all tasks)", action="store_false")
     parser.add_argument("-s", "--seed", help="Randomizer seed (used when simulating)")
-    return parser.parse_args()
+    parser.add_argument("-t", "--time_compression",
+                        help="When simulating, sleep the runtime of each task divided by this factor", type=float)
+    parser.add_argument("-io", "--io_mode", help="When simulating, read the inputs and write the outputs with their "
+                                                 "declared sizes (see WorkflowTask.simulate_io)",
+                        choices=WorkflowTask.IO_MODES)
+    parser.add_argument("-c", "--checkpoint", help="Skip the tasks that are done already, i.e. that succeeded in a "
+                                                   "previous run with the same command and inputs (compared by size "
+                                                   "and modification time, or by contents hash) and whose outputs "
+                                                   "exist (see checkpoints.py)", choices=checkpoints.MODES)
+    parser.add_argument("--trace", help="Export the execution trace (see tracing.py) to trace.json (Chrome/Perfetto "
+                                           "trace) and execution.json (WfFormat), with the data transfer times "
+                                           "recorded by dask", action="store_true")
+    parser.add_argument("-r", "--retries", help="Number of times a failed task is run again", type=int, default=0)
+    parser.add_argument("--timeout_factor", help="Kill the commands running for longer than this factor times their "
+                                                 "runtimeInSeconds (or the median execution time of the tasks of "
+                                                 "their level with --speculation)", type=float)
+    parser.add_argument("--speculation", help="Submit a copy of the tasks running for longer than this factor times "
+                                              "their expected runtime when workers are idle; the first copy to end "
+                                              "wins (see run_speculative in run_workflow.py)", type=float)
+    parser.add_argument("--scheduler", help="Address of an existing dask scheduler (default: start a local cluster)",
+                        default=SCHEDULER_ADDRESS)
+    parser.add_argument("--adaptive", help="Scale the local cluster to the width of the next levels of the workflow "
+                                           "(see LevelScaler in dask_client.py), between 1 and this number of workers",
+                        type=int)
+    parser.add_argument("--affinity", help="Run the tasks of a partition of the workflow (wfc2dask.py --partitions) "
+                                           "on the same worker or on the workers of the same host, as a hint to "
+                                           "dask (ignored with --adaptive)", choices=AFFINITIES, default="worker")
+    args = parser.parse_args()
+    if args.adaptive is not None and args.scheduler is not None:
+        parser.error("--adaptive scales the local cluster: it cannot be used with --scheduler (or WFC2DASK_SCHEDULER)")
+    return args
 
 
 if __name__ == '__main__':
     args = process_arguments()
-    with build_dask_client() as client:
-        tasks = run_workflow(client, args.do_not_simulate, seed=int(args.seed))
-    with open("run.json", "w") as fp:
-        fp.write(to_json(tasks))
+    with build_dask_client(args.scheduler, cpu_count if args.adaptive is None else 1) as client, \
+            open("run.json", "w") as fp, \
+            (get_task_stream(client) if args.trace else contextlib.nullcontext()) as task_stream:
+        # The partitions are mapped to the workers when the workflow is submitted: an adaptive cluster then has one
+        # worker, to which all of them would be pinned
+        tasks = run_workflow(client, args.do_not_simulate, seed=int(args.seed), speculation=args.speculation,
+                             affinity="none" if args.adaptive is not None else args.affinity,
+                             time_compression=args.time_compression, io_mode=args.io_mode,
+                             checkpoint=args.checkpoint, retries=args.retries, timeout_factor=args.timeout_factor)
+        if args.adaptive is not None:
+            tasks = LevelScaler(client, LevelScaler.load_profile(), maximum=args.adaptive).scaled(tasks)
+        write_run(tasks, fp)
+    if args.trace:
+        tracing.export("run.json", tracing.task_stream_transfers(task_stream.data))
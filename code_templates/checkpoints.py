@@ -0,0 +1,80 @@
+"""
+You don't need to modify this unless you know what you're doing
+
+Checkpoints of the executed tasks, stored in a SQLite database in the project directory, so that rerunning the
+application only executes the tasks that are not done yet or that have changed.
+
+The key of a task is a hash of its command, of the state of its inputs and of its declared outputs, and of how it is
+simulated if it is (see WorkflowTask.is_simulated): a simulated run does not make a real run skip the tasks. The state
+of an input is either its size and modification time ("stat" mode) or a hash of its contents ("hash" mode, slower but a
+rewritten input with the same contents does not invalidate the tasks using it). A task is skipped if its key is the
+one recorded when it last succeeded and if all its outputs exist. Since a re-executed task rewrites its outputs, the
+tasks depending on it are then re-executed as well: only the invalidated downstream subgraph runs again.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from workflow_task import WorkflowTask
+
+
+DATABASE = "checkpoints.sqlite"
+MODES = ["stat", "hash"]
+_local = threading.local()  # One connection per thread (and per database)
+
+
+def _connection() -> sqlite3.Connection:
+    database = os.path.abspath(DATABASE)
+    if getattr(_local, "database", None) != database:
+        # Several workers (processes) may write at the same time: wait for the lock rather than fail
+        connection = sqlite3.connect(database, timeout=600)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS checkpoints (name TEXT PRIMARY KEY, key TEXT NOT NULL)")
+        _local.database = database
+        _local.connection = connection
+    return _local.connection
+
+
+def file_state(name: str, mode: str):
+    """
+    :return: the state of a file (see the module documentation), None if it does not exist
+    """
+    try:
+        if mode == "hash":
+            digest = hashlib.sha256()
+            with open(name, "rb") as fp:
+                for block in iter(lambda: fp.read(1 << 20), b""):
+                    digest.update(block)
+            return digest.hexdigest()
+        stat = os.stat(name)
+        return [stat.st_size, stat.st_mtime_ns]
+    except FileNotFoundError:
+        return None
+
+
+def task_key(task: WorkflowTask) -> str:
+    """
+    :return: the key of the task, given the current state of its inputs
+    """
+    signature = [task.command_arguments,
+                 [[name, file_state(name, task.checkpoint)] for name in sorted(task.inputs)],
+                 sorted(task.outputs),
+                 {"io_mode": task.io_mode, "time_compression": task.time_compression} if task.is_simulated() else None]
+    return hashlib.sha256(json.dumps(signature).encode()).hexdigest()
+
+
+def is_done(task: WorkflowTask, key: str) -> bool:
+    """
+    :return: True if the task succeeded with the same key and its outputs still exist
+    """
+    row = _connection().execute("SELECT key FROM checkpoints WHERE name = ?", (task.name,)).fetchone()
+    return row is not None and row[0] == key and all([os.path.exists(output) for output in task.outputs])
+
+
+def record(task: WorkflowTask, key: str) -> None:
+    """
+    Record that the task succeeded with key
+    """
+    with _connection() as connection:
+        connection.execute("INSERT OR REPLACE INTO checkpoints VALUES (?, ?)", (task.name, key))
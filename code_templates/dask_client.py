@@ -4,11 +4,100 @@ Feel free to modify this to target your local dask configuration
 Lots of info there:
 https://docs.dask.org/en/stable/configuration.html
 https://dask.pydata.org/en/latest/scheduling.html
+
+The client either connects to an existing scheduler (scheduler_address, e.g. tcp://host:8786, or the
+WFC2DASK_SCHEDULER environment variable) or starts a local cluster. A local cluster can be scaled as the workflow
+progresses (see LevelScaler): workers are added ahead of the wide levels of the workflow and released during its
+narrow phases.
 """
-from dask.distributed import Client
+import bisect
+import json
+import logging
+import math
+import os
+from dask.distributed import Client, LocalCluster
+from distributed.system import MEMORY_LIMIT
+
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_ADDRESS = os.environ.get("WFC2DASK_SCHEDULER")
+cpu_count = 8        # default is 4 for me
+threads_per_cpu = 4  # default value is 4 for me
+# The width (number of tasks) and the work (sum of the runtimes) of each level of the workflow (see wfc2dask.py)
+PROFILE_FILENAME = "workflow_profile.json"
+
+
+def build_dask_client(scheduler_address: str = SCHEDULER_ADDRESS, n_workers: int = cpu_count):
+    """
+    :param scheduler_address: the address of an existing scheduler, None to start a local cluster
+    :param n_workers: the initial number of workers of the local cluster
+    """
+    if scheduler_address is not None:
+        return Client(scheduler_address)
+    # Each worker provides its share of the cores and of the memory as dask resources: the tasks requiring cores
+    # and/or memory (cores and memoryInBytes in the WFCommons workflow) are packed on workers accordingly
+    resources = {"cores": threads_per_cpu, "memory": MEMORY_LIMIT // cpu_count}
+    return Client(LocalCluster(n_workers=n_workers, threads_per_worker=threads_per_cpu, resources=resources))
+
+
+class LevelScaler:
+    """
+    Scales the cluster of a client to the width of the next levels of the workflow
+
+    The tasks of a workflow complete (roughly) level by level: once n tasks have completed, the current level is the
+    first one whose cumulated width exceeds n. The cluster is scaled to the number of workers needed to run the
+    widest of the current level and of the 'lookahead' next ones, within [minimum, maximum]: the workers are started
+    before a wide level is reached and retired once only narrow levels remain.
+    """
+    def __init__(self, client, profile: list[dict], minimum: int = 1, maximum: int = cpu_count,
+                 lookahead: int = 2, threads_per_worker: int = threads_per_cpu):
+        """
+        :param client: the dask client (its cluster must support scale, e.g. a LocalCluster)
+        :param profile: the width of each level (see PROFILE_FILENAME)
+        """
+        self.client = client
+        self.widths = [level["width"] for level in profile]
+        self.cumulated_widths = []
+        for width in self.widths:
+            self.cumulated_widths.append(width + (self.cumulated_widths[-1] if len(self.cumulated_widths) else 0))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.lookahead = lookahead
+        self.threads_per_worker = threads_per_worker
+        self.level = None
+        self.n_workers = None
+
+    @staticmethod
+    def load_profile(profile_filename: str = PROFILE_FILENAME) -> list[dict]:
+        with open(profile_filename) as fp:
+            return json.load(fp)
 
+    def update(self, n_completed: int) -> None:
+        """
+        :param n_completed: the number of tasks completed so far
+        """
+        level = bisect.bisect_right(self.cumulated_widths, n_completed)
+        if level == self.level:
+            return
+        self.level = level
+        width = max(self.widths[level:level + 1 + self.lookahead], default=0)
+        n_workers = min(self.maximum, max(self.minimum, math.ceil(width / self.threads_per_worker)))
+        if n_workers != self.n_workers:
+            logger.info("Level %d (%d tasks ahead at most): scaling to %d workers" % (level, width, n_workers))
+            self.client.cluster.scale(n_workers)
+            self.n_workers = n_workers
 
-def build_dask_client():
-    cpu_count = 8        # default is 4 for me
-    threads_per_cpu = 4  # default value is 4 for me
-    return Client(n_workers=cpu_count, threads_per_worker=threads_per_cpu)
+    def scaled(self, tasks):
+        """
+        :param tasks: the executed tasks, as they complete (see run_workflow)
+        :return: a generator of those tasks, updating the scale of the cluster as they come
+        """
+        n_completed = 0
+        self.update(n_completed)
+        for task in tasks:
+            # The members of a cluster are collected one by one: the cluster is counted once (with its first member)
+            if task.dag_id.partition(".")[2] in ["", "0"]:
+                n_completed += 1
+                self.update(n_completed)
+            yield task
@@ -1,10 +1,15 @@
 """
 This is the method that should allow the execution of a task
 
+And the ones collecting the executed tasks and fitting their resource requirements on the client side
 """
+import checkpoints
 # Those imports are required when pretending to run the commands
 import os
 import pathlib
+import socket
+import subprocess
+import threading
 import time
 import logging
 from workflow_task import WorkflowTask
@@ -13,26 +18,302 @@ from workflow_task import WorkflowTask
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Commands run concurrently by a worker, whatever its number of threads. None: the cores it provides (see
+# dask_client.py), else its number of threads (see max_processes)
+MAX_PROCESSES = os.environ.get("WFC2DASK_MAX_PROCESSES")
+_processes = {}  # worker address -> the semaphore bounding the commands it runs
+_processes_lock = threading.Lock()
+# The stdout and stderr of each command go to <LOG_DIRECTORY>/<dag_id>.out and .err (see WorkflowTask.log_name)
+LOG_DIRECTORY = "logs"
+_attempts = {}  # dask key -> the _Attempt executing it in this process
+_attempts_lock = threading.Lock()
+_local = threading.local()  # attempt: the _Attempt of the current thread, if it executes a dask task
+
+
+class _Attempt:
+    """
+    The execution of a dask task by a worker thread (see execute_task), which the client may cancel (see
+    cancel_attempt)
+    """
+    def __init__(self, task: WorkflowTask):
+        self.task = task
+        self.cancelled = False
+        self.process = None  # The command being run, if any
+
+
+def max_processes() -> int:
+    """
+    :return: the number of commands the current dask worker runs at the same time: MAX_PROCESSES if set, else the
+    cores it provides as a dask resource, else its number of threads (the number of CPUs outside of a dask worker)
+    """
+    if MAX_PROCESSES is not None:
+        return int(MAX_PROCESSES)
+    try:
+        from distributed import get_worker
+        state = get_worker().state
+    except (ImportError, ValueError):
+        return os.cpu_count()
+    return max(1, int(state.total_resources.get("cores", state.nthreads)))
+
+
+def _process_slots() -> threading.BoundedSemaphore:
+    """
+    :return: the semaphore bounding the commands run by the current worker (see max_processes). There is one per
+    worker: the workers of a local cluster started with processes=False share this module
+    """
+    address = worker_address()
+    with _processes_lock:
+        if address not in _processes:
+            _processes[address] = threading.BoundedSemaphore(max_processes())
+        return _processes[address]
+
+
+def run_command(task: WorkflowTask) -> None:
+    """
+    :param task: the task whose command is run
+
+    The command runs without a shell: the arguments are passed as they are (pipes, redirections, etc. are not
+    interpreted). Raises subprocess.CalledProcessError if the exit status is not 0 and subprocess.TimeoutExpired
+    (the command is killed) if it runs longer than task.timeout seconds: the task then fails and its dependents
+    don't run. If the dask task is cancelled (see cancel_attempt), the command is killed and an exception is raised
+    """
+    attempt = getattr(_local, "attempt", None)
+    os.makedirs(LOG_DIRECTORY, exist_ok=True)
+    log_filename = os.path.join(LOG_DIRECTORY, task.log_name())
+    with _process_slots(), open("%s.out" % log_filename, "wb") as out, open("%s.err" % log_filename, "wb") as err:
+        if attempt is not None and attempt.cancelled:
+            raise Exception("Task %s cancelled" % task.dag_id)
+        # Python file descriptors are not inheritable (PEP 446): no need to close them in the child (close_fds),
+        # which lets subprocess use the faster posix_spawn when it can
+        with subprocess.Popen(task.command_arguments, stdin=subprocess.DEVNULL, stdout=out, stderr=err,
+                              close_fds=False) as process:
+            if attempt is not None:
+                with _attempts_lock:
+                    attempt.process = process
+                    if attempt.cancelled:
+                        process.kill()
+            try:
+                process.wait(timeout=task.timeout)
+            except BaseException as exc:  # Timeout, or interrupted
+                process.kill()
+                process.wait()
+                raise exc
+            finally:
+                if attempt is not None:
+                    with _attempts_lock:
+                        attempt.process = None
+    if attempt is not None and attempt.cancelled:
+        raise Exception("Task %s cancelled" % task.dag_id)
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, task.command_arguments)
+
+
+def running_attempts() -> dict[str, float]:
+    """
+    :return: for how long (s) each dask task executed by this worker has been running, by key
+
+    Run on the workers by the client (see run_speculative in run_workflow_graph.py): the durations are measured by
+    the workers, from the start time recorded by execute_task
+    """
+    now = time.time()
+    with _attempts_lock:
+        return {key: now - attempt.task.start_time for key, attempt in _attempts.items()
+                if attempt.task.start_time is not None}
+
+
+def cancel_attempt(key: str) -> None:
+    """
+    :param key: the key of a dask task. If this worker is executing it, its command is killed and no other command
+    of the task (the next members of a cluster) is run
+
+    Run on the workers by the client: cancelling the future of a running task does not stop its command, which would
+    keep running (and keep its slot, see max_processes)
+    """
+    with _attempts_lock:
+        attempt = _attempts.get(key)
+        if attempt is None:
+            return
+        attempt.cancelled = True
+        if attempt.process is not None:
+            attempt.process.kill()
+
+
+def worker_address() -> str:
+    """
+    :return: the address of the dask worker running the current task, host:pid outside of a dask worker
+    """
+    try:
+        from distributed import get_worker
+        return get_worker().address
+    except (ImportError, ValueError):
+        return "%s:%d" % (socket.gethostname(), os.getpid())
+
+
+def warm_up() -> str:
+    """
+    :return: the address of the worker running this (see worker_address)
+
+    Run on all the workers of a cluster (client.run) so that they import this module and the modules it imports
+    before their first task (see wfc2dask/service.py)
+    """
+    return worker_address()
+
+
+def submitted(task: WorkflowTask, submit_time: float = None) -> WorkflowTask:
+    """
+    :param task: a task about to be submitted to dask
+    :param submit_time: the submission time (time.time()), now if None
+    :return: task, stamped with its submission time
+    """
+    task.submit_time = time.time() if submit_time is None else submit_time
+    return task
+
 
 def execute_task(task: WorkflowTask, fut_inputs_list) -> WorkflowTask:
     """
     :param task: The task to be executed (it holds all relevant information)
-    :param fut_inputs_list: Unused here but necessary for dask to build its own DAG
-    :return:
+    :param fut_inputs_list: The executed parents of the task (dask hands their results): the task was ready when the
+    last of them ended
+    :return: the task, with its execution time and its trace (see tracing.py)
+
+    The members of a cluster are executed in order, each of them recording its own execution time. When checkpoints
+    are enabled (task.checkpoint), a task that is done already is skipped (see checkpoints.py)
+    """
+    try:
+        from distributed import get_worker
+        key = get_worker().get_current_task()
+    except (ImportError, ValueError, KeyError):  # Not run by a dask worker
+        return _execute_task(task, fut_inputs_list)
+    # The client may ask for how long the task has been running, or cancel it (see running_attempts, cancel_attempt)
+    attempt = _Attempt(task)
+    with _attempts_lock:
+        _attempts[key] = attempt
+    _local.attempt = attempt
+    try:
+        return _execute_task(task, fut_inputs_list)
+    finally:
+        _local.attempt = None
+        with _attempts_lock:
+            _attempts.pop(key, None)
+
+
+def _execute_task(task: WorkflowTask, fut_inputs_list) -> WorkflowTask:
+    """
+    See execute_task
     """
+    ends = [parent.end_time for parent in fut_inputs_list or [] if parent.end_time is not None]
+    task.ready_time = max(ends) if len(ends) != 0 else task.submit_time
+    task.worker = worker_address()
+    task.thread = threading.get_ident()
+    task.start_time = time.time()
+    if len(task.members) != 0:
+        logger.info("Executing cluster %s/%s (%d tasks)" % (task.name, task.dag_id, len(task.members)))
+        previous = fut_inputs_list
+        for member in task.members:
+            _execute_task(submitted(member, task.submit_time), previous)
+            previous = [member]
+        task.end_time = time.time()
+        task.execution_time = task.end_time - task.start_time
+        return task
+    if task.checkpoint is not None:
+        key = checkpoints.task_key(task)
+        if checkpoints.is_done(task, key):
+            logger.info("Skipping task %s/%s: done already" % (task.name, task.dag_id))
+            task.checkpointed = True
+            task.end_time = time.time()
+            task.execution_time = 0.
+            return task
     logger.info("Executing task %s/%s: %s / in=%s / out=%s" % (task.name, task.dag_id, task.command_arguments, task.inputs, task.outputs))
-    start = time.time()
-    if task.simulate or task.command_arguments is None or len(task.command_arguments) == 0:
+    if task.is_simulated():
         logger.info("Simulating execution of task %s" % task.name)
         # Pretend we do something/Wait some time
         task.simulate_execution()
-        for output in task.outputs:
-            logger.debug("Simulating %s => %s" % (task.command_arguments, output))
-            pathlib.Path(output).touch()
+        if task.io_mode is not None:
+            task.simulate_io()
+        else:
+            for output in task.outputs:
+                logger.debug("Simulating %s => %s" % (task.command_arguments, output))
+                pathlib.Path(output).touch()
     else:
-        command = " ".join(task.command_arguments)
-        logger.info("Running command for task %s/%s: %s" % (task.name, task.dag_id, command))
-        os.system(command)  # TODO Use subprocess?
-    task.execution_time = time.time()-start
+        logger.info("Running command for task %s/%s: %s" % (task.name, task.dag_id, task.command_arguments))
+        run_command(task)
+    task.end_time = time.time()
+    task.execution_time = task.end_time - task.start_time
+    if task.checkpoint is not None:
+        checkpoints.record(task, key)
     logger.info("End of task %s/%s (%f)" % (task.name, task.dag_id, task.execution_time))
     return task
+
+
+def collect_results(futures: dict):
+    """
+    :param futures: the futures of all the tasks of the workflow (by dag_id). It is emptied as the tasks complete
+    :return: a generator of the executed tasks (WorkflowTask), in completion order (the members of a cluster in
+    their execution order)
+
+    Each future is released as soon as its task is collected. The scheduler still keeps its result as long as a
+    pending task depends on it, so the client never holds more than the tasks still running.
+    """
+    from dask.distributed import as_completed
+    completed = as_completed(list(futures.values()), with_results=True)
+    futures.clear()
+    for future, task in completed:
+        future.release()
+        if len(task.members) != 0:
+            yield from task.members  # Clusters are recorded task by task
+        else:
+            yield task
+
+
+def worker_resources(client) -> dict[str, float]:
+    """
+    :param client: the dask client
+    :return: the largest amount of each resource provided by a worker (see dask_client.py)
+    """
+    resources = {}
+    for worker in client.scheduler_info()["workers"].values():
+        for resource, amount in worker.get("resources", {}).items():
+            resources[resource] = max(amount, resources.get(resource, 0))
+    return resources
+
+
+def task_resources(requested: dict[str, float], available: dict[str, float]) -> dict[str, float]:
+    """
+    :param requested: the resources required by a task
+    :param available: the largest amount of each resource provided by a worker (see worker_resources)
+    :return: the resources to request to dask: the requested amounts, limited to what a worker provides so that
+    the task can run eventually. Resources that no worker provides are not requested
+    """
+    return {resource: min(amount, available[resource]) for resource, amount in requested.items()
+            if resource in available}
+
+
+AFFINITIES = ["worker", "host", "none"]
+
+
+def worker_groups(client, affinity: str = "worker") -> list[list[str]]:
+    """
+    :param affinity: what a partition of the workflow (see WorkflowTask.partition) is mapped to: a worker, all the
+    workers of a host, or nothing (see AFFINITIES)
+    :return: the addresses of the workers of each group, the partition p being run by the group p % number of groups
+    """
+    if affinity == "none":
+        return []
+    workers = client.scheduler_info()["workers"]
+    if affinity == "worker":
+        return [[address] for address in sorted(workers)]
+    hosts = {}
+    for address in sorted(workers):
+        hosts.setdefault(workers[address]["host"], []).append(address)
+    return [hosts[host] for host in sorted(hosts)]
+
+
+def task_placement(task: WorkflowTask, groups: list[list[str]]) -> dict:
+    """
+    :param groups: the worker groups (see worker_groups)
+    :return: the placement keyword arguments of the submission of the task: the workers of its partition, as a hint
+    only (dask may run the task elsewhere, e.g. if those workers are gone or busy)
+    """
+    if task.partition is None or len(groups) == 0:
+        return {}
+    return {"workers": groups[task.partition % len(groups)], "allow_other_workers": True}
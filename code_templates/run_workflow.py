@@ -1,17 +1,34 @@
 """
-The contents of this file have been largely generated
+The contents of the workflow_tasks package have been largely generated
 
-You may want to modify this to tune to your taste.
-It consists of two parts:
-+ The first part is the workflow tasks definition. Feel free to change the values if you need
-+ The second part is the dask code to execute the workflow. I wouldn't touch it too much if I were you (it's likely
-better to modify the WFCommons JSON workflow definition in my opinion but you hold the chainsaw eventually).
+You may want to modify them to tune to your taste.
+Each module of workflow_tasks (chunk_0, chunk_1, ...) defines and submits a bounded number of tasks, in level order:
++ The workflow tasks definitions (TASKS[...] = WorkflowTask(...)). Feel free to change the values if you need
++ The dask code submitting them. I wouldn't touch it too much if I were you (it's likely better to modify the WFCommons
+JSON workflow definition in my opinion but you hold the chainsaw eventually).
 """
-from helpers import execute_task
+from collections.abc import Iterator
+from helpers import collect_results, worker_groups, worker_resources
+import importlib
+import logging
 import random
+import sys
 from workflow_task import WorkflowTask
 
 
-def run_workflow(client, simulate: bool, seed: int=42) -> list[WorkflowTask]:
 # Generated code goes here
-    return TASKS
+
+
+def run_workflow(client, simulate: bool, seed: int=42, speculation: float = None, affinity: str = "worker",
+                 **task_options) -> Iterator[WorkflowTask]:
+    if speculation is not None:
+        logging.warning("Speculative re-execution requires the serialized DAG (convert without --codegen): ignored")
+    randomizer = random.Random(seed)
+    FUTURES = {}
+    WORKER_RESOURCES = worker_resources(client)
+    WORKER_GROUPS = worker_groups(client, affinity)
+    for chunk in range(N_CHUNKS):
+        module = importlib.import_module("workflow_tasks.chunk_%d" % chunk)
+        module.submit(client, simulate, randomizer, task_options, FUTURES, WORKER_RESOURCES, WORKER_GROUPS)
+        del sys.modules[module.__name__]  # Its code is no longer needed
+    yield from collect_results(FUTURES)
@@ -0,0 +1,235 @@
+"""
+You don't need to modify this unless you know what you're doing
+
+Runs the workflow serialized in workflow_dag.jsonl (see WFDAG.dump in wfc2dask). No code is generated per task:
+the dask task graph is built from the serialized DAG and handed to the scheduler in a single call, so the time
+before the first task starts only depends on reading the DAG, not on compiling a module as big as the workflow.
+
+Feel free to tune the WorkflowTask parameters below (e.g. the simulated execution times).
+"""
+from collections.abc import Iterator
+import dask
+from helpers import cancel_attempt, collect_results, execute_task, running_attempts, submitted, task_placement, \
+    task_resources, worker_groups, worker_resources
+import json
+import logging
+import random
+import time
+from workflow_task import WorkflowTask
+
+
+logger = logging.getLogger(__name__)
+
+DAG_FILENAME = "workflow_dag.jsonl"
+
+
+def graph_from_descriptions(descriptions, simulate: bool, seed: int, key_prefix: str = "",
+                            **task_options) -> tuple[dict, dict[str, WorkflowTask], dict[str, float]]:
+    """
+    :param descriptions: the task descriptions, in level order (see WFDAG.task_descriptions in wfc2dask)
+    :param simulate: whether the tasks are simulated
+    :param seed: randomizer seed (used when simulating)
+    :param key_prefix: prepended to the dag_ids, so that the keys of several workflows run by the same cluster don't
+    collide (see wfc2dask/service.py)
+    :param task_options: WorkflowTask options (time_compression, io_mode, checkpoint)
+    :return: the dask graph (dag_id -> (execute_task, WorkflowTask, [parent dag_ids])), the tasks by dag_id and
+    the priorities by dag_id (the upward rank of the tasks: the tasks on the critical path come first)
+    """
+    randomizer = random.Random(seed)
+    graph = {}
+    tasks = {}
+    priorities = {}
+    for description in descriptions:
+        parents = ["%s%s" % (key_prefix, parent) for parent in description.pop("parents")]
+        description["dag_id"] = "%s%s" % (key_prefix, description["dag_id"])
+        priorities[description["dag_id"]] = description.pop("priority")
+        description["members"] = [WorkflowTask(**dict(member, dag_id="%s%s" % (key_prefix, member["dag_id"])),
+                                               simulate=simulate, randomizer=randomizer, **task_options)
+                                  for member in description.get("members", [])]
+        task = WorkflowTask(**description, simulate=simulate, randomizer=randomizer, **task_options)
+        tasks[task.dag_id] = task
+        # dask replaces the keys in the list of parents by the results of the parents
+        graph[task.dag_id] = (execute_task, task, parents)
+    return graph, tasks, priorities
+
+
+def build_graph(dag_filename: str, simulate: bool, seed: int,
+                **task_options) -> tuple[dict, dict[str, WorkflowTask], dict[str, float]]:
+    """
+    :param dag_filename: the name of the serialized DAG
+    :return: see graph_from_descriptions
+    """
+    with open(dag_filename) as fp:
+        header = json.loads(fp.readline())
+        graph, tasks, priorities = graph_from_descriptions((json.loads(line) for line in fp), simulate, seed,
+                                                           **task_options)
+    if len(tasks) != header["n_tasks"]:
+        raise Exception("'%s' is truncated: %d tasks out of %d" % (dag_filename, len(tasks), header["n_tasks"]))
+    return graph, tasks, priorities
+
+
+def run_workflow(client, simulate: bool, seed: int=42, speculation: float = None, affinity: str = "worker",
+                 **task_options) -> Iterator[WorkflowTask]:
+    """
+    :param speculation: if not None, run the tasks with speculative re-execution (see run_speculative)
+    :param affinity: what the partitions of a partitioned workflow are mapped to (see worker_groups in helpers.py)
+    :return: a generator of the executed tasks, in completion order
+    """
+    yield from run_graph(client, *build_graph(DAG_FILENAME, simulate, seed, **task_options), speculation, affinity)
+
+
+def run_graph(client, graph: dict, tasks: dict[str, WorkflowTask], priorities: dict[str, float],
+              speculation: float = None, affinity: str = "worker") -> Iterator[WorkflowTask]:
+    """
+    :param graph: the dask graph, the tasks and the priorities (see graph_from_descriptions)
+    :return: a generator of the executed tasks, in completion order
+    """
+    groups = worker_groups(client, affinity)
+    if speculation is not None:
+        yield from run_speculative(client, graph, tasks, priorities, speculation, groups)
+        return
+    available = worker_resources(client)
+    submit_time = time.time()
+    for task in tasks.values():
+        submitted(task, submit_time)
+    # Single bulk submission of the whole graph, each task annotated with its priority, its resources and its retries
+    # dask may call the annotation functions after the submission: they only refer to dictionaries built here, not to
+    # the tasks (deleted below, so that the client does not hold them)
+    resources = {dag_id: task_resources(task.resources(), available) for dag_id, task in tasks.items()}
+    retries = {dag_id: task.retries for dag_id, task in tasks.items()}
+    annotations = dict(priority=priorities.__getitem__, resources=resources.__getitem__, retries=retries.__getitem__)
+    # and with the workers of its partition, if the workflow is partitioned (all its tasks are then)
+    if len(groups) != 0 and all([task.partition is not None for task in tasks.values()]):
+        workers = {dag_id: task_placement(task, groups)["workers"] for dag_id, task in tasks.items()}
+        annotations.update(workers=workers.__getitem__, allow_other_workers=True)
+    with dask.annotate(**annotations):
+        futures = dict(zip(graph, client.get(graph, list(graph), sync=False)))
+    del graph, tasks, priorities, annotations
+    yield from collect_results(futures)
+
+
+SPECULATION_INTERVAL = 1.  # How often (s) the running tasks are checked
+
+
+def run_speculative(client, graph: dict, tasks: dict[str, WorkflowTask], priorities: dict[str, float],
+                    speculation: float, groups: list[list[str]] = None) -> Iterator[WorkflowTask]:
+    """
+    :param speculation: a task running for longer than speculation times its expected runtime gets a copy
+    :param groups: the worker groups the partitions are mapped to (see worker_groups in helpers.py)
+    :return: a generator of the executed tasks, in completion order
+
+    The tasks are submitted by the client as soon as their parents are done (instead of all at once), so that the
+    first of the copies of a task to end is the one its children get:
+    + The expected runtime of a task is its runtime if known, the median execution time of the tasks of its level
+      that ended otherwise. The latter also gives the timeout of the tasks without runtime (see timeout_factor)
+    + When workers have idle threads, a copy of each task running for longer than speculation times its expected
+      runtime is submitted (once). The time a task has been running is measured by its worker (see running_attempts
+      in helpers.py), not from its submission: a task waiting for a thread is not a straggler
+    + The first copy to end wins and the command of the other one is killed (see cancel_attempt in helpers.py). Each
+      copy writes its own logs, but both write the same outputs: the commands should not append to their outputs
+    """
+    from dask.distributed import wait
+    available = worker_resources(client)
+    n_threads = sum([worker["nthreads"] for worker in client.scheduler_info()["workers"].values()])
+    levels = {}
+    children = {dag_id: [] for dag_id in graph}
+    n_waiting = {}  # dag_id -> number of parents not done yet
+    for dag_id, (_, _, parents) in graph.items():  # The tasks are in level order (see WFDAG.dump)
+        levels[dag_id] = 1 + max([levels[parent] for parent in parents], default=-1)
+        n_waiting[dag_id] = len(parents)
+        for parent in parents:
+            children[parent].append(dag_id)
+    n_children = {dag_id: len(dag_children) for dag_id, dag_children in children.items()}
+    execution_times = {}  # level -> execution times of the tasks of the level that ended
+    medians = {}  # level -> median of its execution times (cache)
+    results = {}  # dag_id -> executed task, until all its children are submitted
+    copies = {}  # dag_id -> futures of the copies of the task that are running
+    owners = {}  # future key -> dag_id
+    running = set()
+    speculated = set()  # dag_ids of the tasks that got a copy
+    copy_priority = max(priorities.values(), default=0.) + 1  # Copies go first: they are delaying the workflow
+
+    def expected_runtime(dag_id: str) -> float:
+        if tasks[dag_id].runtime is not None:
+            return tasks[dag_id].runtime
+        level = levels[dag_id]
+        if level not in medians and level in execution_times:
+            level_times = sorted(execution_times[level])
+            medians[level] = level_times[len(level_times) // 2]
+        return medians.get(level)
+
+    def submit(dag_id: str, key: str, priority: float, attempt: int = 0) -> None:
+        task = tasks[dag_id]
+        if task.timeout is None and task.timeout_factor is not None and expected_runtime(dag_id) is not None:
+            task.timeout = task.timeout_factor * expected_runtime(dag_id)
+        if attempt != 0:
+            task = task.new_attempt(attempt)  # The copies don't share their trace (with a local cluster in particular)
+        future = client.submit(execute_task, submitted(task), [results[parent] for parent in graph[dag_id][2]],
+                               key=key, priority=priority, retries=task.retries, pure=False,
+                               resources=task_resources(task.resources(), available),
+                               **task_placement(task, [] if groups is None else groups))
+        copies.setdefault(dag_id, []).append(future)
+        owners[future.key] = dag_id
+        running.add(future)
+
+    for dag_id in graph:
+        if n_waiting[dag_id] == 0:
+            submit(dag_id, dag_id, priorities[dag_id])
+    while len(running) != 0:
+        try:
+            done, _ = wait(list(running), timeout=SPECULATION_INTERVAL, return_when="FIRST_COMPLETED")
+        except TimeoutError:
+            done = []
+        for future in done:
+            running.discard(future)
+            dag_id = owners.pop(future.key)
+            if dag_id in results or dag_id not in copies:
+                continue  # A cancelled copy
+            if future.status != "finished":
+                copies[dag_id].remove(future)
+                if len(copies[dag_id]) == 0:
+                    future.result()  # Raises the exception of the task: the workflow fails
+                continue
+            task = future.result()
+            for copy in copies.pop(dag_id):
+                if copy is not future:
+                    logger.info("Cancelling copy %s of %s" % (copy.key, dag_id))
+                    running.discard(copy)
+                    owners.pop(copy.key, None)
+                    copy.cancel()
+                    client.run(cancel_attempt, copy.key)  # Cancelling does not stop a running task
+            future.release()
+            execution_times.setdefault(levels[dag_id], []).append(task.execution_time)
+            medians.pop(levels[dag_id], None)
+            results[dag_id] = task
+            for child in children.pop(dag_id):
+                n_waiting[child] -= 1
+                if n_waiting[child] == 0:
+                    submit(child, child, priorities[child])
+            for parent in graph.pop(dag_id)[2]:
+                n_children[parent] -= 1
+                if n_children[parent] == 0:
+                    del results[parent]  # Its children are submitted: it is no longer needed
+            if n_children[dag_id] == 0:
+                del results[dag_id]
+            if len(task.members) != 0:
+                yield from task.members  # Clusters are recorded task by task
+            else:
+                yield task
+        if len(running) >= n_threads:
+            continue  # No idle thread for the copies
+        candidates = [dag_id for dag_id in copies if dag_id not in speculated and expected_runtime(dag_id) is not None]
+        if len(candidates) == 0:
+            continue
+        running_times = {}  # dask key -> for how long the task has been running on its worker
+        for worker_running_times in client.run(running_attempts).values():
+            running_times.update(worker_running_times)
+        for dag_id in candidates:
+            expected = expected_runtime(dag_id)
+            if running_times.get(dag_id, 0.) > speculation * expected:
+                logger.info("Task %s running for %.1f s (%.1f s expected): submitting a copy" % (
+                    dag_id, running_times[dag_id], expected))
+                speculated.add(dag_id)
+                submit(dag_id, "%s-copy" % dag_id, copy_priority, 1)
+                if len(running) >= n_threads:
+                    break
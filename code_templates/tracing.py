@@ -0,0 +1,151 @@
+"""
+You don't need to modify this unless you know what you're doing
+
+Export of the execution trace recorded in run.json (see execute_task in helpers.py) to:
++ a Chrome/Perfetto trace (open it in https://ui.perfetto.dev or chrome://tracing): one track per worker thread, one
+  slice per task with its queue wait and its transfer time as arguments
++ the execution section of a WfFormat document (makespan, start and runtime of each task, machines)
+
+For each task, run.json holds its submission time, the time it was ready (its last parent ended), its start and end
+times and the worker it ran on. The queue wait of a task is the time between when it was both submitted and ready and
+when it started: the scheduler lag and the lack of idle workers. The data transfer times are not known by the tasks:
+they are taken from the dask task stream when available (application.py --trace).
+
+python tracing.py [run.json] [-c trace.json] [-w execution.json]
+"""
+import datetime
+import json
+
+
+def load_run(run_filename: str) -> list[dict]:
+    """
+    :return: the task records of run_filename that hold a trace
+    """
+    with open(run_filename) as fp:
+        return [record for record in json.load(fp) if record.get("start_time") is not None]
+
+
+def queue_wait(record: dict) -> float:
+    """
+    :return: the time the task waited for a worker once submitted and ready
+    """
+    ready_time = max([timestamp for timestamp in (record["submit_time"], record["ready_time"])
+                      if timestamp is not None], default=record["start_time"])
+    return max(0., record["start_time"] - ready_time)
+
+
+def task_stream_transfers(task_stream: list[dict]) -> dict[str, float]:
+    """
+    :param task_stream: the records of a dask task stream (see dask.distributed.get_task_stream)
+    :return: the time (s) spent transferring the data needed by each task, by dask key (dag_id)
+    """
+    transfers = {}
+    for record in task_stream:
+        transfer = sum([startstop["stop"] - startstop["start"] for startstop in record.get("startstops", [])
+                        if startstop["action"] == "transfer"])
+        if transfer != 0:
+            key = str(record["key"])
+            transfers[key] = transfers.get(key, 0.) + transfer
+    return transfers
+
+
+def _transfer(record: dict, transfers: dict[str, float]) -> float:
+    # The transfers of a cluster are those of its first member
+    dag_id, _, member = record["dag_id"].partition(".")
+    return transfers.get(dag_id, 0.) if member in ["", "0"] else 0.
+
+
+def chrome_trace(records: list[dict], transfers: dict[str, float] = None) -> dict:
+    """
+    :param records: the task records (see load_run)
+    :param transfers: the transfer time of each task, by dag_id (see task_stream_transfers)
+    :return: the Chrome trace (JSON object format)
+    """
+    transfers = {} if transfers is None else transfers
+    origin = min([min(record["submit_time"] or record["start_time"], record["start_time"]) for record in records],
+                 default=0.)
+    events = []
+    pids = {}  # worker -> pid
+    tids = {}  # (worker, thread) -> tid
+    for record in records:
+        if record["worker"] not in pids:
+            pids[record["worker"]] = len(pids)
+            events.append({"name": "process_name", "ph": "M", "pid": pids[record["worker"]],
+                           "args": {"name": record["worker"]}})
+        if (record["worker"], record["thread"]) not in tids:
+            tids[(record["worker"], record["thread"])] = len(tids)
+        events.append({"name": record["name"], "cat": "checkpointed" if record.get("checkpointed") else "task",
+                       "ph": "X", "ts": 1e6 * (record["start_time"] - origin),
+                       "dur": 1e6 * (record["end_time"] - record["start_time"]),
+                       "pid": pids[record["worker"]], "tid": tids[(record["worker"], record["thread"])],
+                       "args": {"dag_id": record["dag_id"], "queue_wait": queue_wait(record),
+                                "transfer": _transfer(record, transfers)}})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def _isoformat(timestamp: float) -> str:
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat()
+
+
+def wfformat_execution(records: list[dict]) -> dict:
+    """
+    :param records: the task records (see load_run)
+    :return: the "execution" section of a WfFormat document
+    """
+    start = min([record["start_time"] for record in records], default=0.)
+    end = max([record["end_time"] for record in records], default=0.)
+    return {"makespanInSeconds": end - start,
+            "executedAt": _isoformat(start),
+            "tasks": [{"id": record["name"], "runtimeInSeconds": record["end_time"] - record["start_time"],
+                       "executedAt": _isoformat(record["start_time"]), "machines": [record["worker"]]}
+                      for record in records],
+            "machines": [{"nodeName": worker} for worker in sorted({record["worker"] for record in records})]}
+
+
+def report(records: list[dict], transfers: dict[str, float] = None, n_stragglers: int = 5) -> str:
+    """
+    :return: where the makespan went: submission lag, queue waits, transfers and the longest tasks
+    """
+    transfers = {} if transfers is None else transfers
+    if len(records) == 0:
+        return "No traced task"
+    start = min([record["start_time"] for record in records])
+    end = max([record["end_time"] for record in records])
+    submit = min([record["submit_time"] or start for record in records])
+    waits = [queue_wait(record) for record in records]
+    rep = "%d tasks on %d workers: makespan %.3f s (%.3f s from submission to first start)\n" % (
+        len(records), len({record["worker"] for record in records}), end - start, start - submit)
+    rep += "Queue wait: %.3f s in total, %.3f s at most\n" % (sum(waits), max(waits))
+    rep += "Transfers: %.3f s in total\n" % sum([_transfer(record, transfers) for record in records])
+    for record in sorted(records, key=lambda record: record["start_time"] - record["end_time"])[:n_stragglers]:
+        rep += "Straggler %s (%s): %.3f s on %s\n" % (record["name"], record["dag_id"],
+                                                      record["end_time"] - record["start_time"], record["worker"])
+    return rep
+
+
+def export(run_filename: str = "run.json", transfers: dict[str, float] = None, trace_filename: str = "trace.json",
+           execution_filename: str = "execution.json") -> None:
+    """
+    Write the Chrome trace and the WfFormat execution section of the run in run_filename, and print a report
+    """
+    records = load_run(run_filename)
+    with open(trace_filename, "w") as fp:
+        json.dump(chrome_trace(records, transfers), fp)
+    with open(execution_filename, "w") as fp:
+        json.dump({"execution": wfformat_execution(records)}, fp, indent=1)
+    print(report(records, transfers))
+
+
+def process_arguments():
+    import argparse
+    import sys
+    parser = argparse.ArgumentParser(prog=sys.argv[0], description='Exports the execution trace of a run')
+    parser.add_argument("run_filename", help="Task records of the run", nargs="?", default="run.json")
+    parser.add_argument("-c", "--chrome_trace", help="Chrome/Perfetto trace file name", default="trace.json")
+    parser.add_argument("-w", "--wfformat", help="WfFormat execution section file name", default="execution.json")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = process_arguments()
+    export(args.run_filename, None, args.chrome_trace, args.wfformat)
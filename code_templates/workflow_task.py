@@ -6,6 +6,8 @@ You don't need to modify this unless you know what you're doing
 
 TODO The JSON should actually be a WFCTask
 """
+import copy
+import os
 import random
 import time
 
@@ -22,6 +24,26 @@ class WorkflowTask:
                  simulate_minimum_execution_time: float = 0.1,
                  simulate_maximum_execution_time: float = 1.1,
                  execution_time: float = None,  # This is an execution output
+                 members: list = None,
+                 runtime: float = None,
+                 cores: int = None,
+                 memory: int = None,
+                 timeout: float = None,
+                 sizes: dict[str, int] = None,
+                 time_compression: float = None,
+                 io_mode: str = None,
+                 partition: int = None,
+                 checkpoint: str = None,
+                 retries: int = 0,
+                 timeout_factor: float = None,
+                 attempt: int = 0,
+                 checkpointed: bool = False,  # This is an execution output
+                 submit_time: float = None,  # Those are execution outputs as well (see tracing.py)
+                 ready_time: float = None,
+                 start_time: float = None,
+                 end_time: float = None,
+                 worker: str = None,
+                 thread: int = None,
                  ):
         self.dag_id = dag_id
         self.name = name
@@ -33,10 +55,118 @@ class WorkflowTask:
         self.simulate_minimum_execution_time = simulate_minimum_execution_time
         self.simulate_maximum_execution_time = simulate_maximum_execution_time
         self.execution_time = execution_time
+        self.members = [] if members is None else members  # The WorkflowTasks of a cluster, executed in order
+        # From the WFCommons description (runtimeInSeconds, cores, memoryInBytes), None if unknown
+        self.runtime = runtime
+        self.cores = cores
+        self.memory = memory
+        # Maximum duration (s) of the command, None for no limit. By default, timeout_factor times the runtime if known
+        self.timeout = timeout if timeout is not None or timeout_factor is None or runtime is None \
+            else timeout_factor * runtime
+        self.timeout_factor = timeout_factor
+        # The copy of the task (see run_speculative in run_workflow_graph.py), 0 for the original. Each copy writes its
+        # own logs (see run_command in helpers.py)
+        self.attempt = attempt
+        self.retries = retries  # Number of times dask runs the task again if it fails (e.g. it times out)
+        self.sizes = sizes  # sizeInBytes of the input and output files (name -> size), if any is known
+        # Simulation options (see simulate_execution and simulate_io)
+        self.time_compression = time_compression
+        self.io_mode = io_mode
+        # The partition of the task (see wfc2dask/partitioning.py): the tasks of a partition preferably run together
+        self.partition = partition
+        # Checkpoint mode (see checkpoints.py), None to always execute the task
+        self.checkpoint = checkpoint
+        self.checkpointed = checkpointed  # True if the task was skipped, being done already
+        # Trace of the execution (timestamps are time.time() values): when the task was submitted to dask (client
+        # side), when its last parent ended, when it started and ended, and the dask worker and thread it ran on
+        self.submit_time = submit_time
+        self.ready_time = ready_time
+        self.start_time = start_time
+        self.end_time = end_time
+        self.worker = worker
+        self.thread = thread
+
+    def to_record(self) -> dict:
+        """
+        :return: what is recorded in run.json for this task (i.e. everything but the randomizer and the members of a
+        cluster, which are recorded individually)
+        """
+        return {key: value for key, value in self.__dict__.items() if key not in ["randomizer", "members"]}
+
+    def new_attempt(self, attempt: int) -> "WorkflowTask":
+        """
+        :param attempt: the number of the copy
+        :return: a copy of the task (and of its members), executed independently of the task
+        """
+        task = copy.copy(self)
+        task.attempt = attempt
+        task.members = [member.new_attempt(attempt) for member in self.members]
+        return task
+
+    def log_name(self) -> str:
+        """
+        :return: the name of the log files of the command of the task: its dag_id, suffixed by the number of the copy
+        """
+        return self.dag_id if self.attempt == 0 else "%s.%d" % (self.dag_id, self.attempt)
+
+    def is_simulated(self) -> bool:
+        """
+        :return: True if the task is simulated (see execute_task in helpers.py): simulation is on or it has no command
+        """
+        return self.simulate or self.command_arguments is None or len(self.command_arguments) == 0
+
+    def resources(self) -> dict[str, float]:
+        """
+        :return: the dask resources required by the task (only those that are known): "cores" and "memory" (bytes)
+        """
+        resources = {}
+        if self.cores is not None:
+            resources["cores"] = self.cores
+        if self.memory is not None:
+            resources["memory"] = self.memory
+        return resources
 
     def simulate_execution(self):
-        time.sleep(self.randomizer.uniform(self.simulate_minimum_execution_time,
-                                           self.simulate_maximum_execution_time))
+        """
+        Pretend to run: sleep the runtime of the task divided by time_compression if both are known, a random time
+        between simulate_minimum_execution_time and simulate_maximum_execution_time otherwise
+        """
+        if self.time_compression is not None and self.runtime is not None:
+            time.sleep(self.runtime / self.time_compression)
+        else:
+            time.sleep(self.randomizer.uniform(self.simulate_minimum_execution_time,
+                                               self.simulate_maximum_execution_time))
+
+    IO_MODES = ["write", "sparse", "preallocate"]
+    IO_BLOCK_SIZE = 1 << 20
+
+    def simulate_io(self) -> None:
+        """
+        Read the inputs of the task and write its outputs with their declared sizes (0 if unknown), so that the
+        storage is loaded as the actual workflow would load it. io_mode tells how outputs are written:
+        + write: actually write zeros (the storage bandwidth is used)
+        + sparse: create sparse files (only the metadata and the size)
+        + preallocate: allocate the blocks without writing them (posix_fallocate, sparse if not supported)
+        Missing inputs (e.g. external inputs) are ignored
+        """
+        for name in self.inputs:
+            try:
+                with open(name, "rb", buffering=0) as fp:
+                    while len(fp.read(self.IO_BLOCK_SIZE)) != 0:
+                        pass
+            except FileNotFoundError:
+                pass
+        for name in self.outputs:
+            size = 0 if self.sizes is None else self.sizes.get(name, 0)
+            with open(name, "wb") as fp:
+                if self.io_mode == "write":
+                    block = bytes(min(size, self.IO_BLOCK_SIZE))
+                    for offset in range(0, size, self.IO_BLOCK_SIZE):
+                        fp.write(block[:size - offset])
+                elif self.io_mode == "preallocate" and size != 0 and hasattr(os, "posix_fallocate"):
+                    os.posix_fallocate(fp.fileno(), 0, size)
+                else:
+                    fp.truncate(size)
 
     def pythonize(self, randomizer_varname: str = "randomizer") -> list[str]:
         codelines = ["WorkflowTask(dag_id = '%s'," % self.dag_id,
@@ -48,5 +178,19 @@ class WorkflowTask:
                      "             randomizer = %s," % randomizer_varname,
                      "             simulate_minimum_execution_time = %s," % self.simulate_minimum_execution_time,
                      "             simulate_maximum_execution_time = %s," % self.simulate_maximum_execution_time,
-                     "             )"]
+                     "             runtime = %s," % self.runtime,
+                     "             cores = %s," % self.cores,
+                     "             memory = %s," % self.memory,
+                     "             timeout = %s," % self.timeout,
+                     "             sizes = %s," % self.sizes,
+                     "             **task_options,"]
+        if self.partition is not None:
+            codelines.insert(-1, "             partition = %d," % self.partition)
+        if len(self.members) != 0:
+            codelines.append("             members = [")
+            for member in self.members:
+                codelines.extend(["                 %s" % codeline for codeline in member.pythonize(randomizer_varname)])
+                codelines[-1] += ","
+            codelines.append("             ],")
+        codelines.append("             )")
         return codelines
@@ -0,0 +1,11 @@
+"""
+The code templates (see code_templates) import each other as top-level modules, as they do in a generated project:
+importing this module puts them on sys.path so that the tests can import them the same way
+"""
+import os
+import sys
+
+
+TEMPLATE_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "code_templates")
+if TEMPLATE_DIRECTORY not in sys.path:
+    sys.path.insert(0, TEMPLATE_DIRECTORY)
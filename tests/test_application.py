@@ -0,0 +1,52 @@
+import io
+import json
+import subprocess
+import sys
+import unittest
+from unittest import mock
+
+import templates  # noqa: F401 (the templates are imported as top-level modules)
+from application import process_arguments, write_run
+from workflow_task import WorkflowTask
+
+
+class TestApplication(unittest.TestCase):
+    def test_write_run(self):
+        tasks = [WorkflowTask(dag_id="dv_%d" % index, name="t%d" % index, execution_time=index) for index in range(3)]
+        fp = io.StringIO()
+        write_run(iter(tasks), fp)
+        records = json.loads(fp.getvalue())
+        self.assertEqual([task.to_record() for task in tasks], records)
+        self.assertNotIn("randomizer", records[0])
+        # One record per line, written as the tasks come
+        lines = fp.getvalue().splitlines()
+        self.assertEqual(["[", "]"], [lines[0], lines[-1]])
+        self.assertEqual([task.to_record() for task in tasks], [json.loads(line.rstrip(",")) for line in lines[1:-1]])
+        fp = io.StringIO()
+        write_run([], fp)
+        self.assertEqual([], json.loads(fp.getvalue()))
+
+    def test_write_failed_run(self):
+        # The second task fails: the record of the first one is readable
+        def failing_tasks():
+            yield WorkflowTask(dag_id="dv_0", name="t0", execution_time=1.)
+            raise subprocess.CalledProcessError(1, ["false"])
+
+        fp = io.StringIO()
+        with self.assertRaises(subprocess.CalledProcessError):
+            write_run(failing_tasks(), fp)
+        self.assertEqual(["dv_0"], [record["dag_id"] for record in json.loads(fp.getvalue())])
+
+    def test_adaptive(self):
+        with mock.patch.object(sys, "argv", ["application.py", "--adaptive", "4"]):
+            self.assertEqual(4, process_arguments().adaptive)
+        # Only a local cluster is scaled
+        with mock.patch.object(sys, "argv", ["application.py", "--adaptive", "4", "--scheduler", "tcp://host:8786"]), \
+                mock.patch("sys.stderr", io.StringIO()) as stderr:
+            with self.assertRaises(SystemExit):
+                process_arguments()
+        self.assertIn("--adaptive", stderr.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
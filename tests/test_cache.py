@@ -0,0 +1,36 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from wfc2dask.cache import ConversionCache
+
+
+class TestConversionCache(unittest.TestCase):
+    def test_put_get(self):
+        in_fn = "samples/unittests/hello-world-join.json"
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = ConversionCache(os.path.join(tmpdir, "cache"))
+            key = ConversionCache.key(in_fn, {"codegen": False})
+            self.assertNotEqual(key, ConversionCache.key(in_fn, {"codegen": True}))
+            with mock.patch.object(ConversionCache, "BLOCK_SIZE", 7):  # The file is hashed block by block
+                self.assertEqual(key, ConversionCache.key(in_fn, {"codegen": False}))
+            project = os.path.join(tmpdir, "project")
+            os.makedirs(project)
+            os.makedirs(os.path.join(project, "logs"))
+            # The leftovers of a run of the project are not cached
+            for filename in ["run_workflow.py", "run.json", "checkpoints.sqlite", "logs/dv_0.out"]:
+                with open(os.path.join(project, filename), "w") as fp:
+                    fp.write("pass\n")
+            self.assertFalse(cache.get(key, os.path.join(tmpdir, "copy"), False))
+            cache.put(key, project, ["run_workflow.py"])
+            self.assertTrue(cache.get(key, os.path.join(tmpdir, "copy"), False))
+            self.assertEqual(["run_workflow.py"], os.listdir(os.path.join(tmpdir, "copy")))
+            self.assertEqual(["project", "size"], sorted(os.listdir(os.path.join(cache.directory, key))))
+            cache.max_size = 0
+            cache.evict()
+            self.assertFalse(cache.get(key, os.path.join(tmpdir, "other_copy"), False))
+
+
+if __name__ == '__main__':
+    unittest.main()
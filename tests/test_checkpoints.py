@@ -0,0 +1,87 @@
+import os
+import sys
+import tempfile
+import unittest
+
+import templates  # noqa: F401 (the templates are imported as top-level modules)
+import checkpoints
+from helpers import execute_task, submitted
+from workflow_task import WorkflowTask
+
+
+# Copies its input to its output
+COPY = "import shutil, sys; shutil.copyfile(sys.argv[1], sys.argv[2])"
+
+
+class TestCheckpoints(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.TemporaryDirectory()
+        os.chdir(self.directory.name)  # The database, the logs and the files are in the current directory
+        with open("in.dat", "w") as fp:
+            fp.write("data")
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    @staticmethod
+    def execute(simulate: bool = False, checkpoint: str = "stat", **options) -> WorkflowTask:
+        task = WorkflowTask(dag_id="dv_0", name="copy", command_arguments=[sys.executable, "-c", COPY, "in.dat",
+                                                                           "out.dat"],
+                            inputs=["in.dat"], outputs=["out.dat"], simulate=simulate, checkpoint=checkpoint,
+                            simulate_minimum_execution_time=0., simulate_maximum_execution_time=0., **options)
+        return execute_task(submitted(task), [])
+
+    def test_skip(self):
+        self.assertFalse(self.execute().checkpointed)
+        self.assertTrue(self.execute().checkpointed)
+        # A changed input, a missing output: run again
+        with open("in.dat", "w") as fp:
+            fp.write("other data")
+        self.assertFalse(self.execute().checkpointed)
+        with open("out.dat") as fp:
+            self.assertEqual("other data", fp.read())
+        os.remove("out.dat")
+        self.assertFalse(self.execute().checkpointed)
+        self.assertTrue(os.path.exists("out.dat"))
+        # Another command
+        task = self.execute()
+        key = checkpoints.task_key(task)
+        task.command_arguments = task.command_arguments + ["more"]
+        self.assertNotEqual(key, checkpoints.task_key(task))
+
+    def test_hash(self):
+        self.assertFalse(self.execute(checkpoint="hash").checkpointed)
+        with open("in.dat", "w") as fp:
+            fp.write("data")  # Rewritten with the same contents
+        self.assertTrue(self.execute(checkpoint="hash").checkpointed)
+        self.assertIsNone(checkpoints.file_state("missing.dat", "hash"))
+
+    def test_simulated(self):
+        # A simulated run does not make a real run skip the task, nor does a simulation with other options
+        self.assertFalse(self.execute(simulate=True).checkpointed)
+        self.assertTrue(self.execute(simulate=True).checkpointed)
+        self.assertFalse(self.execute(simulate=True, io_mode="sparse").checkpointed)
+        self.assertEqual(0, os.path.getsize("out.dat"))
+        self.assertFalse(self.execute().checkpointed)
+        with open("out.dat") as fp:
+            self.assertEqual("data", fp.read())
+        self.assertTrue(self.execute().checkpointed)
+
+    def test_cluster(self):
+        # The members of a cluster are checkpointed one by one
+        members = [WorkflowTask(dag_id="dv_0.%d" % index, name="m%d" % index, inputs=[], outputs=["m%d.dat" % index],
+                                simulate=True, checkpoint="stat", simulate_minimum_execution_time=0.,
+                                simulate_maximum_execution_time=0.) for index in range(2)]
+        cluster = execute_task(submitted(WorkflowTask(dag_id="dv_0", name="cluster", members=members)), [])
+        self.assertEqual([False, False], [member.checkpointed for member in cluster.members])
+        os.remove("m1.dat")
+        for member in members:
+            member.checkpointed = False
+        cluster = execute_task(submitted(cluster), [])
+        self.assertEqual([True, False], [member.checkpointed for member in cluster.members])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+
+from wfc2dask.clustering import cluster_dag
+from wfc2dask.wfdag import WFDAG
+from workflows import fan_wfdag, new_task, new_wfdag
+
+
+class TestClustering(unittest.TestCase):
+    @staticmethod
+    def levels(wfdag: WFDAG) -> list[list[list[str]]]:
+        return [[[member.name for member in wfdag.dag_tasks[_id].wfctask.members] for _id in tasks]
+                for tasks in wfdag.ordered_tasks]
+
+    def test_chains(self):
+        clustered = cluster_dag(fan_wfdag())
+        clustered.build_dag()
+        self.assertEqual([[["a", "b", "c"]], [["d1"], ["d2"], ["d3"], ["d4"], ["d5"]], [["e"]]],
+                         self.levels(clustered))
+        self.assertEqual(5., clustered.critical_path()[1])
+
+    def test_batches(self):
+        clustered = cluster_dag(fan_wfdag(), fuse_chains=False, batch_size=2)
+        clustered.build_dag()
+        self.assertEqual([[["a"]], [["b"]], [["c"]], [["d1", "d2"], ["d3", "d4"], ["d5"]], [["e"]]],
+                         self.levels(clustered))
+        self.assertEqual({"d1+1", "d3+1", "d5"}, clustered.dag_tasks["dv_6"].wfctask.parents)
+
+    def test_names(self):
+        # The tasks a+1 and a+1.2 exist already: the batch of a and b is named a+1.3
+        wfdag = new_wfdag("names", [new_task(name, ["root"]) for name in ["a", "b", "a+1", "a+1.2"]] +
+                          [new_task("root")])
+        clustered = cluster_dag(wfdag, fuse_chains=False, batch_size=2)
+        clustered.build_dag()
+        self.assertEqual({"root", "a+1.3", "a+1+1"}, set(clustered.wftasks))
+
+    def test_batch_runtime(self):
+        clustered = cluster_dag(fan_wfdag(), batch_size=10, batch_runtime=3.)
+        clustered.build_dag()
+        self.assertEqual([[["a", "b", "c"]], [["d1", "d2", "d3"], ["d4", "d5"]], [["e"]]], self.levels(clustered))
+
+    def test_batch_runtime_only(self):
+        # Without batch_size, the size of the batches is not limited
+        clustered = cluster_dag(fan_wfdag(), fuse_chains=False, batch_runtime=4.)
+        clustered.build_dag()
+        self.assertEqual([[["a"]], [["b"]], [["c"]], [["d1", "d2", "d3", "d4"], ["d5"]], [["e"]]],
+                         self.levels(clustered))
+        clustered = cluster_dag(fan_wfdag(), fuse_chains=False, batch_runtime=100.)
+        clustered.build_dag()
+        self.assertEqual([["d1", "d2", "d3", "d4", "d5"]], self.levels(clustered)[3])
+        # Neither: no batches
+        self.assertEqual(9, len(cluster_dag(fan_wfdag(), fuse_chains=False).wftasks))
+
+
+if __name__ == '__main__':
+    unittest.main()
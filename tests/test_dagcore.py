@@ -0,0 +1,67 @@
+import unittest
+
+from wfc2dask.dagcore import DAGCore
+
+
+class TestDAGCore(unittest.TestCase):
+    def test_adjacency(self):
+        # 0 -> 2, 1 -> 2, 0 -> 3, 2 -> 3
+        core = DAGCore([[], [], [1, 0], [2, 0]])
+        self.assertEqual([[], [], [0, 1], [0, 2]], [list(core.parents(task_id)) for task_id in range(4)])
+        self.assertEqual([[2, 3], [2], [3], []], [list(core.children(task_id)) for task_id in range(4)])
+
+    def test_order(self):
+        core = DAGCore([[3], [], [0, 1], []])
+        self.assertEqual([], core.order())
+        self.assertEqual([[1, 3], [0], [2]], [list(core.level(level)) for level in range(core.n_levels)])
+
+    def test_cycle(self):
+        # 0 -> 1 -> 2 -> 1, 2 -> 3
+        core = DAGCore([[], [0, 2], [1], [2]])
+        self.assertIn(core.order(), [[1, 2, 1], [2, 1, 2]])
+
+    def test_transitive_reduction(self):
+        # 0 -> 1 -> 2 -> 3, plus the redundant 0 -> 2, 0 -> 3 and 1 -> 3; 4 -> 3 is needed
+        core = DAGCore([[], [0], [0, 1], [0, 1, 2, 4], []])
+        core.order()
+        self.assertEqual(3, core.transitive_reduction())
+        self.assertEqual([[], [0], [1], [2, 4], []], [list(core.parents(task_id)) for task_id in range(5)])
+        self.assertEqual([[1], [2], [3], [], [3]], [list(core.children(task_id)) for task_id in range(5)])
+        self.assertEqual([[0, 4], [1], [2], [3]], [list(core.level(level)) for level in range(core.n_levels)])
+        self.assertEqual(0, core.transitive_reduction())
+
+    def test_extend(self):
+        # 0 -> 1, then 2 with parents 1 and 0, 3 with parent 2, and the dependency 3 -> 0
+        core = DAGCore([[], [0]], [{}, {0: 10}])
+        core.order()
+        ranks = core.upward_ranks([1., 1.])
+        self.assertEqual(range(2, 4), core.extend([[1, 0], [2]], [{1: 5}, {}]))
+        core.add_dependency(3, 0, 7)
+        self.assertEqual([[3], [0], [0, 1], [2]], [list(core.parents(task_id)) for task_id in range(4)])
+        self.assertEqual([[1, 2], [2], [3], [0]], [list(core.children(task_id)) for task_id in range(4)])
+        self.assertEqual([[(3, 7)], [(0, 10)], [(1, 5)], []], [list(core.flows(task_id)) for task_id in range(4)])
+        # The dependency and the flow kept apart are counted
+        self.assertEqual((5, 22), (core.n_dependencies, core.n_flow_bytes))
+        self.assertNotEqual([], core.update_order([2, 3, 0]))
+        # Without the cycle: 3 -> 4 -> 0
+        core = DAGCore([[], [0]])
+        core.order()
+        core.extend([[1, 0], [], [3]])
+        core.add_dependency(4, 0)
+        self.assertEqual([], core.update_order([2, 3, 4, 0]))
+        self.assertEqual([[3], [4], [0], [1], [2]], [list(core.level(level)) for level in range(core.n_levels)])
+        core.update_upward_ranks(ranks, lambda task_id: 1., [2, 3, 4])
+        self.assertEqual([3., 2., 1., 5., 4.], list(ranks))
+        # Compacting changes nothing
+        levels = [list(core.level(level)) for level in range(core.n_levels)]
+        children = [list(core.children(task_id)) for task_id in range(5)]
+        n_dependencies = core.n_dependencies
+        core.compact()
+        self.assertEqual(0, core.n_extra)
+        self.assertEqual(n_dependencies, core.n_dependencies)
+        self.assertEqual(children, [list(core.children(task_id)) for task_id in range(5)])
+        self.assertEqual(levels, [list(core.level(level)) for level in range(core.n_levels)])
+
+
+if __name__ == '__main__':
+    unittest.main()
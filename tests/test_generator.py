@@ -0,0 +1,25 @@
+import os
+import tempfile
+import unittest
+
+from benchmarks.generator import SHAPES, write_workflow
+from wfc2dask.wfdag import WFDAG
+
+
+class TestGenerator(unittest.TestCase):
+    def test_shapes(self):
+        # shape -> number of tasks, number of levels
+        expected = {"chain": (50, 50), "fork_join": (50, 11), "layered": (50, 5), "montage": (47, 9), "blast": (50, 3)}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for shape in SHAPES:
+                filename = os.path.join(tmpdir, "%s.json" % shape)
+                n_dependencies = write_workflow(filename, shape, 50, width=10, density=2, external_inputs=2)
+                wfdag = WFDAG.load(filename)
+                wfdag.build_dag()
+                self.assertEqual(expected[shape], (len(wfdag.dag_tasks), len(wfdag.ordered_tasks)), shape)
+                self.assertEqual(n_dependencies, len(wfdag._core.parent_ids), shape)
+                self.assertEqual(2 * len(wfdag.dag_tasks), len(wfdag.external_inputs), shape)
+
+
+if __name__ == '__main__':
+    unittest.main()
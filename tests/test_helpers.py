@@ -0,0 +1,77 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import templates  # noqa: F401 (the templates are imported as top-level modules)
+from helpers import collect_results, max_processes, run_command
+from workflow_task import WorkflowTask
+
+
+class FakeFuture:
+    def __init__(self, task: WorkflowTask):
+        self.task = task
+        self.released = False
+
+    def release(self):
+        self.released = True
+
+
+class TestHelpers(unittest.TestCase):
+    def test_collect_results(self):
+        cluster = WorkflowTask(dag_id="dv_1", name="cluster", members=[WorkflowTask(dag_id="dv_1.0", name="b"),
+                                                                         WorkflowTask(dag_id="dv_1.1", name="c")])
+        futures = {"dv_0": FakeFuture(WorkflowTask(dag_id="dv_0", name="a")), "dv_1": FakeFuture(cluster)}
+        # The futures complete in the reverse order of their submission
+        completed = [(future, future.task) for future in reversed(list(futures.values()))]
+        with mock.patch("dask.distributed.as_completed", return_value=completed) as as_completed:
+            tasks = collect_results(futures)
+            self.assertEqual(["b", "c", "a"], [task.name for task in tasks])
+        self.assertEqual({}, futures)  # The client does not hold the futures any longer
+        self.assertTrue(all([future.released for future, _ in completed]))
+        self.assertEqual(2, len(as_completed.call_args[0][0]))
+        self.assertTrue(as_completed.call_args[1]["with_results"])
+
+
+class TestRunCommand(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.TemporaryDirectory()
+        os.chdir(self.directory.name)  # The logs go to ./logs
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    @staticmethod
+    def python_task(code: str, *arguments: str, timeout: float = None) -> WorkflowTask:
+        return WorkflowTask(dag_id="dv_0", name="t", command_arguments=[sys.executable, "-c", code, *arguments],
+                            timeout=timeout)
+
+    def test_arguments(self):
+        # The arguments are passed as they are: no splitting, no quote removal
+        run_command(self.python_task("import sys; print(sys.argv[1:])", "two words", "it's", '"quoted"'))
+        with open(os.path.join("logs", "dv_0.out")) as fp:
+            self.assertEqual(repr(["two words", "it's", '"quoted"']), fp.read().strip())
+
+    def test_failure(self):
+        with self.assertRaises(subprocess.CalledProcessError):
+            run_command(self.python_task("import sys; sys.stderr.write('oops'); sys.exit(3)"))
+        with open(os.path.join("logs", "dv_0.err")) as fp:
+            self.assertEqual("oops", fp.read())
+        with self.assertRaises(subprocess.TimeoutExpired):
+            run_command(self.python_task("import time; time.sleep(10)", timeout=0.2))
+
+    def test_max_processes(self):
+        from dask.distributed import Client, LocalCluster
+        self.assertEqual(os.cpu_count(), max_processes())  # Outside of a worker
+        for resources, expected in [(None, 3), ({"cores": 2}, 2)]:
+            with LocalCluster(n_workers=1, threads_per_worker=3, processes=False, resources=resources,
+                              dashboard_address=None) as cluster, Client(cluster) as client:
+                self.assertEqual(expected, client.submit(max_processes).result())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+from wfc2dask.clustering import cluster_dag
+from wfc2dask.partitioning import cut_bytes, partition_dag, total_bytes
+from workflows import new_task, new_wfdag, pipelines_wfdag
+
+
+class TestPartitioning(unittest.TestCase):
+    def test_flows(self):
+        wfdag = pipelines_wfdag(2, 3)
+        self.assertEqual([(0, 100)], list(wfdag._core.flows(1)))
+        self.assertEqual([], list(wfdag._core.flows(0)))
+        self.assertEqual(4 * 100, total_bytes(wfdag))
+
+    def test_incremental_flows(self):
+        # a reads x (external so far) and b reads a.out, then x is produced by a task added after them: its flow is
+        # kept apart from the arrays of the DAG core
+        wfdag = new_wfdag("incremental", [new_task("a", inputs=["x"], outputs=["a.out"], sizes={"a.out": 100}),
+                                          new_task("b", inputs=["a.out"])])
+        wfdag.add_task(new_task("c", outputs=["x"], sizes={"x": 50}))
+        wfdag.build_dag()
+        self.assertNotEqual({}, wfdag._core.extra_flows)
+        self.assertEqual(150, total_bytes(wfdag))
+
+    def test_pipelines(self):
+        wfdag = pipelines_wfdag()
+        partitions = partition_dag(wfdag, 4)
+        self.assertEqual(0, cut_bytes(wfdag, partitions))
+        # Each level is spread over the partitions
+        for level in range(wfdag._core.n_levels):
+            self.assertEqual({0, 1, 2, 3}, {partitions[task_id] for task_id in wfdag._core.level(level)})
+
+    def test_balance(self):
+        wfdag = pipelines_wfdag()
+        partitions = partition_dag(wfdag, 2, imbalance=0.)
+        self.assertEqual(0, cut_bytes(wfdag, partitions))
+        for level in range(wfdag._core.n_levels):
+            self.assertEqual([2, 2], [[partitions[task_id] for task_id in wfdag._core.level(level)].count(partition)
+                                      for partition in range(2)])
+
+    def test_clusters(self):
+        # The chains are fused: the clusters exchange no data
+        clustered = cluster_dag(pipelines_wfdag())
+        clustered.build_dag()
+        self.assertEqual(0, total_bytes(clustered))
+        # Batches of 2 pipeline stages: the batches read from the batches of the previous stage
+        clustered = cluster_dag(pipelines_wfdag(), fuse_chains=False, batch_size=2)
+        clustered.build_dag()
+        self.assertEqual(4 * 4 * 100, total_bytes(clustered))
+
+    def test_dump(self):
+        wfdag = pipelines_wfdag(2, 2)
+        wfdag.partitions = partition_dag(wfdag, 2)
+        self.assertIn("partition", wfdag._dag_task_description(0))
+        self.assertIn("**task_placement(TASKS['dv_1'], WORKER_GROUPS)", wfdag._dask_submit_codeline(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
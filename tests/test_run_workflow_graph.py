@@ -0,0 +1,81 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import templates  # noqa: F401 (the templates are imported as top-level modules)
+from dask.distributed import Client, LocalCluster
+import run_workflow_graph
+from run_workflow_graph import graph_from_descriptions, run_graph
+from wfc2dask.wfdag import WFDAG
+
+
+class TestRunWorkflowGraph(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.cwd = os.getcwd()
+        cls.wfdag = WFDAG.load("samples/unittests/hello-world-join.json")
+        cls.wfdag.build_dag()
+        os.chdir(cls.directory.name)  # The simulated tasks create their outputs in the current directory
+        cls.client = Client(LocalCluster(n_workers=2, threads_per_worker=2, processes=False,
+                                         resources={"cores": 2}, dashboard_address=None))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.close()
+        cls.client.cluster.close()
+        os.chdir(cls.cwd)
+        cls.directory.cleanup()
+
+    def run_wfdag(self, partitioned: bool = False, **options) -> list:
+        descriptions = list(self.wfdag.task_descriptions())
+        for index, description in enumerate(descriptions):
+            description["cores"] = 1  # Annotated as a dask resource
+            if partitioned:
+                description["partition"] = index % 2
+        graph, tasks, priorities = graph_from_descriptions(descriptions, True, 42, simulate_minimum_execution_time=0.,
+                                                           simulate_maximum_execution_time=0.01, **options)
+        return list(run_graph(self.client, graph, tasks, priorities))
+
+    def test_run_graph(self):
+        for partitioned in [False, True]:
+            tasks = self.run_wfdag(partitioned, retries=1)
+            self.assertEqual(["dv_0", "dv_1", "dv_2"], sorted([task.dag_id for task in tasks]))
+            self.assertEqual("dv_2", tasks[-1].dag_id)  # The join ends last
+            self.assertEqual(max([task.end_time for task in tasks[:2]]), tasks[-1].ready_time)
+            self.assertTrue(all([task.worker in self.client.scheduler_info()["workers"] for task in tasks]))
+            self.assertTrue(os.path.exists("helloworld.dat"))
+            os.remove("helloworld.dat")
+
+    def test_speculation(self):
+        # The first run of the command writes its pid and straggles, the copy sees the pid file and ends right away
+        straggler = "import os, sys, time\n" \
+                    "if os.path.exists('pid'):\n    sys.exit(0)\n" \
+                    "open('pid', 'w').write('%d' % os.getpid())\n" \
+                    "time.sleep(60)\n"
+        descriptions = [{"dag_id": "dv_0", "name": "straggler", "command_arguments": [sys.executable, "-c", straggler],
+                         "inputs": [], "outputs": [], "runtime": 0.1, "parents": [], "priority": 1.}]
+        graph, tasks, priorities = graph_from_descriptions(descriptions, False, 42)
+        start = time.time()
+        with mock.patch.object(run_workflow_graph, "SPECULATION_INTERVAL", 0.1):
+            tasks = list(run_graph(self.client, graph, tasks, priorities, speculation=2.))
+        self.assertLess(time.time() - start, 30.)
+        self.assertEqual(1, tasks[0].attempt)  # The copy won
+        self.assertTrue(os.path.exists(os.path.join("logs", "dv_0.1.out")))
+        with open("pid") as fp:
+            pid = int(fp.read())
+        for _ in range(100):  # The command of the original is killed
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                break
+            time.sleep(0.1)
+        else:
+            self.fail("The command of the cancelled task is still running")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import templates  # noqa: F401 (the templates are imported as top-level modules)
+from dask.distributed import Client, LocalCluster
+from wfc2dask.service import WorkflowService, _RequestHandler, load_workflow, parse_options
+
+
+DOCUMENT = {"name": "small", "workflow": {"tasks": [
+    {"name": "a", "files": [{"link": "output", "name": "a.out", "sizeInBytes": 10}]},
+    {"name": "b", "parents": ["a"], "files": [{"link": "input", "name": "a.out"},
+                                              {"link": "output", "name": "b.out"}]},
+    {"name": "c", "parents": ["a", "b"], "files": [{"link": "input", "name": "b.out"}]}]}}
+
+
+class TestService(unittest.TestCase):
+    def test_options(self):
+        options = parse_options("time_compression=10&simulate=0&retries=2")
+        self.assertEqual(10., options["time_compression"])
+        self.assertFalse(options["simulate"])
+        self.assertEqual(2, options["retries"])
+        self.assertEqual(42, options["seed"])
+        self.assertTrue(options["wait"])
+        with self.assertRaises(Exception):
+            parse_options("unknown=1")
+
+    def test_load_workflow(self):
+        wfdag = load_workflow(DOCUMENT)
+        self.assertEqual("small", wfdag.workflow_name)
+        descriptions = list(wfdag.task_descriptions())
+        self.assertEqual(["a", "b", "c"], [description["name"] for description in descriptions])
+        self.assertEqual(["dv_0", "dv_1"], descriptions[2]["parents"])
+        wfdag = load_workflow(DOCUMENT, reduce=True)
+        self.assertEqual(["dv_1"], list(wfdag.task_descriptions())[2]["parents"])
+
+
+class TestServiceHTTP(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.cwd = os.getcwd()
+        os.chdir(cls.directory.name)  # The simulated tasks create their outputs in the current directory
+        cls.client = Client(LocalCluster(n_workers=1, threads_per_worker=2, processes=False, dashboard_address=None))
+        _RequestHandler.service = WorkflowService(cls.client, max_finished=1)
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _RequestHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = "http://127.0.0.1:%d/workflows" % cls.server.server_address[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.client.close()
+        cls.client.cluster.close()
+        os.chdir(cls.cwd)
+        cls.directory.cleanup()
+
+    def submit(self, query: str) -> list[dict]:
+        request = urllib.request.Request("%s?%s" % (self.url, query), data=json.dumps(DOCUMENT).encode())
+        with urllib.request.urlopen(request) as response:
+            return [json.loads(line) for line in response]
+
+    def get(self, path: str = "") -> dict:
+        with urllib.request.urlopen(self.url + path) as response:
+            return json.load(response)
+
+    def test_run(self):
+        # In the background: the status is polled
+        lines = self.submit("wait=0")
+        self.assertEqual(1, len(lines))
+        self.assertEqual(("small", 3, "running"), (lines[0]["name"], lines[0]["n_tasks"], lines[0]["status"]))
+        workflow_id = lines[0]["workflow"]
+        for _ in range(300):
+            status = self.get("/%s" % workflow_id)
+            if status["status"] != "running":
+                break
+            time.sleep(0.1)
+        self.assertEqual(("done", 3), (status["status"], status["n_completed"]))
+        self.assertIsNotNone(status["overhead"])
+        # Waiting for the end: the status, the records of the tasks, then the final status
+        lines = self.submit("seed=1")
+        self.assertEqual(["running", "done"], [lines[0]["status"], lines[-1]["status"]])
+        self.assertEqual(["a", "b", "c"], sorted([line["name"] for line in lines[1:-1]]))
+        # Only the last workflow that ended is kept
+        self.assertEqual([lines[-1]["workflow"]], [status["workflow"] for status in self.get()])
+        with self.assertRaises(urllib.error.HTTPError):
+            self.get("/%s" % workflow_id)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+from array import array
+from wfc2dask.simulator import simulate
+from workflows import new_task, new_wfdag
+
+
+class TestSimulator(unittest.TestCase):
+    def test_join(self):
+        # a (1 s) and b (2 s) -> c (1 s)
+        wfdag = new_wfdag("simulated", [new_task("a", runtime=1.), new_task("b", runtime=2.),
+                                         new_task("c", ["a", "b"], runtime=1.)])
+        result = simulate(wfdag, 2)
+        self.assertEqual(3., result.makespan)
+        self.assertEqual(2., result.starts[2])
+        self.assertEqual([(0., 2.), (2., 3.)], result.level_times())
+        self.assertAlmostEqual(4. / 6., result.utilization)
+        self.assertEqual(4., simulate(wfdag, 1).makespan)
+        self.assertEqual(3., result.critical_path_length)
+
+    def test_policy(self):
+        # On two workers, starting "long" (it heads a 3 s chain) first saves time
+        wfdag = new_wfdag("simulated", [new_task("short1", runtime=1.), new_task("short2", runtime=1.),
+                                         new_task("long", runtime=1.), new_task("tail", ["long"], runtime=2.)])
+        self.assertEqual(3., simulate(wfdag, 2, "critical_path").makespan)
+        self.assertEqual(4., simulate(wfdag, 2, "fifo").makespan)
+
+    def test_random_durations(self):
+        wfdag = new_wfdag("simulated", [new_task("a"), new_task("b", ["a"])])
+        result = simulate(wfdag, 4, seed=1)
+        self.assertEqual(result.makespan, simulate(wfdag, 4, seed=1).makespan)
+        self.assertTrue(0.2 <= result.makespan <= 2.2)
+
+    def test_speculation(self):
+        # a, b and c (1 s) -> d (1 s), b straggling (10 s instead of 1 s)
+        wfdag = new_wfdag("simulated", [new_task(name, runtime=1.) for name in ["a", "b", "c"]] +
+                          [new_task("d", ["a", "b", "c"], runtime=1.)])
+        expected = array('d', [1., 1., 1., 1.])
+        durations = array('d', [1., 10., 1., 1.])
+        self.assertEqual(11., simulate(wfdag, 4, durations=durations, expected_durations=expected).makespan)
+        # b is copied at 2 s (on a worker idle since 1 s), the copy ends at 3 s and d at 4 s
+        result = simulate(wfdag, 4, durations=durations, expected_durations=expected, speculation=2.)
+        self.assertEqual(4., result.makespan)
+        self.assertEqual(1, result.n_speculated)
+        self.assertEqual(3., result.ends[1])
+        # Without an idle worker, no copy
+        self.assertEqual(0, simulate(wfdag, 1, durations=durations, expected_durations=expected,
+                                     speculation=2.).n_speculated)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+import templates  # noqa: F401 (the templates are imported as top-level modules)
+import tracing
+
+
+def record(dag_id: str, name: str, submit: float, ready: float, start: float, end: float, worker: str = "w1",
+           thread: int = 1) -> dict:
+    return {"dag_id": dag_id, "name": name, "submit_time": submit, "ready_time": ready, "start_time": start,
+            "end_time": end, "worker": worker, "thread": thread, "checkpointed": False}
+
+
+# a (w1) -> b (w2, after a 0.5 s wait); c never started (e.g. the run was interrupted)
+RECORDS = [record("dv_0", "a", 100., None, 100.5, 101.), record("dv_1", "b", 100., 101., 101.5, 103., "w2", 7),
+           dict(record("dv_2", "c", 100., None, None, None), start_time=None)]
+
+
+class TestTracing(unittest.TestCase):
+    def test_queue_wait(self):
+        self.assertEqual(0.5, tracing.queue_wait(RECORDS[0]))
+        self.assertEqual(0.5, tracing.queue_wait(RECORDS[1]))
+        self.assertEqual(0., tracing.queue_wait(dict(RECORDS[1], ready_time=102.)))
+
+    def test_task_stream_transfers(self):
+        task_stream = [{"key": "dv_1", "startstops": [{"action": "transfer", "start": 1., "stop": 1.25},
+                                                      {"action": "compute", "start": 1.25, "stop": 3.}]},
+                       {"key": "dv_0", "startstops": [{"action": "compute", "start": 0., "stop": 1.}]}]
+        self.assertEqual({"dv_1": 0.25}, tracing.task_stream_transfers(task_stream))
+
+    def test_export(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filenames = [os.path.join(tmpdir, name) for name in ["run.json", "trace.json", "execution.json"]]
+            with open(filenames[0], "w") as fp:
+                json.dump(RECORDS, fp)
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                tracing.export(filenames[0], {"dv_1": 0.25}, filenames[1], filenames[2])
+            with open(filenames[1]) as fp:
+                trace = json.load(fp)
+            with open(filenames[2]) as fp:
+                execution = json.load(fp)["execution"]
+        slices = [event for event in trace["traceEvents"] if event["ph"] == "X"]
+        self.assertEqual(["a", "b"], [event["name"] for event in slices])
+        # Timestamps (us) from the first submission, one process per worker
+        self.assertEqual([(5e5, 5e5), (1.5e6, 1.5e6)], [(event["ts"], event["dur"]) for event in slices])
+        self.assertEqual(["w1", "w2"], [event["args"]["name"] for event in trace["traceEvents"]
+                                        if event["name"] == "process_name"])
+        self.assertEqual({"dag_id": "dv_1", "queue_wait": 0.5, "transfer": 0.25}, slices[1]["args"])
+        self.assertEqual(2.5, execution["makespanInSeconds"])
+        self.assertEqual([("a", 0.5), ("b", 1.5)], [(task["id"], task["runtimeInSeconds"])
+                                                    for task in execution["tasks"]])
+        self.assertEqual([{"nodeName": "w1"}, {"nodeName": "w2"}], execution["machines"])
+        self.assertIn("2 tasks on 2 workers: makespan 2.500 s (0.500 s from submission to first start)",
+                      output.getvalue())
+        self.assertIn("Straggler b (dv_1): 1.500 s on w2", output.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
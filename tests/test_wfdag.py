@@ -1,7 +1,12 @@
+import os
+import tempfile
 import unittest
+from unittest import mock
 
+import templates  # noqa: F401 (the templates are imported as top-level modules)
 from wfc2dask.wfctask import WFCTask
 from wfc2dask.wfdag import WFDAG
+from workflows import new_task, new_wfdag
 
 
 import logging
@@ -24,8 +29,163 @@ class TestWFDAG(unittest.TestCase):
         for task in tasks:
             wfdag.add_task(task)
         wfdag.dask_codelines()
+        self.assertEqual([['dv_0', 'dv_1'], ['dv_2']], wfdag.ordered_tasks)
         pass
 
+    def test_load(self):
+        in_fn = "samples/unittests/hello-world-join.json"
+        wfdag = WFDAG.load(in_fn)
+        self.assertEqual("hello-world-sequence", wfdag.workflow_name)
+        wfdag.build_dag()
+        self.assertEqual([['dv_0', 'dv_1'], ['dv_2']], wfdag.ordered_tasks)
+
+    def test_dump(self):
+        import json
+        import os
+        import tempfile
+        wfdag = WFDAG.load("samples/unittests/hello-world-join.json")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "workflow_dag.jsonl")
+            wfdag.dump(filename)
+            with open(filename) as fp:
+                lines = [json.loads(line) for line in fp]
+        self.assertEqual({"name": "hello-world-sequence", "n_tasks": 3, "n_levels": 2}, lines[0])
+        self.assertEqual({"dag_id": "dv_2", "name": "hello-world", "command_arguments": None,
+                          "inputs": ["hello.dat", "world.dat"], "outputs": ["helloworld.dat"], "runtime": None,
+                          "cores": None, "memory": None, "sizes": None, "parents": ["dv_0", "dv_1"], "priority": 1.},
+                         lines[3])
+
+    def test_order_levels(self):
+        # a -> b -> d and a -> c -> d, plus e -> d: d is at the level after its deepest parent
+        wfdag = new_wfdag("levels", [new_task(name, parents) for name, parents in
+                                     [("d", ["b", "c", "e"]), ("b", ["a"]), ("a", []), ("c", ["a"]), ("e", [])]])
+        levels = [[wfdag.dag_tasks[_id].wfctask.name for _id in tasks] for tasks in wfdag.ordered_tasks]
+        self.assertEqual([["a", "e"], ["b", "c"], ["d"]], levels)
+        self.assertEqual({"dv_1", "dv_3", "dv_4"}, wfdag.dag_tasks["dv_0"].dag_parents)
+        self.assertEqual({"dv_1", "dv_3"}, wfdag.dag_tasks["dv_2"].dag_children)
+        self.assertNotIn("dv_5", wfdag.dag_tasks)
+
+    def test_external_inputs(self):
+        wfdag = new_wfdag("external", [new_task("a", inputs=["ext.dat"], outputs=["a.dat"]),
+                                       new_task("b", inputs=["a.dat", "ext.dat", "other.dat"])], build=False)
+        with self.assertLogs("wfc2dask.wfdag", level="INFO") as logs:
+            wfdag.build_dag()
+        self.assertEqual({"ext.dat", "other.dat"}, wfdag.external_inputs)
+        self.assertEqual(1, len([line for line in logs.output if "external inputs" in line]))
+        self.assertEqual([["dv_0"], ["dv_1"]], wfdag.ordered_tasks)
+
+    def test_duplicate_output(self):
+        # An output cannot be produced twice, nor be named after a task added before
+        for outputs in [[["x.dat"], ["x.dat"]], [[], ["a"]]]:
+            wfdag = new_wfdag("duplicate", [new_task("a", outputs=outputs[0]), new_task("b", outputs=outputs[1])],
+                              build=False)
+            with self.assertRaises(Exception) as context:
+                wfdag.build_dag()
+            self.assertIn("is also an output of 'dv_0", str(context.exception))
+
+    def test_critical_path(self):
+        # a -> b -> d and a -> c -> d: with runtimes, the critical path goes through the slowest of b and c
+        wfdag = new_wfdag("critical", [new_task(name, parents, runtime=runtime) for name, parents, runtime in
+                                       [("a", [], 1.), ("b", ["a"], 5.), ("c", ["a"], 2.), ("d", ["b", "c"], 1.)]])
+        self.assertEqual((["dv_0", "dv_1", "dv_3"], 7.), wfdag.critical_path())
+        self.assertEqual(3., wfdag.upward_rank("dv_2"))
+        self.assertIn("a -> b -> d", wfdag.critical_path_report())
+        self.assertEqual([{"width": 1, "work": 1.}, {"width": 2, "work": 7.}, {"width": 1, "work": 1.}],
+                         wfdag.level_profile())
+        self.assertIn("priority=7.0", "\n".join(wfdag.dask_codelines()))
+
+    def test_resources(self):
+        wfdag = new_wfdag("resources", [new_task("a", cores=4, memory=1000), new_task("b")], build=False)
+        codelines = wfdag.dask_codelines()
+        self.assertIn("resources=task_resources({'cores': 4, 'memory': 1000}, WORKER_RESOURCES)",
+                      [line for line in codelines if "FUTURES['dv_0'] =" in line][0])
+        self.assertNotIn("resources", [line for line in codelines if "FUTURES['dv_1'] =" in line][0])
+
+    def test_dask_codelines(self):
+        # The block runs in the body of a function with the arguments of run_workflow
+        wfdag = new_wfdag("block", [new_task("a", cores=1), new_task("b", ["a"])])
+        wfdag.partitions = [0, 0]
+        code = "def run_workflow(client, simulate, seed, affinity, task_options):\n%s\n    return FUTURES\n" % \
+               "\n".join(["    %s" % codeline for codeline in wfdag.dask_codelines()])
+        namespace = {}
+        exec(compile(code, "block", "exec"), namespace)
+        client = mock.MagicMock()
+        client.scheduler_info.return_value = {"workers": {"tcp://w:1": {"host": "w", "resources": {"cores": 2}}}}
+        futures = namespace["run_workflow"](client, True, 42, "worker", {})
+        self.assertEqual(["dv_0", "dv_1"], list(futures))
+        self.assertEqual({"cores": 1}, client.submit.call_args_list[0][1]["resources"])
+        self.assertEqual(["tcp://w:1"], client.submit.call_args_list[1][1]["workers"])
+
+    def test_write_dask_modules(self):
+        # a -> b -> c -> d -> e, by chunks of 2 tasks
+        wfdag = new_wfdag("chunks", [new_task(name, parents) for name, parents in
+                                     [("a", []), ("b", ["a"]), ("c", ["b"]), ("d", ["c"]), ("e", ["d"])]], build=False)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self.assertEqual(3, wfdag.write_dask_modules(tmpdir, 2))
+            codes = []
+            for chunk in range(3):
+                with open(os.path.join(tmpdir, "chunk_%d.py" % chunk)) as fp:
+                    codes.append(fp.read())
+                compile(codes[-1], "chunk_%d.py" % chunk, "exec")
+        self.assertIn("FUTURES['dv_1'] = client.submit(execute_task, submitted(TASKS['dv_1']), [FUTURES['dv_0']]",
+                      codes[0])
+        self.assertIn("TASKS['dv_4'] = WorkflowTask(", codes[2])
+        self.assertNotIn("dv_2", codes[2])
+
+    def test_cycle(self):
+        # a -> b -> c -> b, and c -> d: only b and c are on the cycle
+        wfdag = new_wfdag("cycle", [new_task(name, parents) for name, parents in
+                                    [("a", []), ("b", ["a", "c"]), ("c", ["b"]), ("d", ["c"])]], build=False)
+        with self.assertRaises(Exception) as context:
+            wfdag.build_dag()
+        message = str(context.exception)
+        self.assertTrue("b -> c -> b" in message or "c -> b -> c" in message, message)
+        self.assertNotIn("a", message.split(":")[1])
+        self.assertNotIn("d", message.split(":")[1])
+        # The DAG is not built: building it again raises again
+        self.assertFalse(wfdag.is_built)
+        with self.assertRaises(Exception) as context:
+            wfdag.build_dag()
+        self.assertEqual(message, str(context.exception))
+
+    def test_incremental_build(self):
+        # a -> b, then c reading b.out and d producing x, an external input of a until then
+        tasks = [new_task(name, inputs=inputs, outputs=outputs, runtime=runtime) for name, inputs, outputs, runtime in
+                 [("a", ["x"], ["a.out"], 1.), ("b", ["a.out"], ["b.out"], 2.), ("c", ["b.out"], [], 3.),
+                  ("d", [], ["x"], 4.)]]
+        wfdag = new_wfdag("incremental", tasks[:2])
+        self.assertEqual({"x"}, wfdag.external_inputs)
+        self.assertEqual((["dv_0", "dv_1"], 3.), wfdag.critical_path())
+        for task in tasks[2:]:
+            wfdag.add_task(task)
+        self.assertFalse(wfdag.is_built)
+        wfdag.build_dag()
+        self.assertTrue(wfdag.is_built)
+        self.assertEqual(set(), wfdag.external_inputs)
+        self.assertEqual([['dv_3'], ['dv_0'], ['dv_1'], ['dv_2']], wfdag.ordered_tasks)
+        self.assertEqual((["dv_3", "dv_0", "dv_1", "dv_2"], 10.), wfdag.critical_path())
+        # Same DAG as a single build
+        full = new_wfdag("incremental", tasks)
+        self.assertEqual(list(full.task_descriptions()), list(wfdag.task_descriptions()))
+        # The dependency of a on d, kept apart from the arrays of the DAG core, is counted
+        with self.assertLogs("wfc2dask.wfdag", level="INFO") as logs:
+            self.assertEqual(0, wfdag.reduce_dependencies())
+        self.assertIn("0 dependencies out of 3 removed", logs.output[0])
+        # Building again does nothing
+        core = wfdag._core
+        wfdag.build_dag()
+        self.assertIs(core, wfdag._core)
+
+    def test_incremental_cycle(self):
+        # a reads x, b reads a's output, then e, a child of b, produces x
+        wfdag = new_wfdag("cycle", [new_task("a", inputs=["x"], outputs=["a.out"]), new_task("b", inputs=["a.out"])])
+        wfdag.add_task(new_task("e", ["b"], outputs=["x"]))
+        for _ in range(2):  # The second build raises too
+            with self.assertRaises(Exception) as context:
+                wfdag.build_dag()
+            self.assertIn("Cycle", str(context.exception))
+        self.assertFalse(wfdag.is_built)
+
     def test_big(self):
         in_fn = "samples/others/makeflow-instances/blast-chameleon-large-004.json"
         tasks, wfname = WFCTask.load(in_fn)
@@ -1,6 +1,9 @@
+import json
+import os
+import tempfile
 import unittest
 
-from wfc2dask.wfctask import WFCTask
+from wfc2dask.wfctask import WFCTask, _JSONStream
 
 
 class TestWFTask(unittest.TestCase):
@@ -14,6 +17,65 @@ class TestWFTask(unittest.TestCase):
         tasks = WFCTask.load(in_fn)
         pass
 
+    def test_from_json(self):
+        task = WFCTask.from_json({"name": "t", "runtimeInSeconds": 1.5, "cores": 2, "memoryInBytes": 1024,
+                                  "files": [{"link": "input", "name": "in.dat", "sizeInBytes": 12}]})
+        self.assertEqual((1.5, 2, 1024), (task.runtime, task.cores, task.memory))
+        self.assertEqual({"cores": 2, "memory": 1024}, task.resources())
+        self.assertEqual(12, task.file_size("in.dat"))
+        self.assertIsNone(task.file_size("out.dat"))
+        self.assertEqual({}, WFCTask.from_json({"name": "t"}).resources())
+
+    def test_names(self):
+        task = WFCTask.from_json({"name": "t", "parents": ["a", "b", "a"],
+                                  "files": [{"link": "input", "name": "in.dat"}, {"link": "output", "name": "out"}]})
+        self.assertEqual({"a", "b"}, task.parents)
+        self.assertEqual(("a", "b", "in.dat"), task.dependencies())
+        task.parents.add("c")
+        task.parents.add("a")
+        task.parents.discard("b")
+        task.inputs.update(["in.dat", "more.dat"])
+        self.assertEqual(["a", "c"], sorted(task.parents))
+        self.assertEqual({"in.dat", "more.dat"}, task.inputs)
+        self.assertIn("out", task.outputs)
+        task.outputs = set()
+        self.assertEqual(0, len(task.outputs))
+
+    def test_iterload(self):
+        for in_fn in ["samples/unittests/hello-world-sequence.json", "samples/unittests/hello-world-join.json"]:
+            tasks, wfname = WFCTask.load(in_fn)
+            header = {}
+            # A tiny chunk size forces values to be split across buffer refills
+            chunk_size = _JSONStream.CHUNK_SIZE
+            _JSONStream.CHUNK_SIZE = 7
+            try:
+                streamed_tasks = list(WFCTask.iterload(in_fn, header))
+            finally:
+                _JSONStream.CHUNK_SIZE = chunk_size
+            self.assertEqual(wfname, header["name"])
+            self.assertEqual([[getattr(task, slot) for slot in WFCTask.__slots__] for task in tasks],
+                             [[getattr(task, slot) for slot in WFCTask.__slots__] for task in streamed_tasks])
+
+    def test_iterload_numbers(self):
+        # Numbers outside of the tasks, which a refill of the buffer may split anywhere
+        document = {"name": "numbers", "version": 1.5e-3, "runtimeSystem": {"version": -12.25E+2},
+                    "workflow": {"makespanInSeconds": 123.456, "executedAt": 1e10,
+                                 "tasks": [{"name": "t", "runtimeInSeconds": 0.125}], "scale": 987654.321e-2}}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "numbers.json")
+            with open(filename, "w") as fp:
+                json.dump(document, fp, separators=(",", ":"))
+            chunk_size = _JSONStream.CHUNK_SIZE
+            try:
+                for size in range(1, 64):
+                    _JSONStream.CHUNK_SIZE = size
+                    header = {}
+                    tasks = list(WFCTask.iterload(filename, header))
+                    self.assertEqual([0.125], [task.runtime for task in tasks])
+                    self.assertEqual({key: value for key, value in document.items() if key != "workflow"}, header)
+            finally:
+                _JSONStream.CHUNK_SIZE = chunk_size
+
 
 if __name__ == '__main__':
     unittest.main()
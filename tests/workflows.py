@@ -0,0 +1,61 @@
+"""
+Small workflows built task by task, shared by the tests
+"""
+from wfc2dask.wfctask import WFCTask
+from wfc2dask.wfdag import WFDAG
+
+
+def new_task(name: str, parents=(), inputs=(), outputs=(), **attributes) -> WFCTask:
+    """
+    :param name: the name of the task
+    :param parents: the names of its parent tasks
+    :param inputs: the names of its input files
+    :param outputs: the names of its output files
+    :param attributes: its other attributes (runtime, cores, memory, sizes, command)
+    :return: the task
+    """
+    task = WFCTask()
+    task.name = name
+    task.parents.update(parents)
+    task.inputs.update(inputs)
+    task.outputs.update(outputs)
+    for attribute, value in attributes.items():
+        setattr(task, attribute, value)
+    return task
+
+
+def new_wfdag(workflow_name: str, tasks: list[WFCTask], build: bool = True) -> WFDAG:
+    """
+    :param tasks: the tasks of the workflow (see new_task), added in that order
+    :param build: whether the DAG is built
+    :return: the WFDAG of the tasks
+    """
+    wfdag = WFDAG(workflow_name)
+    for task in tasks:
+        wfdag.add_task(task)
+    if build:
+        wfdag.build_dag()
+    return wfdag
+
+
+def fan_wfdag() -> WFDAG:
+    """
+    :return: a -> b -> c, then c -> d1..d5 -> e, each task running for 1 s
+    """
+    tasks = [new_task("a", runtime=1.), new_task("b", ["a"], runtime=1.), new_task("c", ["b"], runtime=1.)]
+    tasks.extend([new_task("d%d" % index, ["c"], runtime=1.) for index in range(1, 6)])
+    tasks.append(new_task("e", ["d%d" % index for index in range(1, 6)], runtime=1.))
+    return new_wfdag("fan", tasks)
+
+
+def pipelines_wfdag(n_pipelines: int = 4, length: int = 5) -> WFDAG:
+    """
+    :return: independent pipelines p<i>_0 -> p<i>_1 -> ..., each task reading a 100 bytes file from the previous one
+    """
+    tasks = []
+    for pipeline in range(n_pipelines):
+        for stage in range(length):
+            name = "p%d_%d" % (pipeline, stage)
+            tasks.append(new_task(name, inputs=[] if stage == 0 else ["p%d_%d.out" % (pipeline, stage - 1)],
+                                  outputs=["%s.out" % name], sizes={"%s.out" % name: 100}))
+    return new_wfdag("pipelines", tasks)
@@ -1,30 +1,64 @@
 """
 See README.md
 """
+from wfc2dask.cache import ConversionCache
+from wfc2dask.clustering import cluster_dag
+from wfc2dask.partitioning import partition_dag, partitioning_report
 from wfc2dask.wfdag import WFDAG
-from wfc2dask.wfctask import WFCTask
 import logging
+import os
+import sys
 
 
-def build_project(wfdag: WFDAG, output_directory: str, overwrite: bool) -> None:
+# The templates are next to this file, wherever wfc2dask.py is run from
+TEMPLATE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "code_templates")
+
+
+def build_project(wfdag: WFDAG, output_directory: str, overwrite: bool, codegen: bool = False,
+                  chunk_size: int = 1000, compile_workers: int = None) -> list[str]:
+    """
+    :param wfdag: the workflow DAG
+    :param output_directory: where the project is written
+    :param overwrite: if False, output_directory must not exist
+    :param codegen: if True, the code submitting each task is generated in the workflow_tasks package, which
+    run_workflow.py imports (export option). Otherwise, the DAG is serialized and run_workflow.py submits it to dask
+    as a whole
+    :param chunk_size: number of tasks per generated module (codegen)
+    :param compile_workers: if not None, the generated modules are byte-compiled by this number of processes (0 for
+    one per CPU), so that they are not compiled when the workflow is run (codegen)
+    :return: the files (and directories) written, relative to output_directory. The directory may hold other files,
+    e.g. those of a previous run of the project
+    """
     try:
-        import os
         os.makedirs(output_directory)
     except FileExistsError as exc:
         if not overwrite:
             raise exc
+    import json
+    with open("%s/%s" % (output_directory, "workflow_profile.json"), "w") as fp:
+        json.dump(wfdag.level_profile(), fp)
     import shutil
-    for template in ["dask_client.py", "application.py", "helpers.py", "workflow_task.py"]:
-        shutil.copy("code_templates/%s" % template, "%s/%s" % (output_directory, template))
-    with open("code_templates/run_workflow.py") as fp:
+    templates = ["dask_client.py", "application.py", "helpers.py", "workflow_task.py", "checkpoints.py", "tracing.py"]
+    for template in templates:
+        shutil.copy(os.path.join(TEMPLATE_DIRECTORY, template), "%s/%s" % (output_directory, template))
+    filenames = ["workflow_profile.json", "run_workflow.py"] + templates
+    if not codegen:
+        wfdag.dump("%s/%s" % (output_directory, "workflow_dag.jsonl"))
+        shutil.copy(os.path.join(TEMPLATE_DIRECTORY, "run_workflow_graph.py"),
+                    "%s/%s" % (output_directory, "run_workflow.py"))
+        return filenames + ["workflow_dag.jsonl"]
+    # The modules of a previous project may outnumber the new ones
+    shutil.rmtree("%s/%s" % (output_directory, "workflow_tasks"), ignore_errors=True)
+    n_chunks = wfdag.write_dask_modules("%s/%s" % (output_directory, "workflow_tasks"), chunk_size)
+    with open(os.path.join(TEMPLATE_DIRECTORY, "run_workflow.py")) as fp:
         run_workflow_code = fp.read()
-    INDENT = "    "
-    # Workflow code
-    noindent_python_codelines = wfdag.dask_codelines()
-    wf_codelines = "\n".join(["%s%s" % (INDENT, codeline) for codeline in noindent_python_codelines])
-    run_workflow_code = run_workflow_code.replace("# Generated code goes here", wf_codelines)
+    run_workflow_code = run_workflow_code.replace("# Generated code goes here", "N_CHUNKS = %d" % n_chunks)
     with open("%s/%s" % (output_directory, "run_workflow.py"), "w") as fp:
         fp.write(run_workflow_code)
+    if compile_workers is not None:
+        import compileall
+        compileall.compile_dir("%s/%s" % (output_directory, "workflow_tasks"), quiet=1, workers=compile_workers)
+    return filenames + ["workflow_tasks"]
 
 
 def process_arguments():
@@ -32,20 +66,152 @@ def process_arguments():
     import sys
     parser = argparse.ArgumentParser(prog=sys.argv[0],
                                      description='Converts a workflow to dask')
-    parser.add_argument("workflow_filename", help="Name of the file describing the workflow")
+    parser.add_argument("workflow_filenames", help="Name of the file describing the workflow. With several files, "
+                                                   "directories (all their .json files) or glob patterns, the files "
+                                                   "are converted in parallel, each to its own directory in "
+                                                   "output_directory", nargs="+")
     parser.add_argument("-d", "--debug", help="Debug mode (Info mode by default)", action="store_true")
     parser.add_argument("-o", "--output_directory", help="Output directory name", default="out")
     parser.add_argument("-f", "--force_overwrite", help="Force overwrite if output_directory already exists",
                         action="store_true")
+    parser.add_argument("-r", "--reduce", help="Remove the dependencies implied by other ones (transitive reduction)",
+                        action="store_true")
+    parser.add_argument("--fuse_chains", help="Fuse single-parent/single-child chains of tasks into one dask task",
+                        action="store_true")
+    parser.add_argument("--batch_size", help="Group sibling tasks by batches of (at most) this size (default: no "
+                                             "limit with --batch_runtime, no batches otherwise)", type=int)
+    parser.add_argument("--batch_runtime", help="Close a batch of sibling tasks once its runtime reaches this (s)",
+                        type=float)
+    parser.add_argument("-p", "--partitions", help="Split the tasks in this number of partitions (e.g. the number of "
+                                                   "workers) minimizing the bytes exchanged between partitions; the "
+                                                   "tasks of a partition preferably run on the same worker", type=int)
+    parser.add_argument("--imbalance", help="How many more tasks than its share of a level a partition can get",
+                        type=float, default=0.1)
+    parser.add_argument("-c", "--codegen", help="Generate the code submitting each task instead of serializing the DAG",
+                        action="store_true")
+    parser.add_argument("--chunk_size", help="Number of tasks per generated module (codegen)", type=int,
+                        default=1000)
+    parser.add_argument("--compile_workers", help="Byte-compile the generated modules with this number of processes, "
+                                                  "0 for one per CPU (codegen)", type=int)
+    parser.add_argument("--cache_directory", help="Cache the conversions in this directory: converting the same "
+                                                  "file with the same options again copies the cached project")
+    parser.add_argument("--cache_size", help="Maximum size of the cache (MB)", type=float, default=1024)
+    parser.add_argument("-j", "--jobs", help="Number of files converted in parallel (default: one per CPU)", type=int)
     return parser.parse_args()
 
 
+def conversion_options(args) -> dict:
+    """
+    :return: the options that change the generated project (see process_arguments)
+    """
+    return {"reduce": args.reduce, "fuse_chains": args.fuse_chains, "batch_size": args.batch_size,
+            "batch_runtime": args.batch_runtime, "partitions": args.partitions, "imbalance": args.imbalance,
+            "codegen": args.codegen, "chunk_size": args.chunk_size,
+            "compiled": args.compile_workers is not None}
+
+
+def convert(workflow_filename: str, output_directory: str, args) -> float:
+    """
+    :param workflow_filename: the name of the file describing the workflow
+    :param output_directory: where the project is written
+    :param args: the conversion options (see process_arguments)
+    :return: the conversion time (s)
+    """
+    import time
+    start = time.perf_counter()
+    if args.cache_directory is not None:
+        cache = ConversionCache(args.cache_directory, int(args.cache_size * 1e6))
+        key = ConversionCache.key(workflow_filename, conversion_options(args))
+        if cache.get(key, output_directory, args.force_overwrite):
+            return time.perf_counter() - start
+    wfdag = WFDAG.load(workflow_filename)
+    wfdag.build_dag()
+    if args.reduce:
+        wfdag.reduce_dependencies()
+    if args.fuse_chains or (args.batch_size is not None and args.batch_size > 1) or args.batch_runtime is not None:
+        wfdag = cluster_dag(wfdag, args.fuse_chains, args.batch_size, args.batch_runtime)
+        wfdag.build_dag()
+        if args.reduce:
+            wfdag.reduce_dependencies()
+    if args.partitions is not None:
+        wfdag.partitions = partition_dag(wfdag, args.partitions, args.imbalance)
+        logging.info(partitioning_report(wfdag, wfdag.partitions, args.partitions))
+    logging.info(wfdag.critical_path_report())
+    filenames = build_project(wfdag, output_directory, args.force_overwrite, args.codegen, args.chunk_size,
+                              args.compile_workers)
+    if args.cache_directory is not None:
+        cache.put(key, output_directory, filenames)
+    return time.perf_counter() - start
+
+
+def workflow_files(patterns: list[str]) -> list[str]:
+    """
+    :param patterns: file names, directories or glob patterns
+    :return: the files: the JSON files of the directories (recursively) and the files matching the patterns
+    """
+    import glob
+    filenames = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            filenames.extend(sorted(glob.glob(os.path.join(pattern, "**", "*.json"), recursive=True)))
+        elif glob.has_magic(pattern):
+            filenames.extend(sorted(glob.glob(pattern, recursive=True)))
+        else:
+            filenames.append(pattern)
+    return filenames
+
+
+def project_directories(filenames: list[str], output_directory: str) -> list[str]:
+    """
+    :return: the output directory of each file: output_directory/<file name without extension>, suffixed by a number if
+    several files have the same name
+    """
+    directories = []
+    for filename in filenames:
+        name = os.path.splitext(os.path.basename(filename))[0]
+        directory = os.path.join(output_directory, name)
+        rank = 1
+        while directory in directories:
+            rank += 1
+            directory = os.path.join(output_directory, "%s_%d" % (name, rank))
+        directories.append(directory)
+    return directories
+
+
+def convert_all(filenames: list[str], output_directory: str, args) -> int:
+    """
+    :return: the number of files that could not be converted
+
+    The files are converted on a pool of args.jobs processes (the interpreter and the modules are loaded once per
+    process, not once per file). A summary with the time or the error of each file is logged at the end
+    """
+    import concurrent.futures
+    directories = project_directories(filenames, output_directory)
+    results = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = {executor.submit(convert, filename, directory, args): filename
+                   for filename, directory in zip(filenames, directories)}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                results[futures[future]] = "%8.3f s" % future.result()
+            except Exception as exc:
+                results[futures[future]] = "FAILED: %s: %s" % (type(exc).__name__, exc)
+    n_failed = len([result for result in results.values() if result.startswith("FAILED")])
+    summary = "%d files converted, %d failed\n" % (len(filenames) - n_failed, n_failed)
+    for filename, directory in zip(filenames, directories):
+        summary += "%s -> %s: %s\n" % (filename, directory, results[filename])
+    logging.info(summary)
+    return n_failed
+
+
 def main():
     args = process_arguments()
     loglevel = logging.DEBUG if args.debug else logging.INFO
     logging.basicConfig(level=loglevel, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    wfdag = WFDAG.from_tasks(*WFCTask.load(args.workflow_filename))
-    build_project(wfdag, args.output_directory, args.force_overwrite)
+    if len(args.workflow_filenames) == 1 and os.path.isfile(args.workflow_filenames[0]):
+        convert(args.workflow_filenames[0], args.output_directory, args)
+    elif convert_all(workflow_files(args.workflow_filenames), args.output_directory, args) != 0:
+        sys.exit(1)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,137 @@
+"""
+On-disk cache of conversions
+
+An entry is keyed by the hash of the contents of the workflow file, of the conversion options and of the version of
+the converter (the hash of its sources and templates, so that any change of the converter invalidates the cache). It
+holds the generated project, which is copied to the output directory on a hit, without parsing the workflow.
+
+The entries are written to a temporary directory then renamed, so that concurrent conversions (see batch conversion
+in wfc2dask.py) never see a partial entry. When the cache exceeds its maximum size, the least recently used entries
+are evicted.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+
+# Logging setup
+logger = logging.getLogger(__name__)
+
+_version = None
+
+
+def converter_version() -> str:
+    """
+    :return: the hash of the sources of the converter: the wfc2dask package, wfc2dask.py and the templates
+    """
+    global _version
+    if _version is None:
+        package_directory = os.path.dirname(os.path.abspath(__file__))
+        root_directory = os.path.dirname(package_directory)
+        digest = hashlib.sha256()
+        for directory in [package_directory, os.path.join(root_directory, "code_templates")]:
+            for name in sorted(os.listdir(directory)):
+                if name.endswith(".py"):
+                    with open(os.path.join(directory, name), "rb") as fp:
+                        digest.update(fp.read())
+        with open(os.path.join(root_directory, "wfc2dask.py"), "rb") as fp:
+            digest.update(fp.read())
+        _version = digest.hexdigest()
+    return _version
+
+
+class ConversionCache:
+    BLOCK_SIZE = 1 << 20  # Bytes of the workflow file hashed at once
+    PROJECT_DIRECTORY = "project"
+    SIZE_FILENAME = "size"
+
+    def __init__(self, directory: str, max_size: int = 1 << 30):
+        """
+        :param directory: the cache directory (created if needed)
+        :param max_size: the maximum size (bytes) of the cache
+        """
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(workflow_filename: str, options: dict) -> str:
+        """
+        :param workflow_filename: the name of the file describing the workflow
+        :param options: the conversion options (JSON serializable)
+        :return: the key of the conversion of the workflow with those options
+        """
+        digest = hashlib.sha256()
+        with open(workflow_filename, "rb") as fp:
+            for block in iter(lambda: fp.read(ConversionCache.BLOCK_SIZE), b""):
+                digest.update(block)
+        return hashlib.sha256(json.dumps([digest.hexdigest(), options, converter_version()],
+                                         sort_keys=True).encode()).hexdigest()
+
+    def get(self, key: str, output_directory: str, overwrite: bool) -> bool:
+        """
+        :param key: the key of a conversion
+        :param output_directory: where the project is copied
+        :param overwrite: if False, output_directory must not exist
+        :return: True if the conversion was cached (the project is then copied to output_directory)
+        """
+        entry = os.path.join(self.directory, key)
+        if not os.path.isdir(entry):
+            return False
+        os.utime(entry)  # Most recently used
+        shutil.copytree(os.path.join(entry, ConversionCache.PROJECT_DIRECTORY), output_directory,
+                        dirs_exist_ok=overwrite)
+        logger.info("Conversion %s found in cache %s" % (key, self.directory))
+        return True
+
+    def put(self, key: str, output_directory: str, filenames: list[str]) -> None:
+        """
+        :param key: the key of a conversion
+        :param output_directory: where the project was generated
+        :param filenames: the files (and directories) of the project, relative to output_directory (see build_project
+        in wfc2dask.py). The other files of output_directory (e.g. run.json, logs or checkpoints of a previous run) are
+        not cached
+        """
+        work_directory = tempfile.mkdtemp(dir=self.directory, prefix=".")
+        try:
+            project_directory = os.path.join(work_directory, ConversionCache.PROJECT_DIRECTORY)
+            os.makedirs(project_directory)
+            for filename in filenames:
+                if os.path.isdir(os.path.join(output_directory, filename)):
+                    shutil.copytree(os.path.join(output_directory, filename), os.path.join(project_directory, filename))
+                else:
+                    shutil.copy2(os.path.join(output_directory, filename), os.path.join(project_directory, filename))
+            size = sum([os.path.getsize(os.path.join(path, name))
+                        for path, _, names in os.walk(work_directory) for name in names])
+            with open(os.path.join(work_directory, ConversionCache.SIZE_FILENAME), "w") as fp:
+                fp.write("%d" % size)
+            os.rename(work_directory, os.path.join(self.directory, key))
+        except OSError as exc:  # E.g. the same conversion was cached concurrently
+            logger.debug("Conversion %s not cached: %s" % (key, exc))
+            shutil.rmtree(work_directory, ignore_errors=True)
+            return
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Remove the least recently used entries until the cache fits in its maximum size
+        """
+        entries = []
+        for key in os.listdir(self.directory):
+            entry = os.path.join(self.directory, key)
+            try:
+                with open(os.path.join(entry, ConversionCache.SIZE_FILENAME)) as fp:
+                    entries.append((os.path.getmtime(entry), int(fp.read()), entry))
+            except (FileNotFoundError, NotADirectoryError):
+                pass  # Entry being written
+        size = sum([entry_size for _, entry_size, _ in entries])
+        for _, entry_size, entry in sorted(entries):
+            if size <= self.max_size:
+                break
+            logger.info("Evicting %s from cache" % entry)
+            shutil.rmtree(entry, ignore_errors=True)
+            size -= entry_size
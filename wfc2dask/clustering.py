@@ -0,0 +1,111 @@
+"""
+Clustering of the tasks of a built WFDAG, to cut the scheduler overhead of fine-grained workflows
+
+Two kinds of clusters are made:
++ Chains: a task whose only parent has no other child is fused with that parent
++ Batches: chains with the same parents (siblings, e.g. the tasks of a fan-out) are grouped by batches of a maximum
+  number of tasks and/or of a target runtime
+
+The result is a new WFDAG whose tasks are WFCCluster instances: each of them is executed as a single dask task
+running its members in order (see execute_task in code_templates/helpers.py).
+
+Merging siblings cannot create a cycle: siblings are on the same level, and there is no path between two tasks of
+the same level.
+"""
+from __future__ import annotations
+from array import array
+import logging
+from wfc2dask.dagcore import DAGCore
+from wfc2dask.wfctask import WFCCluster
+from wfc2dask.wfdag import WFDAG
+
+
+# Logging setup
+logger = logging.getLogger(__name__)
+
+
+def _chains(core: DAGCore) -> tuple[list[list[int]], array]:
+    """
+    :param core: an ordered DAG core
+    :return: the chains (task ids in execution order) and the chain of each task
+    """
+    chains = []
+    task_chains = array('i', [-1]) * core.n_tasks
+    # Level order: the parent of a task is in a chain before the task is considered
+    for level in range(core.n_levels):
+        for task_id in core.level(level):
+            parents = core.parents(task_id)
+            if len(parents) == 1 and len(core.children(parents[0])) == 1:
+                task_chains[task_id] = task_chains[parents[0]]
+                chains[task_chains[task_id]].append(task_id)
+            else:
+                task_chains[task_id] = len(chains)
+                chains.append([task_id])
+    return chains, task_chains
+
+
+def cluster_dag(wfdag: WFDAG, fuse_chains: bool = True, batch_size: int = None,
+                batch_runtime: float = None) -> WFDAG:
+    """
+    :param wfdag: a built WFDAG
+    :param fuse_chains: whether single-parent/single-child chains are fused
+    :param batch_size: the maximum number of tasks in a batch of siblings, None for no limit (1: no batches)
+    :param batch_runtime: if not None, a batch is closed as soon as the runtime of its tasks reaches batch_runtime
+    (tasks without runtimeInSeconds count for 1)
+    Siblings are batched only if batch_size or batch_runtime is not None
+    :return: a new (not built) WFDAG of WFCCluster instances
+
+    A cluster holding a single task is named after it. Otherwise, it is named after its first task, followed by
+    the number of other tasks (e.g. a+2), and by a rank if a task already has that name (e.g. a+2.2)
+    """
+    core = wfdag._core
+    if fuse_chains:
+        chains, task_chains = _chains(core)
+    else:
+        chains, task_chains = [[task_id] for task_id in range(core.n_tasks)], array('i', range(core.n_tasks))
+    # The DAG of the chains
+    chain_parents = []
+    for chain_id, chain in enumerate(chains):
+        chain_parents.append({task_chains[parent_id] for task_id in chain for parent_id in core.parents(task_id)}
+                             - {chain_id})
+    # Batches of sibling chains, i.e. of chains with the same parents
+    batches = []
+    batch_chains = array('i', [-1]) * len(chains)
+    open_batches = {}  # parent chain ids -> (batch id, its runtime) of the batch being filled
+    batching = batch_size is not None or batch_runtime is not None
+    for chain_id, chain in enumerate(chains):
+        siblings = tuple(sorted(chain_parents[chain_id]))
+        runtime = sum([1. if wfdag._wfctasks[task_id].runtime is None else wfdag._wfctasks[task_id].runtime
+                       for task_id in chain])
+        batch_id, batch_runtime_so_far = open_batches.get(siblings, (None, 0.))
+        if batch_id is None:
+            batch_id = len(batches)
+            batches.append([])
+        batches[batch_id].append(chain_id)
+        batch_chains[chain_id] = batch_id
+        batch_runtime_so_far += runtime
+        if not batching or (batch_size is not None and len(batches[batch_id]) >= batch_size) or \
+                (batch_runtime is not None and batch_runtime_so_far >= batch_runtime):
+            open_batches.pop(siblings, None)  # Full: the next sibling starts a new batch
+        else:
+            open_batches[siblings] = (batch_id, batch_runtime_so_far)
+    # The clusters
+    clusters = []
+    names = set(wfdag.wftasks)  # The names taken: task names are arbitrary strings
+    for batch in batches:
+        members = [wfdag._wfctasks[task_id] for chain_id in batch for task_id in chains[chain_id]]
+        name = members[0].name
+        if len(members) != 1:
+            name = prefix = "%s+%d" % (members[0].name, len(members) - 1)
+            rank = 1
+            while name in names:
+                rank += 1
+                name = "%s.%d" % (prefix, rank)
+            names.add(name)
+        clusters.append(WFCCluster(name, members))
+    for batch_id, batch in enumerate(batches):
+        for chain_id in batch:
+            clusters[batch_id].parents.update([clusters[batch_chains[parent_chain_id]].name
+                                               for parent_chain_id in chain_parents[chain_id]])
+    logger.info("%d tasks clustered in %d clusters (%d chains)" % (core.n_tasks, len(clusters), len(chains)))
+    return WFDAG.from_tasks(clusters, wfdag.workflow_name)
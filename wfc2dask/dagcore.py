@@ -0,0 +1,379 @@
+"""
+The compact core of a WFDAG
+
+Tasks are integer ids (0..n_tasks-1, i.e. their index in the order they were added to the WFDAG) and the
+dependencies are stored in CSR (Compressed Sparse Row) arrays: the parents of task t are
+parent_ids[parent_offsets[t]:parent_offsets[t+1]] (same thing for children). The data flows (the bytes each task
+reads from the tasks producing its inputs, from the sizeInBytes of the files) are stored the same way. The levels
+computed by order() are stored as the level of each task and the (sorted) task ids of each level.
+
+This costs a few bytes per task and per edge instead of a Python object and a set per task.
+
+The DAG can grow after it is ordered (see extend, add_dependency and update_order): the new tasks are appended to
+the arrays, but the dependencies added to the tasks already there (e.g. the new children of a task) are kept apart,
+in small per-task arrays, until there are enough of them to rebuild the CSR arrays (see compact). Hence growing the
+DAG costs the size of the addition (amortized), not the size of the DAG.
+"""
+from __future__ import annotations
+from array import array
+import bisect
+import heapq
+
+
+class DAGCore:
+    __slots__ = ("n_tasks", "parent_offsets", "parent_ids", "child_offsets", "child_ids",
+                 "flow_offsets", "flow_producer_ids", "flow_bytes",
+                 "extra_parents", "extra_children", "extra_flows", "n_extra", "task_levels", "levels")
+
+    # The dependencies added to the tasks already there are merged in the CSR arrays when they exceed this fraction
+    # of the dependencies (see compact)
+    COMPACTION_RATIO = 0.25
+
+    def __init__(self, parents: list[list[int]], flows: list[dict[int, int]] = None):
+        """
+        :param parents: for each task id, the ids of its parents (without duplicates)
+        :param flows: for each task id, the number of bytes it reads from each of the tasks producing its inputs
+        (producer id -> bytes), None if unknown
+        """
+        self.n_tasks = 0
+        self._set_parents([])
+        # The data flows are kept apart from the dependencies (e.g. the transitive reduction leaves them untouched)
+        self.flow_offsets = array('q', [0])
+        self.flow_producer_ids = array('i')
+        self.flow_bytes = array('q')
+        self.extra_flows = {}  # task id -> {producer id: bytes} added by add_dependency
+        self.task_levels = array('i')  # -1 until ordered
+        self.levels = []  # The task ids of each level (arrays)
+        self.extend(parents, flows)
+
+    def extend(self, parents: list[list[int]], flows: list[dict[int, int]] = None) -> range:
+        """
+        :param parents: for each new task, the ids of its parents (without duplicates), old or new tasks
+        :param flows: for each new task, the bytes it reads from the tasks producing its inputs, None if unknown
+        :return: the ids of the new tasks. They are not ordered (see update_order)
+
+        The parents and the flows of the new tasks are appended to the CSR arrays, as well as their children among
+        the new tasks. The new children of the other tasks are kept apart (see compact)
+        """
+        start = self.n_tasks
+        self.n_tasks += len(parents)
+        for task_parents in parents:
+            self.parent_ids.extend(sorted(task_parents))
+            self.parent_offsets.append(len(self.parent_ids))
+        # The children of the new tasks are the transposed parents: count them, then place each child at its offset
+        child_counts = array('q', bytes(8 * (len(parents) + 1)))
+        for task_parents in parents:
+            for parent_id in task_parents:
+                if parent_id >= start:
+                    child_counts[parent_id - start + 1] += 1
+        n_children = len(self.child_ids)
+        for index in range(len(parents)):
+            self.child_offsets.append(self.child_offsets[-1] + child_counts[index + 1])
+        positions = array('q', self.child_offsets[start:self.n_tasks])
+        self.child_ids.extend(array('i', bytes(4 * (self.child_offsets[-1] - n_children))))
+        # The tasks are walked by increasing id: the children of each task are sorted
+        for task_id, task_parents in enumerate(parents, start):
+            for parent_id in task_parents:
+                if parent_id >= start:
+                    self.child_ids[positions[parent_id - start]] = task_id
+                    positions[parent_id - start] += 1
+                else:
+                    self.extra_children.setdefault(parent_id, array('i')).append(task_id)
+                    self.n_extra += 1
+        for task_flows in [{}] * len(parents) if flows is None else flows:
+            for producer_id in sorted(task_flows):
+                self.flow_producer_ids.append(producer_id)
+                self.flow_bytes.append(task_flows[producer_id])
+            self.flow_offsets.append(len(self.flow_producer_ids))
+        self.task_levels.extend(array('i', [-1]) * len(parents))
+        self._compact_if_needed()
+        return range(start, self.n_tasks)
+
+    def add_dependency(self, parent_id: int, child_id: int, n_bytes: int = 0) -> None:
+        """
+        :param n_bytes: the bytes the child reads from the parent
+        Add a dependency between two tasks already there (e.g. the child referred to an output of the parent, added
+        after it). The levels are not updated (see update_order)
+        """
+        if parent_id not in self.parents(child_id):
+            self.extra_parents.setdefault(child_id, array('i')).append(parent_id)
+            self.extra_children.setdefault(parent_id, array('i')).append(child_id)
+            self.n_extra += 1
+        if n_bytes != 0:
+            task_flows = self.extra_flows.setdefault(child_id, {})
+            task_flows[parent_id] = task_flows.get(parent_id, 0) + n_bytes
+        self._compact_if_needed()
+
+    def _compact_if_needed(self) -> None:
+        if self.n_extra > max(1024, self.COMPACTION_RATIO * len(self.parent_ids)):
+            self.compact()
+
+    def compact(self) -> None:
+        """
+        Merge the dependencies and the flows kept apart in the CSR arrays. O(V+E), but only run when the dependencies
+        kept apart are a fraction of all the dependencies: the cost is amortized over the additions
+        """
+        self._set_parents([self.parents(task_id) for task_id in range(self.n_tasks)])
+        if len(self.extra_flows) != 0:
+            flows = [dict(self.flows(task_id)) for task_id in range(self.n_tasks)]
+            self.flow_offsets = array('q', [0])
+            self.flow_producer_ids = array('i')
+            self.flow_bytes = array('q')
+            self.extra_flows = {}
+            for task_flows in flows:
+                self.flow_producer_ids.extend(task_flows.keys())
+                self.flow_bytes.extend(task_flows.values())
+                self.flow_offsets.append(len(self.flow_producer_ids))
+
+    def _set_parents(self, parents: list[list[int]]) -> None:
+        self.extra_parents = {}  # task id -> parents added by add_dependency
+        self.extra_children = {}  # task id -> children added by extend and add_dependency
+        self.n_extra = 0
+        self.parent_offsets = array('q', [0])
+        self.parent_ids = array('i')
+        for task_parents in parents:
+            self.parent_ids.extend(sorted(task_parents))
+            self.parent_offsets.append(len(self.parent_ids))
+        # The children are the transposed parents: count them, then place each child at its parent offset
+        child_counts = array('q', bytes(8 * (self.n_tasks + 1)))
+        for parent_id in self.parent_ids:
+            child_counts[parent_id + 1] += 1
+        self.child_offsets = array('q', [0])
+        for task_id in range(self.n_tasks):
+            self.child_offsets.append(self.child_offsets[-1] + child_counts[task_id + 1])
+        positions = array('q', self.child_offsets[:-1])
+        self.child_ids = array('i', bytes(4 * len(self.parent_ids)))
+        for task_id in range(self.n_tasks):
+            for parent_id in self.parents(task_id):
+                self.child_ids[positions[parent_id]] = task_id
+                positions[parent_id] += 1
+
+    def parents(self, task_id: int) -> array:
+        parent_ids = self.parent_ids[self.parent_offsets[task_id]:self.parent_offsets[task_id + 1]]
+        extra_parent_ids = self.extra_parents.get(task_id)
+        return parent_ids if extra_parent_ids is None else array('i', sorted(parent_ids + extra_parent_ids))
+
+    def children(self, task_id: int) -> array:
+        child_ids = self.child_ids[self.child_offsets[task_id]:self.child_offsets[task_id + 1]]
+        extra_child_ids = self.extra_children.get(task_id)
+        return child_ids if extra_child_ids is None else array('i', sorted(child_ids + extra_child_ids))
+
+    def flows(self, task_id: int) -> zip:
+        """
+        :return: the (producer id, bytes) pairs of the data read by the task
+        """
+        start, end = self.flow_offsets[task_id], self.flow_offsets[task_id + 1]
+        extra_flows = self.extra_flows.get(task_id)
+        if extra_flows is None:
+            return zip(self.flow_producer_ids[start:end], self.flow_bytes[start:end])
+        task_flows = dict(zip(self.flow_producer_ids[start:end], self.flow_bytes[start:end]))
+        for producer_id, n_bytes in extra_flows.items():
+            task_flows[producer_id] = task_flows.get(producer_id, 0) + n_bytes
+        producer_ids = sorted(task_flows)
+        return zip(producer_ids, [task_flows[producer_id] for producer_id in producer_ids])
+
+    @property
+    def n_levels(self) -> int:
+        return len(self.levels)
+
+    @property
+    def n_dependencies(self) -> int:
+        """
+        :return: the number of dependencies, including those kept apart (see compact)
+        """
+        return len(self.parent_ids) + sum([len(parent_ids) for parent_ids in self.extra_parents.values()])
+
+    @property
+    def n_flow_bytes(self) -> int:
+        """
+        :return: the bytes read by the tasks from the tasks producing their inputs, including the flows kept apart
+        """
+        return sum(self.flow_bytes) + sum([sum(task_flows.values()) for task_flows in self.extra_flows.values()])
+
+    def level(self, level: int) -> array:
+        return self.levels[level]
+
+    def order(self) -> list[int]:
+        """
+        :return: an empty list if all tasks could be ordered, the task ids of a cycle otherwise (see find_cycle)
+
+        Level-by-level Kahn traversal: each task holds a count of its unfinished parents (its in-degree). When a
+        level is done, the in-degree of the children of its tasks is decremented and the children whose in-degree
+        drops to 0 make up the next level. Each task and each dependency is visited once, so complexity is O(V+E).
+        Inside a level, tasks are sorted by id.
+        """
+        in_degrees = array('q', [len(self.parents(task_id)) for task_id in range(self.n_tasks)])
+        task_levels = array('i', [-1]) * self.n_tasks
+        level_tasks = [task_id for task_id in range(self.n_tasks) if in_degrees[task_id] == 0]
+        level = 0
+        n_ordered = 0
+        while len(level_tasks) != 0:
+            next_level_tasks = []
+            for task_id in level_tasks:
+                task_levels[task_id] = level
+                for child_id in self.children(task_id):
+                    in_degrees[child_id] -= 1
+                    if in_degrees[child_id] == 0:
+                        next_level_tasks.append(child_id)
+            n_ordered += len(level_tasks)
+            level_tasks = next_level_tasks
+            level += 1
+        if n_ordered != self.n_tasks:
+            return self.find_cycle(task_levels)
+        self.task_levels = task_levels
+        self.levels = [array('i') for _ in range(level)]
+        for task_id, task_level in enumerate(task_levels):
+            self.levels[task_level].append(task_id)
+        return []
+
+    def update_order(self, task_ids) -> list[int]:
+        """
+        :param task_ids: the tasks added (see extend) or that got new parents (see add_dependency) since the last
+        ordering
+        :return: an empty list if all tasks could be ordered, the task ids of a cycle otherwise (see find_cycle)
+
+        Only those tasks and their descendants (the only tasks whose level can change) are ordered again, by a Kahn
+        traversal of the sub-DAG they make up: the parents of a task are either in it (ordered before the task) or
+        keep their level. The tasks whose level changed are moved to their new level, keeping the levels sorted by id.
+        The result is the same as ordering the whole DAG again
+        """
+        affected = set()
+        stack = list(task_ids)
+        while len(stack) != 0:
+            task_id = stack.pop()
+            if task_id not in affected:
+                affected.add(task_id)
+                stack.extend(self.children(task_id))
+        in_degrees = {task_id: len([parent_id for parent_id in self.parents(task_id) if parent_id in affected])
+                      for task_id in affected}
+        ready = [task_id for task_id, in_degree in in_degrees.items() if in_degree == 0]
+        new_levels = {}
+        while len(ready) != 0:
+            task_id = ready.pop()
+            new_levels[task_id] = 1 + max([new_levels[parent_id] if parent_id in affected else
+                                           self.task_levels[parent_id] for parent_id in self.parents(task_id)],
+                                          default=-1)
+            for child_id in self.children(task_id):
+                in_degrees[child_id] -= 1
+                if in_degrees[child_id] == 0:
+                    ready.append(child_id)
+        if len(new_levels) != len(affected):
+            for task_id in affected - new_levels.keys():
+                self._move(task_id, -1)
+            return self.find_cycle(self.task_levels)
+        for task_id, level in new_levels.items():
+            self._move(task_id, level)
+        return []
+
+    def _move(self, task_id: int, level: int) -> None:
+        """
+        Move a task to a level (-1: out of the levels)
+        """
+        if self.task_levels[task_id] == level:
+            return
+        if self.task_levels[task_id] != -1:
+            self.levels[self.task_levels[task_id]].remove(task_id)
+        if level != -1:
+            while len(self.levels) <= level:
+                self.levels.append(array('i'))
+            bisect.insort(self.levels[level], task_id)
+        self.task_levels[task_id] = level
+
+    def upward_ranks(self, weights: list[float]) -> array:
+        """
+        :param weights: the weight (e.g. runtime) of each task
+        :return: the upward rank (a.k.a. bottom level) of each task, i.e. its weight plus the largest upward rank
+        of its children: the length of the longest path from the task to the end of the workflow
+
+        order() must have been called: the levels are walked from the last one so that the ranks of the children
+        of a task are known before its own rank. O(V+E)
+        """
+        ranks = array('d', weights)
+        for level in reversed(range(self.n_levels)):
+            for task_id in self.level(level):
+                children = self.children(task_id)
+                if len(children) != 0:
+                    ranks[task_id] += max([ranks[child_id] for child_id in children])
+        return ranks
+
+    def update_upward_ranks(self, ranks: array, weight, task_ids) -> None:
+        """
+        :param ranks: the upward ranks (see upward_ranks), updated in place (and extended to the new tasks)
+        :param weight: the function giving the weight of a task id
+        :param task_ids: the tasks added or that got new children since the ranks were computed
+
+        The rank of a task only depends on its children: the ranks of those tasks are computed again, then those of
+        their parents if they changed, and so on. The tasks are visited from the highest level, so that the rank of a
+        task is computed once the ranks of its children are up to date. update_order must have been called
+        """
+        ranks.extend(array('d', bytes(8 * (self.n_tasks - len(ranks)))))
+        queued = set(task_ids)
+        heap = [(-self.task_levels[task_id], task_id) for task_id in queued]
+        heapq.heapify(heap)
+        while len(heap) != 0:
+            _, task_id = heapq.heappop(heap)
+            queued.discard(task_id)
+            rank = weight(task_id) + max([ranks[child_id] for child_id in self.children(task_id)], default=0.)
+            if rank == ranks[task_id]:
+                continue
+            ranks[task_id] = rank
+            for parent_id in self.parents(task_id):
+                if parent_id not in queued:
+                    queued.add(parent_id)
+                    heapq.heappush(heap, (-self.task_levels[parent_id], parent_id))
+
+    def transitive_reduction(self) -> int:
+        """
+        :return: the number of dependencies removed
+
+        Remove the dependencies implied by other ones: parent p of task t is dropped if another parent of t depends
+        (directly or not) on p. order() must have been called; the levels are not changed by the reduction.
+
+        Such a p has a lower level than the other parent, so the parents of t are walked from the highest level: p is
+        redundant if it was reached by walking up the ancestors of the parents kept so far. The walk stops at the
+        level of the lowest parent of t (no parent can be found beyond), so in layered workflows it is short.
+        """
+        task_levels = self.task_levels
+        parents = []
+        n_removed = 0
+        for task_id in range(self.n_tasks):
+            task_parents = sorted(self.parents(task_id), key=task_levels.__getitem__, reverse=True)
+            if len(task_parents) < 2:
+                parents.append(task_parents)
+                continue
+            lowest_level = task_levels[task_parents[-1]]
+            reached = set()
+            kept = []
+            for parent_id in task_parents:
+                if parent_id in reached:
+                    n_removed += 1
+                    continue
+                kept.append(parent_id)
+                ancestors = list(self.parents(parent_id))
+                while len(ancestors) != 0:
+                    ancestor_id = ancestors.pop()
+                    if ancestor_id not in reached and task_levels[ancestor_id] >= lowest_level:
+                        reached.add(ancestor_id)
+                        ancestors.extend(self.parents(ancestor_id))
+            parents.append(kept)
+        if n_removed != 0:
+            self._set_parents(parents)
+        return n_removed
+
+    def find_cycle(self, task_levels: array) -> list[int]:
+        """
+        :param task_levels: the level of each task, -1 for the tasks that could not be ordered (they are on a cycle
+        or depend on a cycle)
+        :return: the ids of the tasks on one cycle, in execution order, the first one being repeated at the end
+
+        Each task that could not be ordered has at least one parent that could not be ordered either. Walking up
+        those parents necessarily ends up on a task that was already seen: that's the cycle.
+        """
+        task_id = next(task_id for task_id in range(self.n_tasks) if task_levels[task_id] == -1)
+        walk = {}  # task id -> position in the walk (dicts keep the insertion order)
+        while task_id not in walk:
+            walk[task_id] = len(walk)
+            task_id = next(parent_id for parent_id in self.parents(task_id) if task_levels[parent_id] == -1)
+        cycle = list(walk)[walk[task_id]:]
+        cycle.reverse()  # The walk goes from children to parents
+        return cycle + cycle[:1]
@@ -0,0 +1,135 @@
+"""
+Locality-aware partitioning of the tasks of a built WFDAG
+
+The tasks are split into k partitions so that the bytes crossing partitions are minimized, the weight of a
+dependency being the bytes its child reads from its parent (see the data flows of DAGCore). Each partition is then
+meant to run on a worker (or a host): a task placed with the tasks producing its inputs reads them locally instead of
+having them moved by dask (see the affinity of run_workflow in the templates).
+
+Putting everything in a single partition moves nothing: the partitions must also keep the parallelism of the
+workflow. The tasks are therefore balanced level by level: a partition gets at most (1 + imbalance) / k of the tasks
+of each level.
+
+The partitioning is greedy, then refined:
++ The tasks are placed level by level (the heaviest readers first) in the partition they read the most bytes from,
+  among those having room left on the level. Tasks reading nothing go to the least loaded partition
++ Each refinement pass moves a task to the partition it exchanges the most bytes with (its parents and its
+  children), if that partition has room on the level and more bytes are exchanged than in its own partition
+"""
+from __future__ import annotations
+from array import array
+import logging
+import math
+from wfc2dask.wfdag import WFDAG
+
+
+# Logging setup
+logger = logging.getLogger(__name__)
+
+
+def _neighbours(wfdag: WFDAG) -> list[list[tuple[int, int]]]:
+    """
+    :return: for each task id, the (task id, bytes) of the tasks it exchanges data with, its producers and its
+    consumers
+    """
+    core = wfdag._core
+    neighbours = [[] for _ in range(core.n_tasks)]
+    for task_id in range(core.n_tasks):
+        for producer_id, n_bytes in core.flows(task_id):
+            if n_bytes != 0:
+                neighbours[task_id].append((producer_id, n_bytes))
+                neighbours[producer_id].append((task_id, n_bytes))
+    return neighbours
+
+
+def _exchanged_bytes(neighbours: list[tuple[int, int]], partitions: array, n_partitions: int) -> list[int]:
+    """
+    :return: the bytes exchanged by a task with the tasks of each partition (the tasks not placed yet are ignored)
+    """
+    exchanged = [0] * n_partitions
+    for task_id, n_bytes in neighbours:
+        if partitions[task_id] >= 0:
+            exchanged[partitions[task_id]] += n_bytes
+    return exchanged
+
+
+def partition_dag(wfdag: WFDAG, n_partitions: int, imbalance: float = 0.1, n_passes: int = 2) -> array:
+    """
+    :param wfdag: a built WFDAG
+    :param n_partitions: the number of partitions (e.g. the number of workers)
+    :param imbalance: how many more tasks than its share of a level a partition can get (0.1: 10%)
+    :param n_passes: the maximum number of refinement passes
+    :return: the partition of each task id
+    """
+    if n_partitions < 1:
+        raise Exception("The number of partitions must be positive, not %d" % n_partitions)
+    core = wfdag._core
+    neighbours = _neighbours(wfdag)
+    partitions = array('i', [-1]) * core.n_tasks
+    task_levels = array('i', [0]) * core.n_tasks
+    capacities = []
+    loads = []  # level -> number of tasks of each partition
+    for level in range(core.n_levels):
+        tasks = core.level(level)
+        capacities.append(math.ceil(len(tasks) * (1 + imbalance) / n_partitions))
+        loads.append([0] * n_partitions)
+        for task_id in sorted(tasks, key=lambda task_id: -sum([n_bytes for _, n_bytes in neighbours[task_id]])):
+            task_levels[task_id] = level
+            exchanged = _exchanged_bytes(neighbours[task_id], partitions, n_partitions)
+            partition = max([partition for partition in range(n_partitions)
+                             if loads[level][partition] < capacities[level]],
+                            key=lambda partition: (exchanged[partition], -loads[level][partition]))
+            partitions[task_id] = partition
+            loads[level][partition] += 1
+    for n_pass in range(n_passes):
+        n_moved = 0
+        for task_id in range(core.n_tasks):
+            if len(neighbours[task_id]) == 0:
+                continue
+            level = task_levels[task_id]
+            current = partitions[task_id]
+            exchanged = _exchanged_bytes(neighbours[task_id], partitions, n_partitions)
+            best = max([partition for partition in range(n_partitions)
+                        if loads[level][partition] < capacities[level]],
+                       key=exchanged.__getitem__, default=current)
+            if exchanged[best] > exchanged[current]:
+                partitions[task_id] = best
+                loads[level][current] -= 1
+                loads[level][best] += 1
+                n_moved += 1
+        logger.debug("Refinement pass %d: %d tasks moved" % (n_pass + 1, n_moved))
+        if n_moved == 0:
+            break
+    return partitions
+
+
+def total_bytes(wfdag: WFDAG) -> int:
+    """
+    :return: the bytes read by the tasks of a built WFDAG from the other tasks
+    """
+    return wfdag._core.n_flow_bytes
+
+
+def cut_bytes(wfdag: WFDAG, partitions: array) -> int:
+    """
+    :param partitions: the partition of each task id (see partition_dag)
+    :return: the bytes read by the tasks from tasks of other partitions
+    """
+    core = wfdag._core
+    return sum([n_bytes for task_id in range(core.n_tasks) for producer_id, n_bytes in core.flows(task_id)
+                if partitions[producer_id] != partitions[task_id]])
+
+
+def partitioning_report(wfdag: WFDAG, partitions: array, n_partitions: int) -> str:
+    """
+    :return: the estimated bytes moved between workers without and with the partitioning
+
+    Without partitioning, dask places the tasks with no regard to the bytes they exchange: a task and its producer
+    are on different partitions (n_partitions - 1) / n_partitions of the time
+    """
+    total = total_bytes(wfdag)
+    moved = cut_bytes(wfdag, partitions)
+    rep = "%d partitions: %d bytes exchanged by the tasks\n" % (n_partitions, total)
+    rep += "Estimated bytes moved without partitioning: %d\n" % (total * (n_partitions - 1) // n_partitions)
+    rep += "Estimated bytes moved with partitioning: %d (%.1f%%)" % (moved, 100. * moved / total if total else 0.)
+    return rep
@@ -0,0 +1,296 @@
+"""
+Long-running workflow service: WfFormat documents are run on a warm dask cluster
+
+Converting a workflow to a project and running application.py starts a new cluster for each run: for small workflows,
+the cluster startup, the imports of the workers and the project generation take much longer than the tasks. The
+service starts (or connects to) a cluster once and has its workers import the task code (see warm_up in
+code_templates/helpers.py). Each submitted document is then built in memory and submitted as a dask graph (see
+run_graph in code_templates/run_workflow_graph.py): no project is written and nothing is compiled.
+
+Several workflows can run at the same time: the dask keys of the tasks of a workflow are prefixed with its id. Note
+that they run in the same working directory (that of the workers), like their outputs and logs.
+
+HTTP endpoints:
++ POST /workflows?<options>: the body is a WfFormat document. The response is in JSON lines format: the status of the
+  workflow (see WorkflowService.run), then the record of each task as it completes (see WorkflowTask.to_record),
+  then the final status of the workflow. With wait=0, only the first line is sent: the workflow runs in the background
++ GET /workflows: the status of all the workflows (the running ones and the last ones that ended, see max_finished)
++ GET /workflows/<id>: the status of a workflow
+The options are those of application.py (see OPTIONS), e.g. POST /workflows?time_compression=100&retries=2
+
+python -m wfc2dask.service [--port 8780] [--scheduler tcp://host:8786]
+curl --data-binary @workflow.json http://localhost:8780/workflows
+"""
+from __future__ import annotations
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import collections
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import urllib.parse
+from wfc2dask.wfctask import WFCTask
+from wfc2dask.wfdag import WFDAG
+
+
+# Logging setup
+logger = logging.getLogger(__name__)
+
+TEMPLATE_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "code_templates")
+# The modules run by the workers, in dependency order
+WORKER_MODULES = ["workflow_task.py", "checkpoints.py", "helpers.py"]
+
+
+def _boolean(value: str) -> bool:
+    return value.lower() in ["1", "true", "yes"]
+
+
+# Options of a workflow (query string of its submission) -> their type
+OPTIONS = {"simulate": _boolean, "seed": int, "time_compression": float, "io_mode": str, "checkpoint": str,
+           "retries": int, "timeout_factor": float, "speculation": float, "reduce": _boolean, "wait": _boolean}
+DEFAULT_OPTIONS = {"simulate": True, "seed": 42, "reduce": False, "wait": True}
+# The options that are WorkflowTask options
+TASK_OPTIONS = ["time_compression", "io_mode", "checkpoint", "retries", "timeout_factor"]
+
+
+def parse_options(query: str) -> dict:
+    """
+    :param query: the query string of a submission, e.g. "time_compression=10&retries=2"
+    :return: the options of the workflow (see OPTIONS), with their default values (see DEFAULT_OPTIONS)
+    """
+    options = dict(DEFAULT_OPTIONS)
+    for name, values in urllib.parse.parse_qs(query).items():
+        if name not in OPTIONS:
+            raise Exception("Unknown option '%s' (options: %s)" % (name, ", ".join(OPTIONS)))
+        options[name] = OPTIONS[name](values[-1])
+    return options
+
+
+def load_workflow(document: dict, reduce: bool = False) -> WFDAG:
+    """
+    :param document: a WfFormat document
+    :param reduce: whether the dependencies implied by other ones are removed (see WFDAG.reduce_dependencies)
+    :return: the built WFDAG of the workflow
+    """
+    tasks, name = WFCTask.loads(document)
+    wfdag = WFDAG.from_tasks(tasks, name)
+    wfdag.build_dag()
+    if reduce:
+        wfdag.reduce_dependencies()
+    return wfdag
+
+
+def _drain(lines: Iterator) -> None:
+    """
+    Consume a generator to its end (e.g. to run a workflow in the background, see WorkflowService.run)
+    """
+    for _ in lines:
+        pass
+
+
+class WorkflowService:
+    def __init__(self, client, max_finished: int = 1000):
+        """
+        :param client: the dask client of the cluster running the workflows. The templates must be importable (see
+        serve)
+        :param max_finished: the number of workflows that ended whose status is kept (the oldest are forgotten)
+        """
+        from helpers import warm_up
+        self.client = client
+        self.max_finished = max_finished
+        # id -> status. The statuses are only changed under the lock (see _update), copies of them are returned
+        self.workflows = {}
+        self._finished = collections.deque()  # The ids of the workflows that ended, in the order they ended
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self.workers = sorted(client.run(warm_up))
+        logger.info("%d workers warmed up" % len(self.workers))
+
+    def statuses(self) -> list[dict]:
+        with self._lock:
+            return [dict(status) for status in self.workflows.values()]
+
+    def status(self, workflow_id: str) -> dict:
+        """
+        :return: the status of a workflow, None if unknown
+        """
+        with self._lock:
+            status = self.workflows.get(workflow_id)
+            return None if status is None else dict(status)
+
+    def _update(self, status: dict, changes: dict) -> dict:
+        """
+        :param status: the status of a workflow
+        :param changes: the changes to the status
+        :return: a copy of the status, once changed
+
+        When the workflow ends, the oldest workflows that ended are forgotten (see max_finished)
+        """
+        with self._lock:
+            status.update(changes)
+            if status["status"] != "running":
+                self._finished.append(status["workflow"])
+                while len(self._finished) > self.max_finished:
+                    del self.workflows[self._finished.popleft()]
+            return dict(status)
+
+    def run(self, document: dict, options: dict) -> Iterator[dict]:
+        """
+        :param document: a WfFormat document
+        :param options: the options of the workflow (see parse_options)
+        :return: a generator of the status of the workflow, then of the records of its tasks as they complete, then
+        of its final status. The workflow is built (or an exception raised) by the first next() and it runs as long
+        as the generator is consumed
+
+        A status holds the id of the workflow ("workflow"), its name, its number of tasks, the number of tasks
+        completed so far, the status itself ("running", "done" or "failed") and the error that failed the workflow,
+        plus its submission and end times and the time (s) it took to build it and hand it to dask ("overhead")
+        """
+        from run_workflow_graph import graph_from_descriptions, run_graph
+        submit_time = time.time()
+        wfdag = load_workflow(document, options["reduce"])
+        with self._lock:
+            workflow_id = "w%d" % next(self._ids)
+            status = {"workflow": workflow_id, "name": wfdag.workflow_name, "n_tasks": len(wfdag.dag_tasks),
+                      "n_completed": 0, "status": "running", "error": None, "submit_time": submit_time,
+                      "end_time": None, "overhead": None}
+            self.workflows[workflow_id] = status
+        task_options = {name: options[name] for name in TASK_OPTIONS if options.get(name) is not None}
+        graph, tasks, priorities = graph_from_descriptions(wfdag.task_descriptions(), options["simulate"],
+                                                           options["seed"], "%s-" % workflow_id, **task_options)
+        del wfdag
+        logger.info("Workflow %s (%s): %d tasks" % (workflow_id, status["name"], status["n_tasks"]))
+        yield self.status(workflow_id)
+        overhead = None
+        try:
+            for n_completed, task in enumerate(run_graph(self.client, graph, tasks, priorities,
+                                                         options.get("speculation")), 1):
+                if overhead is None:
+                    overhead = task.submit_time - submit_time
+                self._update(status, {"n_completed": n_completed, "overhead": overhead})
+                yield task.to_record()
+            changes = {"status": "done"}
+        except Exception as exc:
+            logger.warning("Workflow %s failed: %s" % (workflow_id, exc))
+            changes = {"status": "failed", "error": "%s: %s" % (type(exc).__name__, exc)}
+        final_status = self._update(status, dict(changes, end_time=time.time()))
+        logger.info("Workflow %s %s in %.3f s" % (workflow_id, final_status["status"],
+                                                   final_status["end_time"] - final_status["submit_time"]))
+        yield final_status
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    service = None  # The WorkflowService (see serve)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s" % (self.address_string(), format % args))
+
+    def _send_json(self, code: int, o) -> None:
+        body = json.dumps(o).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "%d" % len(body))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urllib.parse.urlsplit(self.path).path.rstrip("/")
+        if path == "/workflows":
+            self._send_json(200, self.service.statuses())
+        elif path.startswith("/workflows/") and self.service.status(path[len("/workflows/"):]) is not None:
+            self._send_json(200, self.service.status(path[len("/workflows/"):]))
+        else:
+            self._send_json(404, {"error": "Unknown resource '%s'" % path})
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path.rstrip("/") != "/workflows":
+            self._send_json(404, {"error": "Unknown resource '%s'" % url.path})
+            return
+        try:
+            options = parse_options(url.query)
+            document = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            lines = self.service.run(document, options)
+            first_line = next(lines)
+        except Exception as exc:
+            self._send_json(400, {"error": "%s: %s" % (type(exc).__name__, exc)})
+            return
+        # The lines are sent as they come, the end of the response being the end of the connection (HTTP/1.0)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        self._write_line(first_line)
+        if not options["wait"]:
+            threading.Thread(target=_drain, args=(lines,), daemon=True).start()
+            return
+        connected = True
+        for line in lines:
+            if connected:
+                try:
+                    self._write_line(line)
+                except OSError:
+                    connected = False  # The caller is gone: the workflow still runs to its end
+
+    def _write_line(self, o: dict) -> None:
+        self.wfile.write(json.dumps(o, separators=(",", ":")).encode())
+        self.wfile.write(b"\n")
+        self.wfile.flush()
+
+
+def serve(host: str, port: int, scheduler_address: str = None, n_workers: int = None,
+          max_finished: int = 1000) -> None:
+    """
+    Run the service until interrupted
+
+    :param scheduler_address: the address of an existing scheduler, None to start a local cluster
+    :param n_workers: the number of workers of the local cluster (see build_dask_client in code_templates)
+    :param max_finished: the number of workflows that ended whose status is kept (see WorkflowService)
+    """
+    # The templates are imported by the service and by the workers of the local cluster (started after this)
+    sys.path.insert(0, TEMPLATE_DIRECTORY)
+    os.environ["PYTHONPATH"] = os.pathsep.join([TEMPLATE_DIRECTORY] + [path for path in [os.environ.get("PYTHONPATH")]
+                                                                       if path])
+    from dask_client import build_dask_client, cpu_count
+    with build_dask_client(scheduler_address, cpu_count if n_workers is None else n_workers) as client:
+        if scheduler_address is not None:
+            for name in WORKER_MODULES:  # The workers of an existing cluster get the templates from the client
+                client.upload_file(os.path.join(TEMPLATE_DIRECTORY, name))
+        _RequestHandler.service = WorkflowService(client, max_finished)
+        server = ThreadingHTTPServer((host, port), _RequestHandler)
+        server.daemon_threads = True
+        logger.info("Serving on http://%s:%d/workflows" % (host, port))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+
+def process_arguments():
+    import argparse
+    parser = argparse.ArgumentParser(prog=sys.argv[0], description='Runs WfFormat workflows on a warm dask cluster')
+    parser.add_argument("--host", help="Address the service listens on", default="127.0.0.1")
+    parser.add_argument("-p", "--port", help="Port the service listens on", type=int, default=8780)
+    parser.add_argument("--scheduler", help="Address of an existing dask scheduler (default: start a local cluster)",
+                        default=os.environ.get("WFC2DASK_SCHEDULER"))
+    parser.add_argument("-w", "--n_workers", help="Number of workers of the local cluster", type=int)
+    parser.add_argument("--max_finished", help="Number of workflows that ended whose status is kept", type=int,
+                        default=1000)
+    parser.add_argument("-d", "--debug", help="Debug mode (Info mode by default)", action="store_true")
+    return parser.parse_args()
+
+
+def main():
+    args = process_arguments()
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    serve(args.host, args.port, args.scheduler, args.n_workers, args.max_finished)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""
+Discrete-event simulation of the execution of a WFDAG on N identical virtual workers
+
+Nothing is executed nor slept: the tasks last their runtimeInSeconds (or a duration drawn from a seeded randomizer,
+like WorkflowTask.simulate_execution does, when it is unknown) and the simulation jumps from one task completion to
+the next. A 50k-task workflow is simulated in a few seconds of wall time, so the makespan of a workflow can be
+predicted for various numbers of workers before launching a cluster.
+
+Each worker runs one task at a time. When workers are idle, the ready tasks are started in the order given by the
+scheduling policy (see POLICIES): a function of the WFDAG and of the task durations returning the sort key of a
+task id (smallest first).
+
+Stragglers (tasks lasting much longer than expected) can be injected, and speculative re-execution simulated.
+
+python -m wfc2dask.simulator <workflow_filename> -w 8 32 128 [-p critical_path] [--straggler_rate 0.01 --speculation 2]
+"""
+from __future__ import annotations
+from array import array
+import heapq
+import logging
+import random
+from wfc2dask.wfdag import WFDAG
+
+
+# Logging setup
+logger = logging.getLogger(__name__)
+
+
+def _fifo(wfdag: WFDAG, durations: array):
+    return lambda task_id: task_id  # The order in which the tasks were added
+
+
+def _critical_path(wfdag: WFDAG, durations: array):
+    # Largest upward rank first, like the dask priorities (but with the simulated durations)
+    ranks = wfdag._core.upward_ranks(durations)
+    return lambda task_id: -ranks[task_id]
+
+
+def _most_children(wfdag: WFDAG, durations: array):
+    return lambda task_id: -len(wfdag._core.children(task_id))
+
+
+POLICIES = {"fifo": _fifo, "critical_path": _critical_path, "most_children": _most_children}
+
+
+class SimulationResult:
+    def __init__(self, wfdag: WFDAG, n_workers: int, durations: array, starts: array, ends: array,
+                 n_speculated: int = 0):
+        self.wfdag = wfdag
+        self.n_workers = n_workers
+        self.durations = durations  # Duration (s) of each task, by task index
+        self.starts = starts  # Simulated start time (s) of each task, by task index
+        self.ends = ends  # Simulated end time (s) of each task, by task index
+        self.n_speculated = n_speculated  # Number of tasks that got a (speculative) copy
+        self.makespan = max(ends) if len(ends) != 0 else 0.
+        # The lower bound of the makespan, whatever the number of workers
+        self.critical_path_length = max(wfdag._core.upward_ranks(durations)) if len(durations) != 0 else 0.
+
+    @property
+    def utilization(self) -> float:
+        """
+        :return: the fraction of the worker time spent running tasks
+        """
+        return sum(self.durations) / (self.makespan * self.n_workers) if self.makespan != 0 else 0.
+
+    def level_times(self) -> list[tuple[float, float]]:
+        """
+        :return: the time the first task of each level starts and the time its last task ends
+        """
+        core = self.wfdag._core
+        return [(min([self.starts[task_id] for task_id in core.level(level)]),
+                 max([self.ends[task_id] for task_id in core.level(level)])) for level in range(core.n_levels)]
+
+    def report(self) -> str:
+        """
+        :return: a description of the simulation: makespan, utilization and timing of each level
+        """
+        rep = "%d tasks on %d workers: makespan %.3f s, utilization %.1f%% (critical path %.3f s)\n" % (
+            len(self.durations), self.n_workers, self.makespan, 100 * self.utilization, self.critical_path_length)
+        if self.n_speculated != 0:
+            rep += "%d speculative copies\n" % self.n_speculated
+        for level, (start, end) in enumerate(self.level_times()):
+            rep += "Level %d (%d tasks): %.3f s -> %.3f s\n" % (level, len(self.wfdag._core.level(level)), start, end)
+        return rep
+
+
+def task_durations(wfdag: WFDAG, seed: int = 42, minimum_execution_time: float = 0.1,
+                   maximum_execution_time: float = 1.1) -> array:
+    """
+    :return: the duration of each task: its runtimeInSeconds if known, a random duration between
+    minimum_execution_time and maximum_execution_time otherwise
+    """
+    randomizer = random.Random(seed)
+    return array('d', [randomizer.uniform(minimum_execution_time, maximum_execution_time)
+                       if wfctask.runtime is None else wfctask.runtime for wfctask in wfdag._wfctasks])
+
+
+def with_stragglers(durations: array, rate: float, slowdown: float, seed: int = 42) -> array:
+    """
+    :param durations: the duration of each task
+    :param rate: the fraction of the tasks that straggle
+    :param slowdown: how many times longer a straggler lasts
+    :return: the durations, with stragglers drawn at random
+    """
+    randomizer = random.Random(seed)
+    return array('d', [duration * slowdown if randomizer.random() < rate else duration for duration in durations])
+
+
+def simulate(wfdag: WFDAG, n_workers: int, policy: str = "critical_path", durations: array = None,
+             seed: int = 42, expected_durations: array = None, speculation: float = None) -> SimulationResult:
+    """
+    :param wfdag: a WFDAG (built if needed)
+    :param n_workers: the number of virtual workers
+    :param policy: the name of the scheduling policy (see POLICIES)
+    :param durations: the duration of each task (see task_durations, called with seed if None)
+    :param seed: randomizer seed
+    :param expected_durations: the duration of each task as known before running it (durations if None): it differs
+    from durations for the stragglers (see with_stragglers)
+    :param speculation: if not None, a task still running after speculation times its expected duration gets a copy,
+    lasting its expected duration, on the first idle worker (like run_speculative in the graph mode template). The
+    first copy to end wins and the other one is cancelled
+    :return: the simulation result
+
+    O((V+E) log V)
+    """
+    wfdag.build_dag()
+    core = wfdag._core
+    if durations is None:
+        durations = task_durations(wfdag, seed)
+    if expected_durations is None:
+        expected_durations = durations
+    key = POLICIES[policy](wfdag, expected_durations)
+    in_degrees = array('q', [len(core.parents(task_id)) for task_id in range(core.n_tasks)])
+    starts = array('d', bytes(8 * core.n_tasks))
+    ends = array('d', bytes(8 * core.n_tasks))
+    n_copies = array('b', bytes(core.n_tasks))  # Number of copies of each task running
+    ready = [(key(task_id), task_id) for task_id in range(core.n_tasks) if in_degrees[task_id] == 0]
+    heapq.heapify(ready)
+    running = []  # (end time, task id) of the running copies (including those of the tasks that ended already)
+    checks = []  # (time, task id): when the running tasks exceed speculation times their expected duration
+    late = []  # Tasks to copy as soon as a worker is idle
+    n_busy = 0
+    n_speculated = 0
+    now = 0.
+    while len(ready) != 0 or len(running) != 0:
+        # Start as many ready tasks as there are idle workers, then copies of the late tasks
+        while len(ready) != 0 and n_busy < n_workers:
+            _, task_id = heapq.heappop(ready)
+            starts[task_id] = now
+            heapq.heappush(running, (now + durations[task_id], task_id))
+            n_copies[task_id] = 1
+            n_busy += 1
+            if speculation is not None:
+                heapq.heappush(checks, (now + speculation * expected_durations[task_id], task_id))
+        while len(late) != 0 and n_busy < n_workers:
+            task_id = late.pop(0)
+            if n_copies[task_id] == 1:
+                heapq.heappush(running, (now + expected_durations[task_id], task_id))
+                n_copies[task_id] = 2
+                n_busy += 1
+                n_speculated += 1
+        # Jump to the next completion or check (and handle all the events happening at that time)
+        now = min(running[0][0], checks[0][0]) if len(checks) != 0 else running[0][0]
+        while len(checks) != 0 and checks[0][0] == now:
+            _, task_id = heapq.heappop(checks)
+            if n_copies[task_id] == 1:
+                late.append(task_id)
+        while len(running) != 0 and running[0][0] == now:
+            _, task_id = heapq.heappop(running)
+            if n_copies[task_id] == 0:
+                continue  # The copy that lost
+            ends[task_id] = now
+            n_busy -= n_copies[task_id]  # The other copy, if any, is cancelled
+            n_copies[task_id] = 0
+            for child_id in core.children(task_id):
+                in_degrees[child_id] -= 1
+                if in_degrees[child_id] == 0:
+                    heapq.heappush(ready, (key(child_id), child_id))
+    # The duration of a task that got a copy is the one of the copy that won
+    return SimulationResult(wfdag, n_workers, array('d', [end - start for start, end in zip(starts, ends)]), starts,
+                            ends, n_speculated)
+
+
+def process_arguments():
+    import argparse
+    import sys
+    parser = argparse.ArgumentParser(prog=sys.argv[0], description='Predicts the makespan of a workflow')
+    parser.add_argument("workflow_filename", help="Name of the file describing the workflow")
+    parser.add_argument("-w", "--n_workers", help="Numbers of workers", type=int, nargs="+", default=[8])
+    parser.add_argument("-p", "--policy", help="Scheduling policy", choices=sorted(POLICIES), default="critical_path")
+    parser.add_argument("-s", "--seed", help="Randomizer seed (for the tasks without runtimeInSeconds)", type=int,
+                        default=42)
+    parser.add_argument("--straggler_rate", help="Fraction of the tasks that straggle", type=float, default=0.)
+    parser.add_argument("--straggler_slowdown", help="How many times longer a straggler lasts", type=float,
+                        default=10.)
+    parser.add_argument("--speculation", help="Copy the tasks running for longer than this factor times their "
+                                              "expected duration", type=float)
+    return parser.parse_args()
+
+
+def main():
+    args = process_arguments()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    wfdag = WFDAG.load(args.workflow_filename)
+    wfdag.build_dag()
+    expected_durations = task_durations(wfdag, args.seed)
+    durations = with_stragglers(expected_durations, args.straggler_rate, args.straggler_slowdown, args.seed)
+    for n_workers in args.n_workers:
+        print(simulate(wfdag, n_workers, args.policy, durations, expected_durations=expected_durations,
+                       speculation=args.speculation).report())
+
+
+if __name__ == '__main__':
+    main()
@@ -9,70 +9,252 @@ Namely, that means that we only support the following elements in the JSON docum
 - name
 - command.arguments
 - parents
-- tasks.[link=input|output,name]
+- tasks.[link=input|output,name,sizeInBytes]
+- runtimeInSeconds (used to find the critical path of the workflow)
+- cores and memoryInBytes (used as dask resource requirements)
 Any other elements can be present but will be ignored
 
+WFCTask.load reads the whole JSON document at once (with orjson if it is installed). WFCTask.iterload parses
+workflow.tasks one element at a time so that only the task being parsed is held in memory on top of the WFCTask
+instances (useful for multi-GB documents)
+
+The WFCTask instances are not views over the DAG core (see wfc2dask/dagcore.py): they exist before the DAG is built
+(parsing, clustering) and can be changed until then. Their names are interned and their parents, inputs and outputs
+are stored in tuples, seen as sets (see _NameSet)
+
 Important note:
 - childrens (sic!) element contents are IGNORED
 Defining "children" of a task is a violation of the Chain-of-responsibility pattern: When defining a task, I know
 what my task depends on, but I cannot anticipate which tasks will depend on it
 """
 from __future__ import annotations
+from collections.abc import Iterator, MutableSet
+import itertools
+import json
 import logging
+import re
+import sys
 
 
 # Logging setup
 logger = logging.getLogger(__name__)
 
 
+class _NameSet(MutableSet):
+    """
+    The names (of parent tasks, of input or of output files) of a WFCTask, as a set
+
+    The task stores them in a tuple: a tuple costs 8 bytes per name (plus 40), a set 216 bytes at least, which makes
+    most of the memory of a task. This is a view over that tuple, created on access, that the task replaces when the
+    names change. Adding a name costs the number of names, which is small
+    """
+    __slots__ = ("task", "slot")
+
+    def __init__(self, task: WFCTask, slot: str):
+        self.task = task
+        self.slot = slot
+
+    def __contains__(self, name) -> bool:
+        return name in getattr(self.task, self.slot)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(getattr(self.task, self.slot))
+
+    def __len__(self) -> int:
+        return len(getattr(self.task, self.slot))
+
+    def __repr__(self) -> str:
+        return repr(set(getattr(self.task, self.slot)))
+
+    def add(self, name: str) -> None:
+        names = getattr(self.task, self.slot)
+        if name not in names:
+            setattr(self.task, self.slot, names + (sys.intern(name),))
+
+    def discard(self, name: str) -> None:
+        names = getattr(self.task, self.slot)
+        if name in names:
+            setattr(self.task, self.slot, tuple([other for other in names if other != name]))
+
+    def update(self, *iterables) -> None:
+        setattr(self.task, self.slot, _names(itertools.chain(getattr(self.task, self.slot), *iterables)))
+
+
+def _names(names) -> tuple[str, ...]:
+    """
+    :return: the distinct names, interned, in a tuple (see _NameSet)
+    """
+    return tuple(dict.fromkeys([sys.intern(name) for name in names]))
+
+
 class WFCTask:
+    # The parents, inputs and outputs are stored in tuples (see _NameSet)
+    __slots__ = ("name", "command", "_parents", "_inputs", "_outputs", "runtime", "cores", "memory", "sizes")
+
     def __init__(self):
         self.name = None  # Ignoring type
         self.command = None
-        self.parents = set()
-        self.inputs = set()
-        self.outputs = set()
+        self._parents = ()
+        self._inputs = ()
+        self._outputs = ()
+        self.runtime = None  # runtimeInSeconds, if known
+        self.cores = None  # cores, if known
+        self.memory = None  # memoryInBytes, if known
+        self.sizes = None  # sizeInBytes of the input and output files, if any is known (file name -> size)
         pass
 
+    @property
+    def parents(self) -> _NameSet:
+        """
+        :return: the names of the parent tasks (a mutable set)
+        """
+        return _NameSet(self, "_parents")
+
+    @parents.setter
+    def parents(self, names) -> None:
+        self._parents = _names(names)
+
+    @property
+    def inputs(self) -> _NameSet:
+        """
+        :return: the names of the input files (a mutable set)
+        """
+        return _NameSet(self, "_inputs")
+
+    @inputs.setter
+    def inputs(self, names) -> None:
+        self._inputs = _names(names)
+
+    @property
+    def outputs(self) -> _NameSet:
+        """
+        :return: the names of the output files (a mutable set)
+        """
+        return _NameSet(self, "_outputs")
+
+    @outputs.setter
+    def outputs(self, names) -> None:
+        self._outputs = _names(names)
+
+    def dependencies(self) -> tuple[str, ...]:
+        """
+        :return: the names of the parent tasks and of the input files, i.e. what the task depends on (they may
+        overlap)
+        """
+        return self._parents + self._inputs
+
     @staticmethod
     def from_json(o_task: dict):
         """
         :param o_task: a task represented by a JSON object/dictionary
         :return: a WFCTask instance
         """
-        logger.debug("'%s'" % o_task)
+        logger.debug("'%s'", o_task)  # Lazy formatting: o_task can be large
         task = WFCTask()
-        task.name = o_task["name"]
+        # Names are interned: a file name (or a task name) is then shared by the tasks that produce and consume it
+        task.name = sys.intern(o_task["name"])
         try:
-            for parent in o_task["parents"]:
-                task.parents.add(parent)
+            task._parents = _names(o_task["parents"])
         except KeyError:
             pass  # No parents element for the task. Ignore
         if "childrens" in o_task and len(o_task["childrens"]):
             logger.warning("Non-empty 'childrens' element found in task '%s' is IGNORED" % task.name)
         if "files" in o_task:  # From the sepc, files does not have to be present
+            inputs = []
+            outputs = []
             for file in o_task["files"]:
+                if "sizeInBytes" in file:
+                    if task.sizes is None:
+                        task.sizes = {}
+                    task.sizes[sys.intern(file["name"])] = file["sizeInBytes"]
                 if file["link"] == "input":
-                    task.inputs.add(file["name"])
+                    inputs.append(file["name"])
                 elif file["link"] == "output":
-                    task.outputs.add(file["name"])
+                    outputs.append(file["name"])
                 else:
                     logger.debug(f"{file['link']} not supported: must be either input or output")
+            task._inputs = _names(inputs)
+            task._outputs = _names(outputs)
+        task.runtime = o_task.get("runtimeInSeconds")
+        task.cores = o_task.get("cores")
+        task.memory = o_task.get("memoryInBytes")
         try:
             task.command = o_task["command"]["arguments"]
         except KeyError:
             pass  # If the command is not specified, we will simulate it by creating empty output files
         return task
 
+    def file_size(self, name: str) -> int:
+        """
+        :param name: the name of an input or output file of the task
+        :return: its size in bytes, None if unknown
+        """
+        return None if self.sizes is None else self.sizes.get(name)
+
+    def data_inputs(self) -> set[str]:
+        """
+        :return: the names of the files read by the task
+        """
+        return self.inputs
+
+    def data_outputs(self) -> set[str]:
+        """
+        :return: the names of the files written by the task
+        """
+        return self.outputs
+
+    def resources(self) -> dict[str, float]:
+        """
+        :return: the dask resources required by the task (only those that are known): "cores" and "memory" (bytes)
+        """
+        resources = {}
+        if self.cores is not None:
+            resources["cores"] = self.cores
+        if self.memory is not None:
+            resources["memory"] = self.memory
+        return resources
+
     @staticmethod
     def load(filename: str) -> tuple[list[WFCTask], str]:
         """
         :param filename: the name of a file containing a representation of a WorkFlowCommon workflow
         :return: the list of tasks in filename
+
+        The whole document is loaded in memory. If orjson is installed, it is used to parse it (much faster)
+        """
+        try:
+            import orjson
+        except ImportError:
+            with open(filename) as fp:
+                return WFCTask.loads(json.load(fp))
+        with open(filename, "rb") as fp:
+            return WFCTask.loads(orjson.loads(fp.read()))
+
+    @staticmethod
+    def iterload(filename: str, header: dict = None) -> Iterator[WFCTask]:
+        """
+        :param filename: the name of a file containing a representation of a WorkFlowCommon workflow
+        :param header: if not None, it is filled with the top-level elements of the document other than
+        "workflow" (e.g. "name") as they are parsed, i.e. it is complete once the generator is exhausted
+        :return: a generator of the tasks in filename
+
+        The elements of workflow.tasks are parsed one at a time and are dropped as soon as the WFCTask is built.
+        The other elements of "workflow" (e.g. "machines") are parsed and ignored
         """
-        import json
         with open(filename) as fp:
-            return WFCTask.loads(json.load(fp))
+            stream = _JSONStream(fp)
+            for key in stream.members():
+                if key == "workflow":
+                    for workflow_key in stream.members():
+                        if workflow_key == "tasks":
+                            for o_task in stream.elements():
+                                yield WFCTask.from_json(o_task)
+                        else:
+                            stream.value()  # Ignored
+                else:
+                    value = stream.value()
+                    if header is not None:
+                        header[key] = value
 
     @staticmethod
     def loads(json_workflow: dict) -> tuple[list[WFCTask], str]:
@@ -84,3 +266,147 @@ class WFCTask:
         for o_task in json_workflow["workflow"]["tasks"]:
             tasks.append(WFCTask.from_json(o_task))
         return tasks, json_workflow["name"]
+
+
+class _JSONStream:
+    """
+    A minimal incremental reader of a JSON document: objects and arrays are walked member by member, and each
+    value is decoded on its own by the json module (C) scanner from a buffer that is refilled from the file
+    when needed. Hence only the value being decoded (plus a chunk) has to fit in memory.
+
+    orjson is not used here because it can only decode a whole buffer, not a value at a given position
+    """
+    CHUNK_SIZE = 1 << 20  # Characters read from the file at once (at least)
+    WHITESPACES = re.compile(r'[ \t\n\r]*')
+    DELIMITERS = " \t\n\r,:]}"  # What may follow a value
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.buffer = ""
+        self.pos = 0  # Position of the next character to parse in buffer
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self, size: int) -> None:
+        """
+        Drop what has been parsed from the buffer and append at least size characters from the file to it
+        """
+        chunk = self.fp.read(max(size, self.CHUNK_SIZE))
+        if len(chunk) == 0:
+            self.eof = True
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+
+    def peek(self) -> str:
+        """
+        :return: the next non-whitespace character (not consumed)
+        """
+        while True:
+            self.pos = self.WHITESPACES.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if self.eof:
+                raise ValueError("Unexpected end of JSON document")
+            self._fill(self.CHUNK_SIZE)
+
+    def expect(self, chars: str) -> str:
+        """
+        :param chars: the characters that are allowed next
+        :return: the next non-whitespace character (consumed)
+        """
+        char = self.peek()
+        if char not in chars:
+            raise ValueError("Expected one of '%s' in JSON document, found '%s'" % (chars, char))
+        self.pos += 1
+        return char
+
+    def value(self):
+        """
+        :return: the next JSON value, decoded
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A value must be followed by a whitespace or a delimiter unless the document is over: a number at
+                # the end of the buffer may be truncated (e.g. 123 of 123.456), whether or not the decoder stopped
+                # before the end of the buffer (e.g. 123. of 123.456 is decoded as 123)
+                if (end < len(self.buffer) and self.buffer[end] in self.DELIMITERS) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # Double what's left in the buffer, so that decoding a large value stays linear
+            self._fill(len(self.buffer) - self.pos)
+
+    def members(self) -> Iterator[str]:
+        """
+        :return: a generator of the keys of the next JSON object. The caller must consume each value
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if self.expect(",}") == "}":
+                return
+
+    def elements(self) -> Iterator:
+        """
+        :return: a generator of the elements of the next JSON array, decoded
+        """
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(",]") == "]":
+                return
+
+
+class WFCCluster(WFCTask):
+    """
+    A composite task: its members (WFCTask instances) are executed one after the other by a single dask task
+    (see wfc2dask/clustering.py). The dependencies of a cluster are only given by its parents (names of other
+    clusters): it has no inputs nor outputs of its own, those of its members are kept in the members
+    """
+    __slots__ = ("members",)
+
+    def __init__(self, name: str, members: list[WFCTask]):
+        super().__init__()
+        self.name = name
+        self.members = members
+        runtimes = [member.runtime for member in members if member.runtime is not None]
+        self.runtime = sum(runtimes) if len(runtimes) != 0 else None
+        # The members run one after the other: the cluster needs what its most demanding member needs
+        cores = [member.cores for member in members if member.cores is not None]
+        self.cores = max(cores) if len(cores) != 0 else None
+        memories = [member.memory for member in members if member.memory is not None]
+        self.memory = max(memories) if len(memories) != 0 else None
+
+    def file_size(self, name: str) -> int:
+        """
+        :return: the size in bytes of a file of one of the members, None if unknown
+        """
+        for member in self.members:
+            size = member.file_size(name)
+            if size is not None:
+                return size
+        return None
+
+    def data_inputs(self) -> set[str]:
+        """
+        :return: the names of the files read by the members and not written by one of them
+        """
+        return set().union(*[member.inputs for member in self.members]) - self.data_outputs()
+
+    def data_outputs(self) -> set[str]:
+        """
+        :return: the names of the files written by the members
+        """
+        return set().union(*[member.outputs for member in self.members])
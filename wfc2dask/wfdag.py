@@ -2,10 +2,17 @@
 The DAG corresponding to a workflow
 
 Vertices are instances of the inner class WFDAGTask. A WFDAGTask instance is an enriched WFCTask
+
+The DAG itself is stored in a compact integer-indexed core (see wfc2dask/dagcore.py). WFDAGTask instances, dag_tasks
+and ordered_tasks are views over that core built on demand
 """
 from __future__ import annotations
+from array import array
+from collections.abc import Iterator, Mapping
+import itertools
 import logging
-from wfc2dask.wfctask import WFCTask
+from wfc2dask.dagcore import DAGCore
+from wfc2dask.wfctask import WFCCluster, WFCTask
 from code_templates.workflow_task import WorkflowTask
 # Logging setup
 logger = logging.getLogger(__name__)
@@ -14,26 +21,108 @@ logger = logging.getLogger(__name__)
 class WFDAG:
     class WFDAGTask:
         """
-        A vertex of the DAG, i.e. a WFCTask with a private id (dag_id) and the set of its parent private ids (a set
-        of dag_id)
+        A vertex of the DAG, i.e. a WFCTask with a private id (dag_id), the set of its parent private ids (a set
+        of dag_id) and the set of its children private ids
+
+        This is a view over the DAG core: it only holds the task index
         """
-        def __init__(self, wfctask: WFCTask, index: int):
-            self.wfctask = wfctask  # The underlying WFCTask
-            self.dag_id = 'dv_%d' % index  # dv stands for DAG Vertex
-            self.dag_parents = set()
+        __slots__ = ("wfdag", "index")
+
+        def __init__(self, wfdag: WFDAG, index: int):
+            self.wfdag = wfdag
+            self.index = index
+
+        @property
+        def wfctask(self) -> WFCTask:
+            return self.wfdag._wfctasks[self.index]  # The underlying WFCTask
+
+        @property
+        def dag_id(self) -> str:
+            return WFDAG.dag_id(self.index)
+
+        @property
+        def dag_parents(self) -> set[str]:
+            return {WFDAG.dag_id(parent_id) for parent_id in self.wfdag._core.parents(self.index)}
+
+        @property
+        def dag_children(self) -> set[str]:
+            return {WFDAG.dag_id(child_id) for child_id in self.wfdag._core.children(self.index)}
+
+    class DAGTasks(Mapping):
+        """
+        The vertices in the DAG, i.e. WFDAGTask instances indexed by dag_id (a read-only view over the DAG core)
+        """
+        __slots__ = ("wfdag",)
+
+        def __init__(self, wfdag: WFDAG):
+            self.wfdag = wfdag
+
+        def __getitem__(self, dag_id: str) -> WFDAG.WFDAGTask:
+            return WFDAG.WFDAGTask(self.wfdag, self.wfdag._task_index(dag_id))
+
+        def __iter__(self) -> Iterator[str]:
+            return (WFDAG.dag_id(index) for index in range(len(self)))
+
+        def __len__(self) -> int:
+            return 0 if self.wfdag._core is None else self.wfdag._core.n_tasks
 
     def __init__(self, workflow_name):
         # This is just a placeholder to store each wfctask
         self.workflow_name = workflow_name
         self.wftasks = {}
-        # The vertices in the DAG, i.e. WFDAGTask instances
-        self.dag_tasks = {}  # Indexed by the WFDAGTask id
-        self.ordered_tasks = []
+        # The WFCTasks indexed by their id in the DAG core (in the order they were added), and the DAG core (set by
+        # build_dag, it holds the tasks added before the last build)
+        self._wfctasks = []
+        self._core = None
+        # What the dependencies can refer to (see _build_dag_first_pass), kept from one build to the next
+        self._references = {}
+        self._member_outputs = {}
+        # The references that could not be resolved (external inputs) -> the index(es) of the tasks referring to them
+        self._unresolved = {}
+        self._ranks = None  # The upward rank of each task (set by build_dag, see ranks)
+        self._rank_seeds = set()  # The tasks whose rank must be computed again (see ranks)
+        self._cycle = None  # The names of the tasks on the cycle found by a build, if any (see _check_cycle)
+        self.partitions = None  # The partition of each task, None if not partitioned (see wfc2dask/partitioning.py)
+        self.dag_tasks = WFDAG.DAGTasks(self)
+
+    @staticmethod
+    def dag_id(index: int) -> str:
+        return 'dv_%d' % index  # dv stands for DAG Vertex
+
+    def _task_index(self, dag_id: str) -> int:
+        """
+        :param dag_id: the private id of a task
+        :return: the index of the task in the DAG core
+
+        Raises a KeyError if dag_id is not the id of a task in the DAG
+        """
+        if isinstance(dag_id, str) and dag_id.startswith('dv_') and dag_id[3:].isdigit():
+            index = int(dag_id[3:])
+            if index < len(self.dag_tasks) and dag_id == WFDAG.dag_id(index):
+                return index
+        raise KeyError(dag_id)
+
+    @property
+    def ordered_tasks(self) -> list[list[str]]:
+        """
+        :return: the dag_ids of the tasks, level by level (empty if the DAG is not built)
+        """
+        if self._core is None:
+            return []
+        return [[WFDAG.dag_id(index) for index in self._core.level(level)] for level in range(self._core.n_levels)]
 
     def add_task(self, task: WFCTask) -> None:
         if task.name in self.wftasks:
             raise Exception("Duplicate task named '%s'" % task.name)
         self.wftasks[task.name] = task
+        self._wfctasks.append(task)
+
+    @property
+    def external_inputs(self) -> set[str]:
+        """
+        :return: the inputs (and parents) that are not produced by a task (as of the last build)
+        """
+        return set(self._unresolved)
 
     @staticmethod
     def from_tasks(tasks: list[WFCTask], wfname: str) -> WFDAG:
@@ -43,100 +132,195 @@ class WFDAG:
         return wfdag
 
     @staticmethod
-    def _resolve_reference(references: dict[str], key: str) -> str:
-        """
-        Resolve "references"
-
-        :param references: a dictionary of "references", each key is
-        + either a user reference (task name, input name or output name) associated to a dag_id value
-        + or a dag_id associated to itself
-        :param key: the key to resolve
-        :return: the resolved reference, i.e. a dag_id
-
-        Notes:
-        + This method is expected to raise a KeyError exception if the key is unknown, that is, in the case of
-          "external" inputs (an input which is not the output of a task)
-        + It does not guarantee the consistency of the DAG, e.g. if a task has a parent task which has not been defined
-        """
-        _key = key
-        already_seen = set()
-        while references[_key] != _key:
-            if _key in already_seen:
-                # Let's prevent cycles (shouldn't happen if the wf is correctly specified)
-                raise Exception("Cycle detected for key '%s': %s", key, already_seen)
-            already_seen.add(_key)
-            _key = references[_key]
-        return _key
-
-    def _build_dag_first_pass(self):
-        """
-        First pass: Collect all dependencies
+    def load(filename: str) -> WFDAG:
+        """
+        :param filename: the name of a file containing a representation of a WorkFlowCommon workflow
+        :return: the (not built) WFDAG of the workflow
+
+        The tasks are streamed from the file to add_task (see WFCTask.iterload), so the JSON document is never
+        held in memory as a whole
+        """
+        header = {}
+        wfdag = WFDAG(None)
+        for wftask in WFCTask.iterload(filename, header):
+            wfdag.add_task(wftask)
+        wfdag.workflow_name = header.get("name")
+        return wfdag
+
+    def _build_dag_first_pass(self, start: int) -> None:
+        """
+        :param start: the index of the first task added since the last build
+
+        First pass: Index what the dependencies can refer to
         Note: The dependencies between two tasks can be defined in parents, in childrens, as a files.input,
         and/or as a files.output. However, there is no guaranteed completeness, e.g. if task1 is in the parents
         of task2, task1 children do not have to mention task2
-        The purpose of the references dictionary is to collect the dependencies
-        + task.id -> task.id (this is our stop condition when resolving a dependency)
-        + task.name -> task.id
-
-        :return: a dictionary of "references", see _resolve_reference for a detailed explanation
-        """
-        references = {}
-        for task_index, wftask in enumerate(self.wftasks.values()):
-            task = WFDAG.WFDAGTask(wftask, task_index)
-            self.dag_tasks[task.dag_id] = task
-            references[task.dag_id] = task.dag_id        # Necessary stop condition when resolving a reference
-            references[task.wfctask.name] = task.dag_id  #
-            # wfctask.parents is a list of task.names (str). What the task depends on
-            for parent in task.wfctask.parents:
-                task.dag_parents.add(parent)
-            # wfctask inputs. What the task depends on (bis repetita)
-            for inp in task.wfctask.inputs:
-                # It is not known (yet) if inp is the output of another task or an "external" input
-                # For the moment, we just add it to the parents. We will resolve that reference in the second pass
-                task.dag_parents.add(inp)
+        The references (task.name or task output -> task index) are updated with the new tasks: a task name shadows
+        an output of the same name produced by a task added before it. Each reference is resolved with a single
+        lookup. The outputs of the members of clusters are indexed apart (see WFCCluster)
+
+        The tasks get their index (i.e. their id in the DAG core) in the order they were added
+        """
+        for task_index in range(start, len(self._wfctasks)):
+            wftask = self._wfctasks[task_index]
+            self._references[wftask.name] = task_index
             # wfctask outputs . What the task creates (and other tasks possibly depend on)
-            for out in task.wfctask.outputs:
-                if out in references:
+            for out in wftask.outputs:
+                # Task names and outputs share the same namespace: an output cannot be produced twice nor be named
+                # after a task added before
+                producer = self._references.get(out)
+                if producer is not None:
                     # TODO Make this a specific Exception
-                    raise Exception(
-                        "'%s' in '%s' is also an output of '%s?!" % (out, task.wfctask.name, references[out]))
-                references[out] = task.dag_id  # This output is a direct dependendy on this task
-            pass
-        return references
+                    raise Exception("'%s' in '%s' is also an output of '%s?!" % (out, wftask.name,
+                                                                                 WFDAG.dag_id(producer)))
+                self._references[out] = task_index  # This output is a direct dependendy on this task
+            if isinstance(wftask, WFCCluster):
+                for out in wftask.data_outputs():
+                    self._member_outputs[out] = task_index
 
-    def _build_dag_second_pass(self, references: dict[str]) -> None:
+    def _data_producer(self, name: str) -> int:
         """
-        :param references: the dictionary of references built in the first pass
-        :return: None
+        :return: the index of the task writing a file, None if no task writes it
+        """
+        return self._member_outputs.get(name) if len(self._member_outputs) != 0 else self._references.get(name)
+
+    def _flow_size(self, task_index: int, name: str, producer_index: int) -> int:
+        """
+        :return: the size of an input, as declared by the task reading it or else by the task writing it
+        """
+        size = self._wfctasks[task_index].file_size(name)
+        return self._wfctasks[producer_index].file_size(name) if size is None else size
+
+    def _build_dag_second_pass(self, start: int) -> tuple[list[int], set[int]]:
+        """
+        :param start: the index of the first task added since the last build
+        :return: the indices of the tasks added before that got new parents, and of the tasks added before that got
+        new children
 
-        The parent dependencies (parent tasks and inputs) of each WFDAGTask have been built in the first pass
-        Now we need to consolidate them, that is, when a parent reference is encountered, we need to:
-        + Replace it with a dag_id if the reference can be resolved
-        + Remove it if the reference cannot be resolved, i.e. in the case of "external" inputs),
-        We then need to ensure that the resulting set of dag_ids contains each dag_id only once (this is
+        The parent dependencies of each new task are its parent tasks and its inputs. Each of them is:
+        + Replaced with a task index if the reference can be resolved
+        + Recorded as unresolved if the reference cannot be resolved, i.e. in the case of "external" inputs (an input
+          which is not the output of a task). Those are summarized in a single log line
+        We then need to ensure that the resulting set of task indices contains each index only once (this is
         ensured by the use of a Python set)
+        The references of the tasks added before that were unresolved and that are now resolved (a new task has that
+        name or output) become dependencies too.
+        The DAG core (parents and children adjacency) is built (or extended) from those parents, along with the data
+        flows: the bytes each task reads from the tasks producing its inputs (from the sizeInBytes of the files)
+
+        Note: It does not guarantee the consistency of the DAG, e.g. if a task has a parent task which has not been
+        defined, the parent is considered as an external input
         """
-        for task in self.dag_tasks.values():
+        # The references of the tasks added before resolved by the new tasks
+        resolved = []  # (parent index, child index, bytes)
+        for task_index in range(start, len(self._wfctasks) if len(self._unresolved) != 0 else start):
+            wftask = self._wfctasks[task_index]
+            for name in itertools.chain([wftask.name], wftask.outputs, wftask.data_outputs()):
+                referrers = self._unresolved.pop(name, None)
+                if referrers is None:
+                    continue
+                for referrer in sorted({referrers} if isinstance(referrers, int) else set(referrers)):
+                    producer_index = self._references.get(name, task_index)
+                    data_producer_index = self._data_producer(name)
+                    n_bytes = 0
+                    if data_producer_index is not None and name in self._wfctasks[referrer].data_inputs():
+                        n_bytes = self._flow_size(referrer, name, data_producer_index) or 0
+                    resolved.append((producer_index, referrer, n_bytes))
+        parents = []
+        flows = []
+        external_inputs = {}  # external input -> number of tasks depending on it
+        references = self._references
+        data_producers = self._member_outputs if len(self._member_outputs) != 0 else references
+        for task_index in range(start, len(self._wfctasks)):
+            wftask = self._wfctasks[task_index]
             consolidated_parents = set()
-            for parent in task.dag_parents:
-                try:
-                    # Try to find the dag_id associated to parent
-                    consolidated_parents.add(WFDAG._resolve_reference(references, parent))
-                except KeyError:
-                    # Tell the user that the parent is an external input
-                    logger.info("In task '%s', '%s' seems to be an external input" % (task.wfctask.name, parent))
-            task.dag_parents = consolidated_parents
-        pass
+            task_flows = {}
+            # wfctask.parents is a list of task.names (str), wfctask.inputs are either outputs of other tasks or
+            # "external" inputs. What the task depends on
+            for parent in wftask.dependencies():
+                parent_index = references.get(parent)
+                if parent_index is None:
+                    external_inputs[parent] = external_inputs.get(parent, 0) + 1
+                    if parent in self._unresolved:
+                        self._add_unresolved(parent, task_index)
+                    else:
+                        self._unresolved[parent] = task_index  # A single referrer (the common case) is stored as is
+                else:
+                    consolidated_parents.add(parent_index)
+            # The size of an input, as declared by the task reading it or else by the task writing it
+            for name in wftask.data_inputs():
+                producer_index = data_producers.get(name)
+                if producer_index is not None and producer_index != task_index:
+                    size = wftask.file_size(name)
+                    if size is None:
+                        size = self._wfctasks[producer_index].file_size(name)
+                    if size is not None:
+                        task_flows[producer_index] = task_flows.get(producer_index, 0) + size
+            parents.append(consolidated_parents)
+            flows.append(task_flows)
+        if self._core is None:
+            self._core = DAGCore(parents, flows)
+        else:
+            self._core.extend(parents, flows)
+        for parent_index, child_index, n_bytes in resolved:
+            self._core.add_dependency(parent_index, child_index, n_bytes)
+        if len(external_inputs) != 0:
+            logger.info("%d external inputs (referenced %d times), e.g. %s" % (
+                len(external_inputs), sum(external_inputs.values()),
+                ", ".join(["'%s'" % name for name in itertools.islice(external_inputs, 5)])))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("External inputs: %s" % sorted(external_inputs))
+        return sorted({child_index for _, child_index, _ in resolved}), \
+            {parent_index for task_parents in parents for parent_index in task_parents if parent_index < start} | \
+            {parent_index for parent_index, _, _ in resolved}
+
+    def _add_unresolved(self, name: str, task_index: int) -> None:
+        # Several referrers are stored in a list
+        referrers = self._unresolved[name]
+        if isinstance(referrers, int):
+            self._unresolved[name] = [referrers, task_index]
+        else:
+            referrers.append(task_index)
+
+    @property
+    def is_built(self) -> bool:
+        """
+        :return: True if all the tasks added are in the DAG, and they could be ordered
+        """
+        return self._core is not None and self._core.n_tasks == len(self._wfctasks) and self._cycle is None
 
     def build_dag(self) -> None:
         """
-        This method is called once all tasks have been added through add_task
+        Build the DAG of the tasks added through add_task, or update it with the tasks added since the last build
 
-        TODO Need to check idempotence
+        The first build indexes, resolves, orders and ranks all the tasks. The next ones only touch the tasks
+        affected by the new tasks (e.g. when sub-workflows are stitched together):
+        + The new tasks are indexed and resolved. The tasks added before that referred to one of their names or
+          outputs (an external input so far) get them as parents
+        + The new tasks, and the tasks that got new parents and their descendants, are ordered (see
+          DAGCore.update_order)
+        + The ranks of the new tasks, and of the tasks that got new children and their ancestors, are updated (see
+          DAGCore.update_upward_ranks) when they are needed (see ranks): adding a task to the end of a workflow
+          changes the rank of all its ancestors, so they are updated once for all the additions
+        Building a DAG that is built already does nothing. The partitions (see wfc2dask/partitioning.py) are
+        dropped when tasks are added. Building a DAG with a cycle raises an exception, every time (see _check_cycle)
         """
-        references = self._build_dag_first_pass()
-        self._build_dag_second_pass(references)
-        self.order_tasks()
+        self._check_cycle([])
+        if self.is_built:
+            return
+        start = 0 if self._core is None else self._core.n_tasks
+        self._build_dag_first_pass(start)
+        new_parents, new_children = self._build_dag_second_pass(start)
+        self.partitions = None
+        if start == 0:
+            self.order_tasks()
+            self.rank_tasks()
+            return
+        self._check_cycle(self._core.update_order(itertools.chain(range(start, self._core.n_tasks), new_parents)))
+        self._rank_seeds.update(range(start, self._core.n_tasks))
+        self._rank_seeds.update(new_children)
+        logger.debug("%d tasks added: %d tasks ordered in %d levels" % (self._core.n_tasks - start,
+                                                                       self._core.n_tasks, self._core.n_levels))
 
     def order_tasks(self) -> None:
         """
@@ -148,59 +332,216 @@ class WFDAG:
         + The children of those children,
         + ... and so on
 
-        We iterate over the list of tasks to be ordered. If there is no cycle in the graph,
-        each iteration will find one task that can be executed before the others
-
-        Complexity is \thera(n^2) where n = number of tasks.
-        TODO Provide faster implementation (but dask is limited in size anyway...)
-        """
-        tasks_to_order = list(self.dag_tasks.keys())  # That's what we need to order
-        for task in self.dag_tasks.values():
-            # Backup the set of parent dag_ids. We will need them later
-            task.dag_parents_backup = set(task.dag_parents)
-        while len(tasks_to_order) != 0:
-            logger.debug("Bef: %d tasks with ordered size %d" % (len(tasks_to_order), len(self.ordered_tasks)))
-            tasks_without_parents = []
-            tasks_with_parents = []
-            # Iterate over the set of tasks to find those without parents (i.e. that can be executed at this stage)
-            for task_id in tasks_to_order:
-                if len(self.dag_tasks[task_id].dag_parents) == 0:
-                    tasks_without_parents.append(task_id)
-                else:
-                    tasks_with_parents.append(task_id)
-            # Check if there is a cycle
-            # No need to check if len(tasks_with_parents) != 0 since tasks from tasks_to_order are
-            # either with or without parents and len(tasks_to_order) is != 0
-            if len(tasks_without_parents) == 0:
-                raise Exception("Cycle detected in workflow")
-            self.ordered_tasks.append(tasks_without_parents)
-            # Now remove the dag_ids of tasks_without_parents from the set of parents of tasks of tasks_with_parents
-            # (since they will be executed before)
-            for task_id in tasks_with_parents:
-                for _id in tasks_without_parents:
-                    if _id in self.dag_tasks[task_id].dag_parents:
-                        self.dag_tasks[task_id].dag_parents.remove(_id)
-            # What remains to order in the next iteration is the set of tasks_with_parents
-            tasks_to_order = tasks_with_parents
-            logger.debug("Aft: %d tasks with ordered size %d" % (len(tasks_to_order), len(self.ordered_tasks)))
-        # Restore the deleted parents and delete the backup
-        for task in self.dag_tasks.values():
-            task.dag_parents = set(task.dag_parents_backup)
-            del task.dag_parents_backup
+        The levels are computed in O(V+E) by the DAG core (see DAGCore.order). Inside a level, tasks keep the order
+        in which they were added to the DAG.
+        """
+        self._check_cycle(self._core.order())
+        logger.debug("%d tasks ordered in %d levels" % (self._core.n_tasks, self._core.n_levels))
+
+    def _check_cycle(self, cycle: list[int]) -> None:
+        """
+        :param cycle: the indices of the tasks on a cycle found when ordering the tasks, empty if there is none
+
+        Raises an exception if the DAG has a cycle. The cycle is kept: tasks can only be added, so the DAG is never
+        built and the next builds raise the same exception (instead of finding the tasks already in the DAG core)
+        """
+        if len(cycle) != 0:
+            self._cycle = " -> ".join([self._wfctasks[index].name for index in cycle])
+        if self._cycle is not None:
+            raise Exception("Cycle detected in workflow: %s" % self._cycle)
+
+    def reduce_dependencies(self) -> int:
+        """
+        :return: the number of dependencies removed
+
+        Optional transitive reduction of the built DAG (see DAGCore.transitive_reduction): a task no longer depends
+        on the ancestors of its other parents, so fewer futures are handed to dask for the same ordering. The levels
+        and the ranks are not changed
+        """
+        n_dependencies = self._core.n_dependencies
+        n_removed = self._core.transitive_reduction()
+        logger.info("Transitive reduction: %d dependencies out of %d removed" % (n_removed, n_dependencies))
+        return n_removed
+
+    def rank_tasks(self) -> None:
+        """
+        :return: None
+
+        Compute the upward rank (a.k.a. bottom level) of each task: the length of the longest path from the task to
+        the end of the workflow. The weight of a task is its runtime (runtimeInSeconds) when known, 1 otherwise.
+        Tasks with the highest ranks are on the critical path: they are given the highest dask priorities
+        """
+        self._ranks = self._core.upward_ranks([self._weight(index) for index in range(self._core.n_tasks)])
+        self._rank_seeds = set()
+
+    @property
+    def ranks(self) -> array:
+        """
+        :return: the upward rank of each task (see rank_tasks), brought up to date with the tasks added since they
+        were computed
+        """
+        if len(self._rank_seeds) != 0:
+            self._core.update_upward_ranks(self._ranks, self._weight, self._rank_seeds)
+            self._rank_seeds = set()
+        return self._ranks
+
+    def _weight(self, index: int) -> float:
+        runtime = self._wfctasks[index].runtime
+        return 1. if runtime is None else float(runtime)
+
+    def level_profile(self) -> list[dict]:
+        """
+        :return: for each level, its width (number of tasks) and its work (sum of the runtimes, 1 per task if unknown)
+        """
+        return [{"width": len(self._core.level(level)),
+                 "work": sum([1. if self._wfctasks[index].runtime is None else float(self._wfctasks[index].runtime)
+                              for index in self._core.level(level)])}
+                for level in range(self._core.n_levels)]
+
+    def upward_rank(self, dag_id: str) -> float:
+        """
+        :param dag_id: the private id of a task
+        :return: the upward rank of the task (see rank_tasks)
+        """
+        return self.ranks[self._task_index(dag_id)]
+
+    def critical_path(self) -> tuple[list[str], float]:
+        """
+        :return: the dag_ids of the tasks on (one of) the longest path(s) of the DAG, and its length
+        """
+        if self._core.n_tasks == 0:
+            return [], 0.
+        ranks = self.ranks
+        index = max(range(self._core.n_tasks), key=ranks.__getitem__)
+        path = [index]
+        while len(self._core.children(index)) != 0:
+            index = max(self._core.children(index), key=ranks.__getitem__)
+            path.append(index)
+        return [WFDAG.dag_id(index) for index in path], ranks[path[0]]
+
+    def critical_path_report(self) -> str:
+        """
+        :return: a one-line description of the critical path
+        """
+        path, length = self.critical_path()
+        return "Critical path: %d tasks, length %g (%s): %s" % (
+            len(path), length,
+            "runtimeInSeconds" if any([wfctask.runtime is not None for wfctask in self._wfctasks]) else "unit weights",
+            " -> ".join([self.dag_tasks[dag_id].wfctask.name for dag_id in path]))
 
     def __repr__(self) -> str:
         """
         :return: a representation of the DAG by level
         """
-        if len(self.ordered_tasks) == 0:
-            self.build_dag()
         rep = '\n'
+        if not self.is_built:
+            rep += "%d tasks added since the last build\n" % (len(self._wfctasks) - len(self.dag_tasks))
         for level, tasks in enumerate(self.ordered_tasks):
             rep += "Level %d: " % level
             rep += "; ".join(['%s (%s)' % (_id, self.dag_tasks[_id].wfctask.name) for _id in tasks])
             rep += "\n"
         return rep
 
+    @staticmethod
+    def _task_description(dag_id: str, wfctask: WFCTask) -> dict:
+        """
+        :param dag_id: the private id of the task
+        :param wfctask: the task
+        :return: the keyword arguments of the WorkflowTask (see code_templates/workflow_task.py) executing the task
+
+        The members of a cluster (see wfc2dask/clustering.py) are described the same way, the dag_id of the n-th
+        member being '<cluster dag_id>.<n>'
+        """
+        description = {"dag_id": dag_id,
+                       "name": wfctask.name,
+                       "command_arguments": wfctask.command,
+                       "inputs": sorted(wfctask.inputs),
+                       "outputs": sorted(wfctask.outputs),
+                       "runtime": wfctask.runtime,
+                       "cores": wfctask.cores,
+                       "memory": wfctask.memory,
+                       "sizes": wfctask.sizes}
+        if isinstance(wfctask, WFCCluster):
+            description["members"] = [WFDAG._task_description("%s.%d" % (dag_id, rank), member)
+                                      for rank, member in enumerate(wfctask.members)]
+        return description
+
+    def _dag_task_description(self, index: int) -> dict:
+        """
+        :return: the description of a task of the DAG (see _task_description), with its partition if partitioned
+        """
+        description = WFDAG._task_description(WFDAG.dag_id(index), self._wfctasks[index])
+        if self.partitions is not None:
+            description["partition"] = self.partitions[index]
+        return description
+
+    def task_descriptions(self) -> Iterator[dict]:
+        """
+        :return: a generator of the descriptions of the tasks (see _task_description), level by level, with the
+        dag_ids of their parents ("parents") and their priority (their upward rank, see rank_tasks) on top. Since the
+        tasks are in level order, the parents of a task always come before it
+        """
+        self.build_dag()  # Does nothing if the DAG is built already
+        ranks = self.ranks
+        for level in range(self._core.n_levels):
+            for index in self._core.level(level):
+                description = self._dag_task_description(index)
+                description["parents"] = [WFDAG.dag_id(parent_id) for parent_id in self._core.parents(index)]
+                description["priority"] = ranks[index]
+                yield description
+
+    def dump(self, filename: str) -> None:
+        """
+        Serialize the DAG, i.e. what is needed to run it without generated code (see
+        code_templates/run_workflow_graph.py)
+
+        :param filename: the name of the file to write to
+
+        The file is in JSON lines format:
+        + the first line is a header: {"name": workflow name, "n_tasks": number of tasks, "n_levels": number of levels}
+        + then the description of each task, level by level (see task_descriptions)
+        """
+        import json
+        self.build_dag()  # Does nothing if the DAG is built already
+        with open(filename, "w") as fp:
+            fp.write(json.dumps({"name": self.workflow_name,
+                                 "n_tasks": self._core.n_tasks,
+                                 "n_levels": self._core.n_levels}))
+            fp.write("\n")
+            for description in self.task_descriptions():
+                fp.write(json.dumps(description, separators=(",", ":")))
+                fp.write("\n")
+
+    def _dask_wftask_codelines(self, index: int, randomizer_varname: str) -> list[str]:
+        """
+        :return: the non-indented Python lines of code defining the WorkflowTask of a task: TASKS[dag_id] = ...
+        """
+        dag_id = WFDAG.dag_id(index)
+        description = self._dag_task_description(index)
+        description["members"] = [WorkflowTask(**member) for member in description.get("members", [])]
+        code = WorkflowTask(**description).pythonize(randomizer_varname)
+        return ["TASKS['%s'] = %s" % (dag_id, code[0])] + code[1:]
+
+    def _dask_submit_codeline(self, index: int) -> str:
+        """
+        :return: the Python line of code submitting a task: FUTURES[dag_id] = client.submit(...)
+
+        The priority of a task is its upward rank, so that dask favors the tasks on the critical path
+        The resources of a task are limited to what the workers provide (see task_resources in helpers.py)
+        The dask key of a task is its dag_id and its submission time is recorded (see submitted in helpers.py)
+        dask runs a failed task again up to its number of retries (see WorkflowTask)
+        A partitioned task is preferably run by the workers of its partition (see task_placement in helpers.py)
+        """
+        dag_id = WFDAG.dag_id(index)
+        resources = self._wfctasks[index].resources()
+        fut_inputs_list = ", ".join(["FUTURES['%s']" % WFDAG.dag_id(parent_id)
+                                     for parent_id in self._core.parents(index)])
+        return ("FUTURES['%s'] = client.submit(execute_task, submitted(TASKS['%s']), [%s], key='%s', "
+                "retries=TASKS['%s'].retries, priority=%r%s%s)") % (
+            dag_id, dag_id, fut_inputs_list, dag_id, dag_id, self.ranks[index],
+            "" if len(resources) == 0 else ", resources=task_resources(%r, WORKER_RESOURCES)" % resources,
+            "" if self.partitions is None else ", **task_placement(TASKS['%s'], WORKER_GROUPS)" % dag_id)
+
     def dask_wftasks_codelines(self, randomizer_varname: str) -> list[str]:
         """
         Build the code definining all tasks in the workflow, i.e. WorkflowTask instances
@@ -209,47 +550,76 @@ class WFDAG:
         """
         codelines = ["randomizer = random.Random(seed)",
                      "TASKS = {}"]
-        for dag_task in self.dag_tasks.values():
-            _workflow_task = WorkflowTask(dag_id=dag_task.dag_id,
-                                          name=dag_task.wfctask.name,
-                                          command_arguments=dag_task.wfctask.command,
-                                          inputs=list(dag_task.wfctask.inputs),
-                                          outputs=list(dag_task.wfctask.outputs)
-                                          )
-            code = _workflow_task.pythonize(randomizer_varname)
-            codelines.append("TASKS['%s'] = %s" % (dag_task.dag_id, code[0]))
-            codelines.extend([codeline for codeline in code[1:]])
+        for index in range(len(self._wfctasks)):
+            codelines.extend(self._dask_wftask_codelines(index, randomizer_varname))
         return codelines
 
     def dask_codelines(self) -> list[str]:
-        self.build_dag()
+        """
+        :return: the non-indented Python lines of code defining and submitting all the tasks, in a single block (see
+        write_dask_modules for large workflows). The block imports what it uses from the templates: it runs where the
+        arguments of run_workflow are defined (client, simulate, seed, affinity and task_options, see
+        code_templates/run_workflow.py), e.g. as the body of that function
+        """
+        self.build_dag()  # Does nothing if the DAG is built already
         logger.debug('%s' % self)  # Display the DAG
-        noindent_python_codelines = self.dask_wftasks_codelines("randomizer")
-        # client.submit() lines
-        for level, task_ids in enumerate(self.ordered_tasks):
-            noindent_python_codelines.append("# Level %d (%d tasks)" % (level + 1, len(task_ids)))
-            for task_id in task_ids:
-                task = self.dag_tasks[task_id]
-                noindent_python_codelines.append("# Task %s (%s)" % (task_id, task.wfctask.name))
-                fut_task_varname = "fut_%s" % task_id
-                fut_inputs_list = ", ".join(["fut_%s" % parent_id for parent_id in task.dag_parents])
-                codeline = "%s = client.submit(execute_task, TASKS['%s'], [%s])" % (fut_task_varname,
-                                                                                    task_id,
-                                                                                    fut_inputs_list)
-                noindent_python_codelines.append(codeline)
-        # future.result() lines in reverse order
-        # We call result() for each future: This guarantees that all tasks will be executed (and we
-        # delegate to dask the task to find leaves in the DAG at various levels)
-        # Notes:
-        # + if the future is Finished, this has no overhead
-        # + there cannot be deadlocks (or the previous client.submit() lines would be syntactically incorrect: a future
-        # would be used before its creation)
-        for level, task_ids in enumerate(reversed(self.ordered_tasks)):
-            noindent_python_codelines.append("# Level %d (%d tasks)" % (len(self.ordered_tasks)-level, len(task_ids)))
-            for task_id in reversed(task_ids):
-                task = self.dag_tasks[task_id]
-                noindent_python_codelines.append("# Task %s (%s)" % (task_id, task.wfctask.name))
-                fut_task_varname = "fut_%s" % task_id
-                codeline = "TASKS['%s'] = %s.result()" % (task_id, fut_task_varname)
-                noindent_python_codelines.append(codeline)
+        noindent_python_codelines = ["from helpers import execute_task, submitted, task_placement, task_resources, "
+                                     "worker_groups, worker_resources",
+                                     "import random",
+                                     "from workflow_task import WorkflowTask"]
+        noindent_python_codelines.extend(self.dask_wftasks_codelines("randomizer"))
+        # client.submit() lines. The futures are stored in FUTURES, which the generated run_workflow hands to
+        # collect_results (see code_templates/helpers.py) to collect the tasks in completion order
+        noindent_python_codelines.append("FUTURES = {}")
+        noindent_python_codelines.append("WORKER_RESOURCES = worker_resources(client)")
+        noindent_python_codelines.append("WORKER_GROUPS = worker_groups(client, affinity)")
+        for level in range(self._core.n_levels):
+            noindent_python_codelines.append("# Level %d (%d tasks)" % (level + 1, len(self._core.level(level))))
+            for index in self._core.level(level):
+                noindent_python_codelines.append("# Task %s (%s)" % (WFDAG.dag_id(index), self._wfctasks[index].name))
+                noindent_python_codelines.append(self._dask_submit_codeline(index))
         return noindent_python_codelines
+
+    CHUNK_HEADER = '''"""
+Generated code: definition and submission of %d tasks (levels %d to %d)
+"""
+from helpers import execute_task, submitted, task_placement, task_resources
+from workflow_task import WorkflowTask
+
+
+def submit(client, simulate, randomizer, task_options, FUTURES, WORKER_RESOURCES, WORKER_GROUPS):
+    TASKS = {}
+'''
+
+    def write_dask_modules(self, directory: str, chunk_size: int = 1000) -> int:
+        """
+        :param directory: the directory of the package holding the generated modules (created if needed)
+        :param chunk_size: the (maximum) number of tasks per module
+        :return: the number of modules, named chunk_0, chunk_1, ...
+
+        Each module defines a submit function defining and submitting chunk_size tasks, in level order: running the
+        submit functions of the modules in order submits the whole workflow, the parents of a task always being
+        submitted before it. The code is written task by task, so only the code of one task is held in memory, and
+        the size of the functions (hence their compilation time) is bounded
+        """
+        import os
+        self.build_dag()  # Does nothing if the DAG is built already
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "__init__.py"), "w") as fp:
+            fp.write('"""\nGenerated modules submitting the tasks of %s (see run_workflow.py)\n"""\n' %
+                     self.workflow_name)
+        tasks = ((level, index) for level in range(self._core.n_levels) for index in self._core.level(level))
+        n_chunks = 0
+        chunk = list(itertools.islice(tasks, chunk_size))
+        while len(chunk) != 0:
+            with open(os.path.join(directory, "chunk_%d.py" % n_chunks), "w") as fp:
+                fp.write(WFDAG.CHUNK_HEADER % (len(chunk), chunk[0][0] + 1, chunk[-1][0] + 1))
+                for level, index in chunk:
+                    fp.write("    # Task %s (%s), level %d\n" % (WFDAG.dag_id(index), self._wfctasks[index].name,
+                                                                level + 1))
+                    for codeline in self._dask_wftask_codelines(index, "randomizer"):
+                        fp.write("    %s\n" % codeline)
+                    fp.write("    %s\n" % self._dask_submit_codeline(index))
+            n_chunks += 1
+            chunk = list(itertools.islice(tasks, chunk_size))
+        return n_chunks